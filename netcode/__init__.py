@@ -6,19 +6,29 @@ logging.getLogger().setLevel(logging.INFO)
 
 # ruff: noqa: E402
 
-from . import client_state
+from . import client_state, compression, loadgen, metrics, profiling, snapshot
+from .arena import ClientPacketArena, ServerPacketArena
 from .netcode import (
     CONNECT_TOKEN_BYTES,
     MAX_PACKET_SIZE,
     NETCODE_VERSION,
     PRIVATE_KEY_BYTES,
+    PROFILE_PHASES,
     USER_DATA_BYTES,
+    AdmissionControl,
     Client,
     ClientIndex,
+    ClientTable,
     ConnectToken,
+    LoopbackNetwork,
+    NetworkConditions,
     Server,
+    ServerAddressSet,
     generate_key,
+    generate_tokens,
 )
+from .sharded import ShardedServer
+from .tick import TickLoop, TickStats
 
 Address: TypeAlias = tuple[str, int]
 ClientID: TypeAlias = int
@@ -28,13 +38,30 @@ __all__ = [
     "MAX_PACKET_SIZE",
     "NETCODE_VERSION",
     "PRIVATE_KEY_BYTES",
+    "PROFILE_PHASES",
     "USER_DATA_BYTES",
+    "AdmissionControl",
     "Client",
     "ConnectToken",
+    "LoopbackNetwork",
+    "NetworkConditions",
     "client_state",
+    "compression",
+    "loadgen",
+    "metrics",
+    "profiling",
+    "snapshot",
     "generate_key",
+    "generate_tokens",
     "Server",
+    "ServerAddressSet",
     "ClientIndex",
+    "ClientTable",
+    "ClientPacketArena",
+    "ServerPacketArena",
+    "ShardedServer",
+    "TickLoop",
+    "TickStats",
     "Address",
     "ClientID",
     "my_module",
@@ -0,0 +1,238 @@
+"""asyncio integration: drive a `Server` or `Client` from the event loop.
+
+Packets are read as soon as the socket becomes readable (`loop.add_reader` on the
+endpoint's `fileno()`), and a timer calls `update` every `update_interval` seconds
+so keep-alives and timeouts still happen when nothing arrives. Nothing sleeps or
+polls, so wake-up latency is set by socket readiness and an idle server costs one
+timer callback per interval.
+
+`add_reader` needs a selector event loop, the default everywhere but on Windows.
+
+```python
+async def main():
+    async with AsyncServer(netcode.Server(address, protocol_id, key)) as server:
+        async for packet, client_index in server:
+            server.send(packet, client_index)
+```
+"""
+
+from __future__ import annotations
+
+import abc
+import asyncio
+from typing import TYPE_CHECKING, Generic, TypeVar
+
+from .netcode import Client, ClientIndex, ConnectToken, Server
+
+if TYPE_CHECKING:
+    from types import TracebackType
+    from typing import Self
+
+    from .netcode import Buffer
+
+DEFAULT_UPDATE_INTERVAL = 1 / 20
+# received packets nobody awaited yet, as many as `Server.update` keeps
+MAX_PENDING_PACKETS = 65536
+
+_Endpoint = TypeVar("_Endpoint", Server, Client)
+_Packet = TypeVar("_Packet")
+
+
+class _Closed:
+    """Queued after the last packet, to wake up receivers when closing."""
+
+
+_CLOSED = _Closed()
+
+
+class _EventLoopDriver(abc.ABC, Generic[_Endpoint, _Packet]):
+    """Update an endpoint from an event loop and queue the packets it receives.
+
+    Packets that arrive while `MAX_PENDING_PACKETS` are queued are dropped and
+    counted in `dropped`.
+    """
+
+    def __init__(self, endpoint: _Endpoint, update_interval: float) -> None:
+        self.endpoint: _Endpoint = endpoint
+        self.update_interval = update_interval
+        self.dropped = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._timer: asyncio.TimerHandle | None = None
+        self._start_time = 0.0
+        self._packets: asyncio.Queue[_Packet | _Closed] = asyncio.Queue()
+        self._exception: BaseException | None = None
+
+    @property
+    def time(self) -> float:
+        """Seconds since the driver started, the clock passed to `update`."""
+        if self._loop is None:
+            return 0.0
+        return self._loop.time() - self._start_time
+
+    @property
+    def running(self) -> bool:
+        return self._loop is not None
+
+    def start(self) -> None:
+        """Start updating the endpoint from the running event loop."""
+        if self._loop is not None:
+            msg = "already started"
+            raise RuntimeError(msg)
+        self._loop = asyncio.get_running_loop()
+        self._start_time = self._loop.time()
+        self._loop.add_reader(self.endpoint.fileno(), self._update)
+        self._timer = self._loop.call_later(self.update_interval, self._tick)
+
+    def close(self) -> None:
+        """Stop updating the endpoint and wake up anyone waiting for a packet."""
+        if self._loop is None:
+            return
+        self._loop.remove_reader(self.endpoint.fileno())
+        if self._timer is not None:
+            self._timer.cancel()
+        self._loop = None
+        self._packets.put_nowait(_CLOSED)
+
+    async def __aenter__(self) -> Self:
+        self.start()
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    def _tick(self) -> None:
+        assert self._loop is not None
+        self._update()
+        if self._loop is not None:
+            self._timer = self._loop.call_later(self.update_interval, self._tick)
+
+    def _update(self) -> None:
+        try:
+            self.endpoint.update(self.time)
+            self._drain()
+        except Exception as e:  # noqa: BLE001 - handed to whoever awaits a packet
+            self._exception = e
+            self.close()
+
+    @abc.abstractmethod
+    def _drain(self) -> None:
+        """Queue the packets the endpoint received."""
+
+    def _put(self, packet: _Packet) -> None:
+        if self._packets.qsize() >= MAX_PENDING_PACKETS:
+            self.dropped += 1
+        else:
+            self._packets.put_nowait(packet)
+
+    async def _get(self) -> _Packet:
+        packet = await self._packets.get()
+        if isinstance(packet, _Closed):
+            # keep waking up other receivers
+            self._packets.put_nowait(_CLOSED)
+            if self._exception is not None:
+                raise self._exception
+            raise ConnectionAbortedError
+        return packet
+
+
+class AsyncServer(_EventLoopDriver[Server, tuple[bytes, ClientIndex]]):
+    """A `Server` updated by the event loop.
+
+    Iterating yields `(packet, client_index)` like `Server.recv`, until `close`.
+    """
+
+    def __init__(
+        self,
+        server: Server,
+        update_interval: float = DEFAULT_UPDATE_INTERVAL,
+    ) -> None:
+        """Init."""
+        super().__init__(server, update_interval)
+
+    def _drain(self) -> None:
+        while (result := self.endpoint.recv()) is not None:
+            self._put(result)
+
+    async def recv(self) -> tuple[bytes, ClientIndex]:
+        """Wait for the next packet."""
+        return await self._get()
+
+    def send(self, data: Buffer, client_index: ClientIndex) -> None:
+        """Send `data` to a client, see `Server.send`."""
+        self.endpoint.send(data, client_index)
+
+    def send_all(self, data: Buffer) -> None:
+        """Send `data` to every connected client, see `Server.send_all`."""
+        self.endpoint.send_all(data)
+
+    def __aiter__(self) -> AsyncServer:
+        return self
+
+    async def __anext__(self) -> tuple[bytes, ClientIndex]:
+        try:
+            return await self._get()
+        except ConnectionAbortedError:
+            raise StopAsyncIteration from None
+
+
+class AsyncClient(_EventLoopDriver[Client, bytes]):
+    """A `Client` updated by the event loop."""
+
+    def __init__(
+        self,
+        client: Client | ConnectToken,
+        update_interval: float = DEFAULT_UPDATE_INTERVAL,
+    ) -> None:
+        """Init."""
+        if isinstance(client, ConnectToken):
+            client = Client(client)
+        super().__init__(client, update_interval)
+        self._state_changed = asyncio.Event()
+
+    def _drain(self) -> None:
+        while (packet := self.endpoint.recv()) is not None:
+            self._put(packet)
+        self._state_changed.set()
+
+    async def connect(self) -> None:
+        """Connect and wait until the server accepted the connection.
+
+        Raises `ConnectionError` if the connection fails; the token's timeout
+        applies, wrap the call in `asyncio.timeout` to give up sooner.
+        """
+        self.endpoint.connect()
+        if not self.running:
+            self.start()
+        while not self.endpoint.is_connected():
+            if self.endpoint.is_error():
+                msg = f"failed to connect: {self.endpoint.state()}"
+                raise ConnectionError(msg)
+            self._state_changed.clear()
+            await self._state_changed.wait()
+
+    async def recv(self) -> bytes:
+        """Wait for the next packet."""
+        return await self._get()
+
+    def send(self, data: Buffer) -> None:
+        """Send `data` to the server, see `Client.send`."""
+        self.endpoint.send(data)
+
+    async def disconnect(self) -> None:
+        """Disconnect from the server and stop updating the client."""
+        self.endpoint.disconnect()
+        self.close()
+
+    def __aiter__(self) -> AsyncClient:
+        return self
+
+    async def __anext__(self) -> bytes:
+        try:
+            return await self._get()
+        except ConnectionAbortedError:
+            raise StopAsyncIteration from None
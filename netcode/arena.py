@@ -0,0 +1,132 @@
+"""Tick-scoped packet arenas.
+
+An arena drains every queued packet into one reusable buffer right after `update`,
+so receiving a tick of packets does not allocate a `bytes` object per packet.
+
+The `memoryview` slices handed out by an arena point into that buffer: they stay
+valid until the next `update`/`fill`, which overwrites them. Copy a payload with
+`bytes(view)` if it has to outlive the tick.
+"""
+
+from __future__ import annotations
+
+from array import array
+from typing import TYPE_CHECKING
+
+from .netcode import MAX_PACKET_SIZE, Client, Server
+
+if TYPE_CHECKING:
+    from collections.abc import Iterator
+
+DEFAULT_CAPACITY = 256 * MAX_PACKET_SIZE
+
+
+class _PacketArena:
+    def __init__(self, capacity: int) -> None:
+        if capacity < MAX_PACKET_SIZE:
+            msg = f"capacity must be at least MAX_PACKET_SIZE ({MAX_PACKET_SIZE})"
+            raise ValueError(msg)
+        self._buffer = bytearray(capacity)
+        # the whole arena, decode in place with `struct.unpack_from(fmt, buffer, at)`
+        self.buffer = memoryview(self._buffer)
+        # packet `i` spans `ends[i - 1]` (or 0) up to `ends[i]`
+        self.ends = array("Q")
+        self._next = 0
+
+    def __len__(self) -> int:
+        return len(self.ends)
+
+    def _reset(self) -> None:
+        del self.ends[:]
+        self._next = 0
+
+    def _span(self, i: int) -> memoryview:
+        start = self.ends[i - 1] if i else 0
+        return self.buffer[start : self.ends[i]]
+
+    def _free(self) -> memoryview | None:
+        """The unused tail of the arena, or None if a packet might not fit."""
+        offset = self.ends[-1] if self.ends else 0
+        if len(self._buffer) - offset < MAX_PACKET_SIZE:
+            return None
+        return self.buffer[offset:]
+
+
+class ServerPacketArena(_PacketArena):
+    """Receive a server's packets into one reusable buffer."""
+
+    def __init__(self, server: Server, capacity: int = DEFAULT_CAPACITY) -> None:
+        """Init."""
+        super().__init__(capacity)
+        self.server = server
+        self.client_indices = array("Q")
+
+    def update(self, time: float) -> int:
+        """Update the server and fill the arena with the packets it queued."""
+        self.server.update(time)
+        return self.fill()
+
+    def fill(self) -> int:
+        """Replace the arena contents with the queued packets.
+
+        Packets that do not fit stay queued on the server for the next fill.
+        """
+        self._reset()
+        del self.client_indices[:]
+        while (free := self._free()) is not None:
+            result = self.server.recv_into(free)
+            if result is None:
+                break
+            size, client_index = result
+            self.ends.append(len(self._buffer) - len(free) + size)
+            self.client_indices.append(client_index)
+        return len(self.ends)
+
+    def recv(self) -> tuple[memoryview, int] | None:
+        """Return the next packet of the tick, like `Server.recv`."""
+        if self._next == len(self.ends):
+            return None
+        self._next += 1
+        return self._span(self._next - 1), self.client_indices[self._next - 1]
+
+    def __iter__(self) -> Iterator[tuple[memoryview, int]]:
+        for i in range(len(self.ends)):
+            yield self._span(i), self.client_indices[i]
+
+
+class ClientPacketArena(_PacketArena):
+    """Receive a client's packets into one reusable buffer."""
+
+    def __init__(self, client: Client, capacity: int = DEFAULT_CAPACITY) -> None:
+        """Init."""
+        super().__init__(capacity)
+        self.client = client
+
+    def update(self, time: float) -> int:
+        """Update the client and fill the arena with the packets it queued."""
+        self.client.update(time)
+        return self.fill()
+
+    def fill(self) -> int:
+        """Replace the arena contents with the queued packets.
+
+        Packets that do not fit stay queued on the client for the next fill.
+        """
+        self._reset()
+        while (free := self._free()) is not None:
+            size = self.client.recv_into(free)
+            if size is None:
+                break
+            self.ends.append(len(self._buffer) - len(free) + size)
+        return len(self.ends)
+
+    def recv(self) -> memoryview | None:
+        """Return the next packet of the tick, like `Client.recv`."""
+        if self._next == len(self.ends):
+            return None
+        self._next += 1
+        return self._span(self._next - 1)
+
+    def __iter__(self) -> Iterator[memoryview]:
+        for i in range(len(self.ends)):
+            yield self._span(i)
@@ -0,0 +1,351 @@
+"""Compress payloads with zlib and a preset dictionary.
+
+Game payloads are small and repetitive, too small for deflate to find much to
+reuse inside one payload. A preset dictionary, trained offline from captured
+traffic with `train_dictionary` and shipped with both ends, gives every payload
+the same context to refer back to. Every payload is still compressed on its own,
+so a lost packet costs nothing but itself.
+
+Wrap the endpoints, and build them with `Compression.protocol_id` so only peers
+with the same dictionary can connect to each other:
+
+```python
+compression = Compression.from_file("snapshots.dict")
+protocol_id = compression.protocol_id(0xDEADBEEF)
+server = CompressedServer(netcode.Server(address, protocol_id, key), compression)
+server.send_all(snapshot)  # compressed once for every client
+print(server.compression.stats().ratio)
+```
+"""
+
+from __future__ import annotations
+
+import heapq
+import time
+import zlib
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from .netcode import MAX_PACKET_SIZE
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable
+    from os import PathLike
+
+    from .netcode import Buffer, Client, ClientIndex, Server
+
+FORMAT_VERSION = 1
+# the deflate window: a longer dictionary is only partly used
+MAX_DICTIONARY_SIZE = 32 * 1024
+DEFAULT_MIN_SIZE = 64
+
+# the first byte of every payload
+_RAW = b"\x00"
+_DEFLATE = b"\x01"
+# raw deflate, without the zlib header and checksum
+_WBITS = -15
+# substring length `train_dictionary` counts
+_NGRAM = 8
+
+
+class CompressionStats(NamedTuple):
+    """What a `Compression` did so far."""
+
+    sent: int
+    """Payloads encoded."""
+    compressed: int
+    """Payloads sent compressed; the others were small or incompressible."""
+    skipped: int
+    """Payloads shorter than `min_size`, sent as they were."""
+    raw_bytes: int
+    """Bytes of the encoded payloads."""
+    wire_bytes: int
+    """Bytes they were encoded to, header byte included."""
+    compress_seconds: float
+    """Time spent encoding, in seconds."""
+    received: int
+    """Payloads decoded."""
+    decompress_seconds: float
+    """Time spent decoding, in seconds."""
+    errors: int
+    """Payloads dropped because they did not decode."""
+
+    @property
+    def ratio(self) -> float:
+        """Wire bytes per payload byte sent, below 1 when compression pays off."""
+        return self.wire_bytes / self.raw_bytes if self.raw_bytes else 1.0
+
+
+class Compression:
+    """Encode payloads with deflate and a preset `dictionary`.
+
+    Payloads shorter than `min_size`, and payloads that would not shrink, go out
+    as they are. Either way, one header byte is added, so a payload can be at
+    most `MAX_PACKET_SIZE - 1` bytes.
+    """
+
+    def __init__(
+        self,
+        dictionary: bytes = b"",
+        *,
+        level: int = zlib.Z_DEFAULT_COMPRESSION,
+        min_size: int = DEFAULT_MIN_SIZE,
+    ) -> None:
+        """Init."""
+        if len(dictionary) > MAX_DICTIONARY_SIZE:
+            msg = f"dictionary must be at most {MAX_DICTIONARY_SIZE} bytes"
+            raise ValueError(msg)
+        if min_size < 0:
+            msg = "min_size must not be negative"
+            raise ValueError(msg)
+        self.dictionary = bytes(dictionary)
+        self.level = level
+        self.min_size = min_size
+        self.dictionary_id = zlib.crc32(bytes([FORMAT_VERSION]) + self.dictionary)
+        # loading the dictionary costs more than copying a stream that has it
+        if self.dictionary:
+            self._compressor = zlib.compressobj(
+                level, zlib.DEFLATED, _WBITS, zdict=self.dictionary
+            )
+            self._decompressor = zlib.decompressobj(_WBITS, zdict=self.dictionary)
+        else:
+            self._compressor = zlib.compressobj(level, zlib.DEFLATED, _WBITS)
+            self._decompressor = zlib.decompressobj(_WBITS)
+        self.reset_stats()
+
+    @classmethod
+    def from_file(cls, path: str | PathLike[str], **kwargs: int) -> Compression:
+        """Load a dictionary saved from `train_dictionary`."""
+        return cls(Path(path).read_bytes(), **kwargs)
+
+    def protocol_id(self, protocol_id: int) -> int:
+        """`protocol_id` with the dictionary mixed into its high 32 bits.
+
+        Servers and tokens built with it only accept clients that use the same
+        dictionary; everyone else fails to connect instead of exchanging payloads
+        they cannot read.
+        """
+        return protocol_id ^ (self.dictionary_id << 32)
+
+    def compress(self, data: Buffer) -> bytes:
+        """`data` with its header byte, deflated if that makes it smaller."""
+        started = time.perf_counter()
+        size = len(memoryview(data))
+        if size < self.min_size:
+            payload = _RAW + data
+            self._skipped += 1
+        else:
+            compressor = self._compressor.copy()
+            deflated = compressor.compress(data) + compressor.flush()
+            if len(deflated) < size:
+                payload = _DEFLATE + deflated
+                self._compressed += 1
+            else:
+                payload = _RAW + data
+        self._sent += 1
+        self._raw_bytes += size
+        self._wire_bytes += len(payload)
+        self._compress_seconds += time.perf_counter() - started
+        return payload
+
+    def decompress(self, payload: Buffer) -> bytes | None:
+        """The decoded payload, or None if it does not decode."""
+        started = time.perf_counter()
+        try:
+            return self._decompress(memoryview(payload))
+        finally:
+            self._received += 1
+            self._decompress_seconds += time.perf_counter() - started
+
+    def _decompress(self, payload: memoryview) -> bytes | None:
+        header, body = payload[:1], payload[1:]
+        if header == _RAW:
+            return bytes(body)
+        if header == _DEFLATE:
+            decompressor = self._decompressor.copy()
+            try:
+                # nothing larger than a packet was sent, refuse to inflate more
+                data = decompressor.decompress(body, MAX_PACKET_SIZE)
+            except zlib.error:
+                data = None
+            if data is not None and decompressor.eof:
+                return data
+        self._errors += 1
+        return None
+
+    def stats(self) -> CompressionStats:
+        """What was encoded and decoded since the last `reset_stats`."""
+        return CompressionStats(
+            sent=self._sent,
+            compressed=self._compressed,
+            skipped=self._skipped,
+            raw_bytes=self._raw_bytes,
+            wire_bytes=self._wire_bytes,
+            compress_seconds=self._compress_seconds,
+            received=self._received,
+            decompress_seconds=self._decompress_seconds,
+            errors=self._errors,
+        )
+
+    def reset_stats(self) -> None:
+        """Start counting from zero."""
+        self._sent = self._compressed = self._skipped = 0
+        self._raw_bytes = self._wire_bytes = 0
+        self._received = self._errors = 0
+        self._compress_seconds = self._decompress_seconds = 0.0
+
+
+def train_dictionary(
+    samples: Iterable[Buffer],
+    size: int = MAX_DICTIONARY_SIZE,
+    segment_size: int = 64,
+) -> bytes:
+    """Build a preset dictionary of at most `size` bytes from captured payloads.
+
+    The samples are cut into segments, and the segments that cover the substrings
+    shared by the most samples are picked, each scored only on what the ones
+    picked before it do not cover yet. The best segments go last, where deflate
+    refers to them with the shortest distances.
+    """
+    if not 0 < size <= MAX_DICTIONARY_SIZE:
+        msg = f"size must be between 1 and {MAX_DICTIONARY_SIZE}"
+        raise ValueError(msg)
+    captured = [bytes(sample) for sample in samples]
+    # in how many samples each substring occurs
+    frequency: Counter[bytes] = Counter()
+    for sample in captured:
+        frequency.update(_ngrams(sample))
+
+    segments = {
+        sample[start : start + segment_size]
+        for sample in captured
+        for start in range(0, len(sample), segment_size)
+    }
+    # substrings of a single sample are no use to any other payload
+    heap = [(-_score(s, frequency), s) for s in segments if len(s) >= _NGRAM]
+    heapq.heapify(heap)
+    picked: list[bytes] = []
+    free = size
+    while heap and free >= _NGRAM:
+        _, segment = heapq.heappop(heap)
+        score = _score(segment, frequency)
+        if score <= 0:
+            break
+        if heap and score < -heap[0][0]:
+            # covered by what was picked since it was scored, score it again
+            heapq.heappush(heap, (-score, segment))
+            continue
+        if len(segment) > free:
+            continue
+        picked.append(segment)
+        free -= len(segment)
+        for ngram in _ngrams(segment):
+            frequency[ngram] = 0
+    return b"".join(reversed(picked))
+
+
+def _ngrams(data: bytes) -> set[bytes]:
+    return {data[i : i + _NGRAM] for i in range(len(data) - _NGRAM + 1)}
+
+
+def _score(segment: bytes, frequency: Counter[bytes]) -> int:
+    return sum(frequency[ngram] - 1 for ngram in _ngrams(segment) if frequency[ngram])
+
+
+class CompressedServer:
+    """A `Server` whose payloads go through a `Compression`.
+
+    Payloads that do not decode are dropped and counted in the stats' `errors`.
+    Everything but sending and receiving is on `server`.
+    """
+
+    def __init__(self, server: Server, compression: Compression) -> None:
+        """Init."""
+        self.server = server
+        self.compression = compression
+
+    def update(self, time: float) -> None:
+        """Update the server."""
+        self.server.update(time)
+
+    def recv(self) -> tuple[bytes, ClientIndex] | None:
+        """The next payload that decodes, and the client it came from."""
+        while (result := self.server.recv()) is not None:
+            payload, client_index = result
+            data = self.compression.decompress(payload)
+            if data is not None:
+                return data, client_index
+        return None
+
+    def recv_many(
+        self, max_packets: int | None = None, timeout: float | None = None
+    ) -> tuple[list[bytes], array[int]]:
+        """Like `Server.recv_many`, without the payloads that do not decode."""
+        payloads, client_indices = self.server.recv_many(max_packets, timeout)
+        decompress = self.compression.decompress
+        decoded: list[bytes] = []
+        kept: list[int] = []
+        for i, payload in enumerate(payloads):
+            data = decompress(payload)
+            if data is not None:
+                decoded.append(data)
+                kept.append(i)
+        if len(kept) < len(payloads):
+            client_indices = array("Q", [client_indices[i] for i in kept])
+        return decoded, client_indices
+
+    def send(self, data: Buffer, client_index: ClientIndex) -> None:
+        """Compress `data` and send it to a client."""
+        self.server.send(self.compression.compress(data), client_index)
+
+    def send_all(self, data: Buffer) -> None:
+        """Compress `data` once and send it to every connected client."""
+        self.server.send_all(self.compression.compress(data))
+
+    def send_group(self, group: str, data: Buffer) -> int:
+        """Compress `data` once and send it to the members of `group`."""
+        return self.server.send_group(group, self.compression.compress(data))
+
+    def send_many(self, pairs: Iterable[tuple[Buffer, ClientIndex | int]]) -> int:
+        """Compress each payload and send it to its client."""
+        compress = self.compression.compress
+        return self.server.send_many(
+            [(compress(data), client_index) for data, client_index in pairs]
+        )
+
+
+class CompressedClient:
+    """A `Client` whose payloads go through a `Compression`.
+
+    Payloads that do not decode are dropped and counted in the stats' `errors`.
+    Everything but sending and receiving is on `client`.
+    """
+
+    def __init__(self, client: Client, compression: Compression) -> None:
+        """Init."""
+        self.client = client
+        self.compression = compression
+
+    def update(self, time: float) -> None:
+        """Update the client."""
+        self.client.update(time)
+
+    def recv(self) -> bytes | None:
+        """The next payload that decodes."""
+        while (payload := self.client.recv()) is not None:
+            data = self.compression.decompress(payload)
+            if data is not None:
+                return data
+        return None
+
+    def recv_many(self, max_packets: int | None = None) -> list[bytes]:
+        """Like `Client.recv_many`, without the payloads that do not decode."""
+        payloads = self.client.recv_many(max_packets)
+        decoded = (self.compression.decompress(payload) for payload in payloads)
+        return [data for data in decoded if data is not None]
+
+    def send(self, data: Buffer) -> None:
+        """Compress `data` and send it to the server."""
+        self.client.send(self.compression.compress(data))
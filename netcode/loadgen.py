@@ -0,0 +1,480 @@
+r"""Load-test a server with thousands of simulated clients.
+
+A few worker processes each drive many `Client`s from one tick loop: every tick
+they update all their clients, send the messages that are due and read what came
+back. Messages carry their send time, so a server that echoes them back (like
+`serve_echo`) yields round-trip times; RTTs include up to a tick of queueing on
+each side, as in a real game.
+
+From the command line, mint tokens with the server's key:
+
+    python -m netcode.loadgen echo 127.0.0.1:40000 --key-file key.bin
+    python -m netcode.loadgen run 127.0.0.1:40000 --key-file key.bin --clients 5000
+
+or from Python:
+
+    report = LoadGenerator(address, protocol_id, private_key, clients=5000).run(30)
+    sys.stdout.write(f"{report}\n")
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import random
+import struct
+import sys
+import threading
+import time
+from array import array
+from collections import deque
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, NamedTuple
+
+from .netcode import (
+    CONNECT_TOKEN_BYTES,
+    MAX_PACKET_SIZE,
+    Client,
+    ConnectToken,
+    Server,
+    generate_key,
+    generate_tokens,
+)
+from .parallel import SafeProcess
+from .tick import TickLoop
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Sequence
+
+    from .netcode import Address
+
+# messages start with their send time, as a little-endian double
+_TIMESTAMP = struct.Struct("<d")
+DEFAULT_PROTOCOL_ID = 0xDEADBEEF
+
+
+class Percentiles(NamedTuple):
+    """A summary of samples in seconds, `nan` without samples."""
+
+    samples: int
+    p50: float
+    p90: float
+    p99: float
+    max: float
+
+    @classmethod
+    def from_samples(cls, samples: Iterable[float]) -> Percentiles:
+        """Summarize `samples`, in any order."""
+        ordered = sorted(samples)
+        if not ordered:
+            return cls(0, math.nan, math.nan, math.nan, math.nan)
+
+        def rank(q: float) -> float:
+            return ordered[min(len(ordered) - 1, math.ceil(q * len(ordered)) - 1)]
+
+        return cls(len(ordered), rank(0.5), rank(0.9), rank(0.99), ordered[-1])
+
+    def __str__(self) -> str:
+        if not self.samples:
+            return "no samples"
+        return (
+            f"p50 {self.p50 * 1000:.1f} ms, p90 {self.p90 * 1000:.1f} ms, "
+            f"p99 {self.p99 * 1000:.1f} ms, max {self.max * 1000:.1f} ms "
+            f"({self.samples} samples)"
+        )
+
+
+class WorkerResult(NamedTuple):
+    """What one worker measured, sent back to the parent when it stops."""
+
+    connect_latencies: array[float]
+    rtts: array[float]
+    connected: int
+    failed: int
+    disconnected: int
+    sent: int
+    received: int
+
+
+@dataclass(frozen=True)
+class LoadReport:
+    """The outcome of a load test."""
+
+    clients: int
+    duration: float
+    connected: int
+    failed: int
+    disconnected: int
+    sent: int
+    received: int
+    connect_latency: Percentiles
+    rtt: Percentiles
+
+    def __str__(self) -> str:
+        return "\n".join(
+            [
+                (
+                    f"clients:         {self.connected}/{self.clients} connected, "
+                    f"{self.failed} failed, {self.disconnected} dropped"
+                ),
+                (
+                    f"messages:        {self.sent} sent, {self.received} echoed, "
+                    f"{self.sent / self.duration:.0f}/s over {self.duration:.1f}s"
+                ),
+                f"connect latency: {self.connect_latency}",
+                f"message RTT:     {self.rtt}",
+            ]
+        )
+
+
+class _Swarm:
+    """The clients of one worker and what they measured so far."""
+
+    def __init__(
+        self, clients: list[Client], payload_size: int, send_rate: float, ramp_up: float
+    ) -> None:
+        self.padding = bytes(payload_size - _TIMESTAMP.size)
+        self.send_rate = send_rate
+        # spread the handshakes over the ramp-up instead of a storm in one tick
+        self.waiting = deque(
+            (ramp_up * i / len(clients), client) for i, client in enumerate(clients)
+        )
+        self.connecting: dict[Client, float] = {}
+        self.live: list[Client] = []
+        self.connect_latencies: array[float] = array("d")
+        self.rtts: array[float] = array("d")
+        self.failed = self.disconnected = self.sent = self.received = 0
+        self._send_budget = 0.0
+        self._cursor = 0
+
+    def tick(self, elapsed_time: float, dt: float) -> None:
+        now = time.perf_counter()
+        while self.waiting and self.waiting[0][0] <= elapsed_time:
+            _at, client = self.waiting.popleft()
+            client.connect()
+            self.connecting[client] = now
+
+        for client in self.connecting:
+            client.update(elapsed_time)
+        for client in self.live:
+            client.update(elapsed_time)
+        self._settle()
+        self._send(dt)
+        self._receive()
+
+    def _settle(self) -> None:
+        for client, connect_start in list(self.connecting.items()):
+            if client.is_connected():
+                self.connect_latencies.append(time.perf_counter() - connect_start)
+                self.live.append(client)
+                del self.connecting[client]
+            elif not client.is_pending():
+                self.failed += 1
+                del self.connecting[client]
+        live = [client for client in self.live if client.is_connected()]
+        self.disconnected += len(self.live) - len(live)
+        self.live = live
+
+    def _send(self, dt: float) -> None:
+        if not self.live:
+            return
+        self._send_budget += self.send_rate * len(self.live) * dt
+        due = int(self._send_budget)
+        self._send_budget -= due
+        for _ in range(due):
+            client = self.live[self._cursor % len(self.live)]
+            self._cursor += 1
+            client.send(_TIMESTAMP.pack(time.perf_counter()) + self.padding)
+        self.sent += due
+
+    def _receive(self) -> None:
+        for client in self.live:
+            for payload in client.recv_many():
+                if len(payload) >= _TIMESTAMP.size:
+                    (sent_at,) = _TIMESTAMP.unpack_from(payload)
+                    self.rtts.append(time.perf_counter() - sent_at)
+                    self.received += 1
+
+    def result(self) -> WorkerResult:
+        return WorkerResult(
+            self.connect_latencies,
+            self.rtts,
+            len(self.live),
+            self.failed + len(self.connecting),
+            self.disconnected,
+            self.sent,
+            self.received,
+        )
+
+
+class LoadWorker(SafeProcess):
+    """Process that drives a share of a `LoadGenerator`'s clients."""
+
+    use_stop_event = True
+
+    def __init__(  # noqa: PLR0913
+        self,
+        worker: int,
+        server_address: Address,
+        protocol_id: int,
+        private_key: bytes,
+        client_ids: range,
+        send_rate: float,
+        payload_size: int,
+        tick_rate: float,
+        ramp_up: float,
+    ) -> None:
+        """Init."""
+        super().__init__(name=f"Load worker {worker}")
+        self.server_address = server_address
+        self.protocol_id = protocol_id
+        self.private_key = private_key
+        self.client_ids = client_ids
+        self.send_rate = send_rate
+        self.payload_size = payload_size
+        self.tick_rate = tick_rate
+        self.ramp_up = ramp_up
+
+    def user_target(self) -> None:
+        """Run the clients until stopped, then report what they measured."""
+        assert self._stop_event is not None
+
+        records = generate_tokens(
+            [self.server_address], self.protocol_id, self.client_ids, self.private_key
+        )
+        clients = [
+            Client(ConnectToken.from_bytes(records[i : i + CONNECT_TOKEN_BYTES]))
+            for i in range(0, len(records), CONNECT_TOKEN_BYTES)
+        ]
+        swarm = _Swarm(clients, self.payload_size, self.send_rate, self.ramp_up)
+
+        # a saturated worker skips ticks rather than bunching them up; the next
+        # tick's `dt` covers the skipped ones, so the send rate holds
+        last_tick = 0.0
+        for elapsed_time in TickLoop(tick_hz=self.tick_rate, policy="skip"):
+            swarm.tick(elapsed_time, elapsed_time - last_tick)
+            last_tick = elapsed_time
+            if self._stop_event.is_set():
+                break
+
+        for client in swarm.live:
+            client.disconnect()
+        self.result_queue.put(swarm.result())
+
+
+class LoadGenerator:
+    """`clients` simulated clients spread over `workers` processes.
+
+    Each connected client sends `send_rate` messages per second of
+    `payload_size` bytes, and handshakes are spread over `ramp_up` seconds.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        server_address: Address,
+        protocol_id: int,
+        private_key: bytes,
+        *,
+        clients: int = 1000,
+        workers: int | None = None,
+        send_rate: float = 10.0,
+        payload_size: int = 64,
+        tick_rate: float = 60.0,
+        ramp_up: float = 1.0,
+        first_client_id: int | None = None,
+    ) -> None:
+        """Init."""
+        if not _TIMESTAMP.size <= payload_size <= MAX_PACKET_SIZE:
+            msg = (
+                f"payload_size must be between {_TIMESTAMP.size} and {MAX_PACKET_SIZE}"
+            )
+            raise ValueError(msg)
+        self.server_address = server_address
+        self.protocol_id = protocol_id
+        self.private_key = private_key
+        self.clients = clients
+        self.workers = max(1, min(workers or os.cpu_count() or 1, clients))
+        self.send_rate = send_rate
+        self.payload_size = payload_size
+        self.tick_rate = tick_rate
+        self.ramp_up = ramp_up
+        if first_client_id is None:
+            first_client_id = random.getrandbits(63)
+        self.first_client_id = first_client_id
+
+        self._processes: list[LoadWorker] = []
+        self._started_at = 0.0
+
+    def start(self) -> None:
+        """Start the workers; clients begin connecting right away."""
+        per_worker = math.ceil(self.clients / self.workers)
+        for worker in range(self.workers):
+            first = worker * per_worker
+            last = min(self.clients, first + per_worker)
+            process = LoadWorker(
+                worker=worker,
+                server_address=self.server_address,
+                protocol_id=self.protocol_id,
+                private_key=self.private_key,
+                client_ids=range(
+                    self.first_client_id + first, self.first_client_id + last
+                ),
+                send_rate=self.send_rate,
+                payload_size=self.payload_size,
+                tick_rate=self.tick_rate,
+                ramp_up=self.ramp_up,
+            )
+            process.start()
+            self._processes.append(process)
+        self._started_at = time.monotonic()
+
+    def stop(self, timeout: float = 10.0) -> LoadReport:
+        """Stop the workers and summarize what they measured."""
+        duration = time.monotonic() - self._started_at
+        for process in self._processes:
+            process.stop()
+        results = [self._result(process, timeout) for process in self._processes]
+        for process in self._processes:
+            process.join(timeout=timeout)
+        self._processes.clear()
+
+        return LoadReport(
+            clients=self.clients,
+            duration=duration,
+            connected=sum(result.connected for result in results),
+            failed=sum(result.failed for result in results),
+            disconnected=sum(result.disconnected for result in results),
+            sent=sum(result.sent for result in results),
+            received=sum(result.received for result in results),
+            connect_latency=Percentiles.from_samples(
+                [s for result in results for s in result.connect_latencies]
+            ),
+            rtt=Percentiles.from_samples(
+                [s for result in results for s in result.rtts]
+            ),
+        )
+
+    def run(self, duration: float) -> LoadReport:
+        """Run the load for `duration` seconds, ramp-up included."""
+        self.start()
+        try:
+            time.sleep(duration)
+        finally:
+            report = self.stop()
+        return report
+
+    @staticmethod
+    def _result(process: LoadWorker, timeout: float) -> WorkerResult:
+        # read before joining: a large result blocks the worker until it is read
+        deadline = time.monotonic() + timeout
+        while process.result_queue.empty():
+            if not process.is_alive() or time.monotonic() > deadline:
+                exception = process.exception
+                msg = f"'{process.name}' did not report"
+                if exception is not None:
+                    raise RuntimeError(msg) from exception[0]
+                raise RuntimeError(msg)
+            time.sleep(0.01)
+        result: WorkerResult = process.result_queue.get()
+        return result
+
+
+def serve_echo(
+    server: Server, tick_rate: float = 60.0, stop: threading.Event | None = None
+) -> None:
+    """Send every packet `server` receives back to its sender.
+
+    Runs until `stop` is set, or until interrupted without one.
+    """
+    stop = stop or threading.Event()
+    server.start_background(tick_hz=tick_rate)
+    try:
+        while not stop.is_set():
+            payloads, client_indices = server.recv_many(timeout=1 / tick_rate)
+            if payloads:
+                server.send_many(zip(payloads, client_indices, strict=True))
+    finally:
+        server.stop_background()
+
+
+def _address(value: str) -> Address:
+    host, _, port = value.rpartition(":")
+    if not host:
+        msg = f"expected HOST:PORT, got {value!r}"
+        raise argparse.ArgumentTypeError(msg)
+    return host.strip("[]"), int(port)
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m netcode.loadgen", description=__doc__.splitlines()[0]
+    )
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="connect clients to a server and load it")
+    echo = commands.add_parser("echo", help="run a server that echoes every packet")
+    for command in (run, echo):
+        command.add_argument("address", type=_address, help="the server's HOST:PORT")
+        command.add_argument(
+            "--protocol-id",
+            type=lambda value: int(value, 0),
+            default=DEFAULT_PROTOCOL_ID,
+        )
+        command.add_argument(
+            "--key-file",
+            type=Path,
+            help="the server's private key; echo writes a new one if it is missing",
+        )
+        command.add_argument("--tick-rate", type=float, default=60.0)
+
+    run.add_argument("--clients", type=int, default=1000)
+    run.add_argument("--workers", type=int, help="processes, one per core by default")
+    run.add_argument("--rate", type=float, default=10.0, help="messages/s per client")
+    run.add_argument("--payload-size", type=int, default=64)
+    run.add_argument("--duration", type=float, default=30.0, help="seconds")
+    run.add_argument("--ramp-up", type=float, default=1.0, help="seconds")
+    return parser
+
+
+def main(argv: Sequence[str] | None = None) -> None:
+    """Run the `echo` or `run` command of the command line."""
+    args = _parser().parse_args(argv)
+    key_file: Path | None = args.key_file
+
+    if args.command == "echo":
+        if key_file is None or not key_file.exists():
+            private_key = generate_key()
+            if key_file is not None:
+                key_file.write_bytes(private_key)
+        else:
+            private_key = key_file.read_bytes()
+        host, port = args.address
+        sys.stdout.write(f"echoing on {host}:{port}, key {private_key.hex()}\n")
+        sys.stdout.flush()
+        try:
+            server = Server(args.address, args.protocol_id, private_key)
+            serve_echo(server, args.tick_rate)
+        except KeyboardInterrupt:
+            pass
+        return
+
+    if key_file is None:
+        sys.exit("run needs the server's --key-file to mint tokens")
+    generator = LoadGenerator(
+        args.address,
+        args.protocol_id,
+        key_file.read_bytes(),
+        clients=args.clients,
+        workers=args.workers,
+        send_rate=args.rate,
+        payload_size=args.payload_size,
+        tick_rate=args.tick_rate,
+        ramp_up=args.ramp_up,
+    )
+    sys.stdout.write(f"{generator.run(args.duration)}\n")
+
+
+if __name__ == "__main__":
+    main()
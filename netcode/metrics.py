@@ -0,0 +1,241 @@
+"""Export `Server.metrics()` and `Client.metrics()` in the Prometheus text format.
+
+`prometheus_text` renders one endpoint's counters, and `serve` answers scrapes
+from a small HTTP server on a daemon thread. `Server.metrics()` reads atomics
+without taking the server's lock, so a plain scrape never stalls a tick. With
+`per_client`, `Server.client_metrics()` takes the server's lock, and a reliable
+`Client`'s `metrics()` takes its channel's; those scrapes wait for an `update`
+that is in progress.
+
+```python
+with netcode.metrics.serve(server, ("127.0.0.1", 9464)):
+    run_game(server)
+```
+"""
+
+from __future__ import annotations
+
+import math
+import threading
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import TYPE_CHECKING
+
+from .netcode import Client, Server
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Mapping
+    from types import TracebackType
+
+    from .netcode import Address, UpdateHistogram
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_ADDRESS = ("127.0.0.1", 9464)
+
+_GAUGES = frozenset({"connected_clients", "reliable_pending"})
+_HELP = {
+    "packets_in": "Packets received, handshakes and keep-alives included.",
+    "bytes_in": "Bytes received, handshakes and keep-alives included.",
+    "packets_out": "Packets sent, handshakes and keep-alives included.",
+    "bytes_out": "Bytes sent, handshakes and keep-alives included.",
+    "connection_requests": "Connection requests received.",
+    "connection_requests_rejected": "Connection requests dropped before decryption.",
+    "connection_requests_rejected_full": "Connection requests dropped while full.",
+    "connection_requests_rejected_malformed": (
+        "Connection requests of the wrong size or version."
+    ),
+    "connection_requests_rejected_protocol_id": (
+        "Connection requests for another protocol id."
+    ),
+    "connection_requests_rejected_expired": "Connection requests with expired tokens.",
+    "connection_requests_rejected_replayed": (
+        "Connection requests replaying a token from another address."
+    ),
+    "connection_requests_rejected_rate_limited": (
+        "Connection requests over their source's rate limit."
+    ),
+    "connection_requests_rejected_over_budget": (
+        "Connection requests over the handshake budget of a tick."
+    ),
+    "payload_packets_in": "Payload packets received, before decryption.",
+    "payloads_received": "Payloads accepted by netcode.",
+    "payloads_rejected": "Payloads that failed decryption or replay checks.",
+    "payloads_dropped": "Payloads dropped because the receive queue was full.",
+    "connected_clients": "Connected clients.",
+    "update_seconds": "Time spent in update.",
+    "reliable_sent": "Reliable messages sent, not counting resends.",
+    "reliable_resent": "Reliable messages resent for lack of an ack.",
+    "reliable_acked": "Reliable messages acked.",
+    "reliable_delivered": "Reliable messages received and delivered in order.",
+    "reliable_duplicates": "Reliable messages received again.",
+    "reliable_dropped": "Reliable messages refused for lack of room.",
+    "reliable_pending": "Reliable messages waiting for their ack.",
+    "reliable_ack_seconds": "Time from sending a reliable message to its ack.",
+}
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels: Mapping[str, str], **extra: str) -> str:
+    merged = {**labels, **extra}
+    if not merged:
+        return ""
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in merged.items())
+    return f"{{{pairs}}}"
+
+
+def _histogram(
+    name: str, histogram: UpdateHistogram, labels: Mapping[str, str]
+) -> list[str]:
+    lines = [f"# TYPE {name} histogram"]
+    total = 0
+    bounds = [*map(repr, histogram["buckets"]), "+Inf"]
+    for bound, count in zip(bounds, histogram["counts"], strict=True):
+        total += count
+        lines.append(f"{name}_bucket{_labels(labels, le=bound)} {total}")
+    lines.append(f"{name}_sum{_labels(labels)} {histogram['sum']!r}")
+    lines.append(f"{name}_count{_labels(labels)} {total}")
+    return lines
+
+
+def prometheus_text(
+    endpoint: Server | Client,
+    *,
+    prefix: str | None = None,
+    labels: Mapping[str, str] | None = None,
+    per_client: bool = False,
+) -> str:
+    """Render `endpoint.metrics()` in the Prometheus text exposition format.
+
+    Metric names start with `prefix`, `netcode_server` or `netcode_client` by
+    default, and every sample carries `labels`. With `per_client`, a server also
+    exports `Server.client_metrics()` labelled by client index; that is one series
+    per client and counter, so keep it off for servers with many clients.
+    """
+    if prefix is None:
+        prefix = "netcode_server" if isinstance(endpoint, Server) else "netcode_client"
+    labels = labels or {}
+    lines: list[str] = []
+    metrics = endpoint.metrics()
+    for key, value in metrics.items():
+        if not isinstance(value, int):  # histograms below, and `reliable_rtt`
+            continue
+        kind = "gauge" if key in _GAUGES else "counter"
+        name = f"{prefix}_{key}" if kind == "gauge" else f"{prefix}_{key}_total"
+        lines.append(f"# HELP {name} {_HELP.get(key, key)}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.append(f"{name}{_labels(labels)} {value}")
+    histograms = [("update_seconds", metrics["update_seconds"])]
+    if "reliable_ack_seconds" in metrics:
+        histograms.append(("reliable_ack_seconds", metrics["reliable_ack_seconds"]))
+    for key, histogram in histograms:
+        name = f"{prefix}_{key}"
+        lines.append(f"# HELP {name} {_HELP[key]}")
+        lines.extend(_histogram(name, histogram, labels))
+
+    if per_client and isinstance(endpoint, Server):
+        lines.extend(_client_lines(endpoint, prefix, labels))
+    return "\n".join(lines) + "\n"
+
+
+def _client_lines(server: Server, prefix: str, labels: Mapping[str, str]) -> list[str]:
+    lines: list[str] = []
+    table = server.client_metrics()
+    indices = [str(index) for index in table["indices"]]
+    columns = {
+        "packets_in": table["packets_in"],
+        "bytes_in": table["bytes_in"],
+        "packets_out": table["packets_out"],
+        "bytes_out": table["bytes_out"],
+    }
+    for column, values in columns.items():
+        name = f"{prefix}_client_{column}_total"
+        lines.append(f"# TYPE {name} counter")
+        for index, value in zip(indices, values, strict=True):
+            lines.append(f"{name}{_labels(labels, client_index=index)} {value}")
+    name = f"{prefix}_client_last_receive_age_seconds"
+    lines.append(f"# TYPE {name} gauge")
+    for index, age in zip(indices, table["last_receive_age"], strict=True):
+        if not math.isnan(age):
+            lines.append(f"{name}{_labels(labels, client_index=index)} {age!r}")
+    return lines
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server: MetricsServer
+
+    def do_GET(self) -> None:  # noqa: N802 - the name http.server dispatches to
+        if self.path.split("?", 1)[0] not in ("/", "/metrics"):
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        body = self.server.render().encode()
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", CONTENT_TYPE)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: object) -> None:  # noqa: A002
+        """Scrapes are too frequent to log."""
+
+
+class MetricsServer(ThreadingHTTPServer):
+    """Serves `render()` on `/metrics` from a daemon thread; see `serve`."""
+
+    daemon_threads = True
+
+    def __init__(self, address: Address, render: Callable[[], str]) -> None:
+        """Bind `address` and start serving."""
+        super().__init__(address, _Handler)
+        self.render = render
+        self._thread = threading.Thread(
+            target=self.serve_forever, name="netcode-metrics", daemon=True
+        )
+        self._thread.start()
+
+    @property
+    def address(self) -> Address:
+        """The address it listens on, with the port picked for port 0."""
+        host, port = self.server_address[:2]
+        return str(host), int(port)
+
+    def close(self) -> None:
+        """Stop serving and wait for the thread to finish."""
+        self.shutdown()
+        self.server_close()
+        self._thread.join()
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+
+def serve(
+    source: Server | Client | Callable[[], str],
+    address: Address = DEFAULT_ADDRESS,
+    *,
+    labels: Mapping[str, str] | None = None,
+    per_client: bool = False,
+) -> MetricsServer:
+    """Answer Prometheus scrapes on `http://{address}/metrics`.
+
+    `source` is an endpoint, rendered with `prometheus_text` and the given `labels`
+    and `per_client`, or a function returning the whole response, to export
+    several endpoints at once. Port 0 picks a free port, see
+    `MetricsServer.address`; the default address only accepts local scrapes.
+    """
+    if isinstance(source, Server | Client):
+        endpoint = source
+
+        def render() -> str:
+            return prometheus_text(endpoint, labels=labels, per_client=per_client)
+
+    else:
+        render = source
+    return MetricsServer(address, render)
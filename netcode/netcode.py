@@ -7,12 +7,19 @@ from _netcode import (
     MAX_PACKET_SIZE,
     NETCODE_VERSION,
     PRIVATE_KEY_BYTES,
+    PROFILE_PHASES,
     USER_DATA_BYTES,
+    AdmissionControl,
     Client,
     ClientIndex,
+    ClientTable,
     ConnectToken,
+    LoopbackNetwork,
+    NetworkConditions,
     Server,
+    ServerAddressSet,
     generate_key,
+    generate_tokens,
 )
 
 __all__ = [
@@ -20,10 +27,17 @@ __all__ = [
     "MAX_PACKET_SIZE",
     "NETCODE_VERSION",
     "PRIVATE_KEY_BYTES",
+    "PROFILE_PHASES",
     "USER_DATA_BYTES",
+    "AdmissionControl",
     "Client",
     "ConnectToken",
+    "LoopbackNetwork",
+    "NetworkConditions",
     "generate_key",
+    "generate_tokens",
     "Server",
+    "ServerAddressSet",
     "ClientIndex",
+    "ClientTable",
 ]
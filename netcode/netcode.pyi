@@ -1,59 +1,288 @@
-from typing import TypeAlias
+from array import array
+from collections.abc import Iterable, Sequence
+from typing import Literal, NotRequired, TypeAlias, TypedDict
 
 from .client_state import ClientState
 
 Address: TypeAlias = tuple[str, int]
 ClientID: TypeAlias = int
+Buffer: TypeAlias = bytes | bytearray | memoryview
+ServerEvent: TypeAlias = tuple[
+    Literal["connect", "disconnect"], ClientIndex, ClientID, bytes
+]
+
+class UpdateHistogram(TypedDict):
+    buckets: list[float]
+    counts: list[int]
+    sum: float
+
+class EndpointMetrics(TypedDict):
+    packets_in: int
+    bytes_in: int
+    packets_out: int
+    bytes_out: int
+    update_seconds: UpdateHistogram
+    # with `reliable=True`
+    reliable_sent: NotRequired[int]
+    reliable_resent: NotRequired[int]
+    reliable_acked: NotRequired[int]
+    reliable_delivered: NotRequired[int]
+    reliable_duplicates: NotRequired[int]
+    reliable_dropped: NotRequired[int]
+    reliable_ack_seconds: NotRequired[UpdateHistogram]
+
+class ClientMetrics(EndpointMetrics):
+    reliable_pending: NotRequired[int]
+    reliable_rtt: NotRequired[float]
+
+class ServerMetrics(EndpointMetrics):
+    connection_requests: int
+    connection_requests_rejected: int
+    connection_requests_rejected_full: int
+    connection_requests_rejected_malformed: int
+    connection_requests_rejected_protocol_id: int
+    connection_requests_rejected_expired: int
+    connection_requests_rejected_replayed: int
+    connection_requests_rejected_rate_limited: int
+    connection_requests_rejected_over_budget: int
+    payload_packets_in: int
+    payloads_received: int
+    payloads_rejected: int
+    payloads_dropped: int
+    connected_clients: int
+
+class ProfileSpans(TypedDict):
+    frame: array[int]
+    phase: array[int]
+    start: array[float]
+    duration: array[float]
+
+class ClientMetricsTable(TypedDict):
+    indices: array[int]
+    packets_in: array[int]
+    bytes_in: array[int]
+    packets_out: array[int]
+    bytes_out: array[int]
+    last_receive_age: array[float]
+    # with `reliable=True`
+    reliable_rtt: NotRequired[array[float]]
+    reliable_pending: NotRequired[array[int]]
+    reliable_sent: NotRequired[array[int]]
+    reliable_resent: NotRequired[array[int]]
+    reliable_delivered: NotRequired[array[int]]
 
 def generate_key() -> bytes: ...
+def generate_tokens(  # noqa: PLR0913
+    server_addresses: list[Address] | ServerAddressSet,
+    protocol_id: int,
+    client_ids: Sequence[int],
+    private_key: bytes,
+    *,
+    expire_seconds: int | None = None,
+    timeout_seconds: int | None = None,
+) -> bytes: ...
 
 CONNECT_TOKEN_BYTES: int
 MAX_PACKET_SIZE: int
 NETCODE_VERSION: bytes
 PRIVATE_KEY_BYTES: int
+PROFILE_PHASES: tuple[str, ...]
 USER_DATA_BYTES: int
 
-class ClientIndex: ...
+class LoopbackNetwork:
+    def __init__(self, queue_capacity: int = 65536) -> None: ...
+    @property
+    def time(self) -> float: ...
+    def advance(self, dt: float) -> float: ...
+    def sent_packets(self) -> int: ...
+    def sent_bytes(self) -> int: ...
+    def in_flight(self) -> int: ...
+    def dropped(self) -> int: ...
+    def endpoints(self) -> int: ...
+
+class NetworkConditions:
+    latency: float
+    jitter: float
+    loss: float
+    duplicate: float
+    reorder: float
+    reorder_delay: float
+    bandwidth: float | None
+    seed: int | None
+    def __init__(  # noqa: PLR0913
+        self,
+        *,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        loss: float = 0.0,
+        duplicate: float = 0.0,
+        reorder: float = 0.0,
+        reorder_delay: float = 0.05,
+        bandwidth: float | None = None,
+        seed: int | None = None,
+    ) -> None: ...
+
+class AdmissionControl:
+    source_rate: float | None
+    source_burst: float
+    max_sources: int
+    handshakes_per_tick: int | None
+    replay_cache: int
+    def __init__(
+        self,
+        *,
+        source_rate: float | None = 20.0,
+        source_burst: float = 20.0,
+        max_sources: int = 65536,
+        handshakes_per_tick: int | None = 64,
+        replay_cache: int = 4096,
+    ) -> None: ...
+
+class ClientIndex:
+    def __int__(self) -> int: ...
+    def __index__(self) -> int: ...
+    def __hash__(self) -> int: ...
+    def __eq__(self, other: object) -> bool: ...
+    def __lt__(self, other: ClientIndex) -> bool: ...
+    def __le__(self, other: ClientIndex) -> bool: ...
+    def __gt__(self, other: ClientIndex) -> bool: ...
+    def __ge__(self, other: ClientIndex) -> bool: ...
+
+class ClientTable:
+    indices: array[int]
+    client_ids: array[int]
+    ips: bytes
+    ports: array[int]
+    def __len__(self) -> int: ...
+    def address(self, i: int) -> Address: ...
 
 class Server:
     clients: list[ClientIndex]
     def __init__(
-        self, bind_addr: Address, protocol_id: int, private_key: bytes
+        self,
+        bind_addr: Address,
+        protocol_id: int,
+        private_key: bytes,
+        *,
+        reuse_port: bool = False,
+        network: LoopbackNetwork | None = None,
+        send_conditions: NetworkConditions | None = None,
+        recv_conditions: NetworkConditions | None = None,
+        max_clients: int | None = None,
+        admission: AdmissionControl | None = None,
+        keep_alive_interval: float | None = None,
+        num_disconnect_packets: int | None = None,
+        token_expire_seconds: int = -1,
+        token_timeout_seconds: int = -1,
+        coalesce: bool = False,
+        reliable: bool = False,
     ) -> None: ...
+    def fileno(self) -> int: ...
     def update(self, time: float) -> None: ...
+    def start_background(
+        self, tick_hz: float = 60.0, queue_capacity: int = 65536
+    ) -> None: ...
+    def stop_background(self) -> None: ...
+    def is_background_running(self) -> bool: ...
     def recv(self) -> tuple[bytes, ClientIndex] | None: ...
-    def send(self, data: bytes, client_index: ClientIndex) -> None: ...
-    def send_all(self, data: bytes) -> None: ...
-    def token(self, client_id: int) -> ConnectToken: ...
+    def recv_many(
+        self, max_packets: int | None = None, timeout: float | None = None
+    ) -> tuple[list[bytes], array[int]]: ...
+    def recv_into(self, buffer: bytearray | memoryview) -> tuple[int, int] | None: ...
+    def send(self, data: Buffer, client_index: ClientIndex) -> None: ...
+    def send_reliable(self, data: Buffer, client_index: ClientIndex | int) -> None: ...
+    def send_all(self, data: Buffer) -> None: ...
+    def flush(self) -> None: ...
+    def send_many(self, pairs: Iterable[tuple[Buffer, ClientIndex | int]]) -> int: ...
+    def add_to_group(self, group: str, client_index: ClientIndex | int) -> bool: ...
+    def remove_from_group(
+        self, group: str, client_index: ClientIndex | int
+    ) -> bool: ...
+    def group_members(self, group: str) -> list[ClientIndex]: ...
+    def groups(self) -> list[str]: ...
+    def send_group(self, group: str, data: Buffer) -> int: ...
+    def send_packed(
+        self, data: Buffer, ends: array[int], client_indices: array[int]
+    ) -> int: ...
+    def token(
+        self,
+        client_id: int,
+        *,
+        expire_seconds: int | None = None,
+        timeout_seconds: int | None = None,
+    ) -> ConnectToken: ...
+    def tokens(
+        self,
+        client_ids: Sequence[int],
+        *,
+        expire_seconds: int | None = None,
+        timeout_seconds: int | None = None,
+    ) -> bytes: ...
     def disconnect(self, client_index: ClientIndex) -> None: ...
     def disconnect_all(self) -> None: ...
     def address(self) -> Address: ...
     def addr(self) -> Address: ...
     def num_connected_clients(self) -> int: ...
+    def client_table(self) -> ClientTable: ...
+    def poll_events(self) -> list[ServerEvent]: ...
+    def metrics(self) -> ServerMetrics: ...
+    def client_metrics(self) -> ClientMetricsTable: ...
+    def start_profiling(self, capacity: int = 1024) -> None: ...
+    def stop_profiling(self) -> None: ...
+    def profile(self) -> dict[str, array[float]]: ...
+    def profile_spans(self) -> ProfileSpans: ...
     def client_id(self, client_index: ClientIndex) -> ClientID: ...
+    def client_index(self, value: int) -> ClientIndex | None: ...
     def client_address(self, client_index: ClientIndex) -> Address: ...
     def client_addr(self, client_index: ClientIndex) -> Address: ...
     def client_state(self, client_index: ClientIndex) -> ClientState: ...
 
+class ServerAddressSet:
+    def __init__(
+        self, server_addresses: list[Address], *, ttl: float | None = None
+    ) -> None: ...
+    def refresh(self) -> None: ...
+    @property
+    def resolved(self) -> list[Address]: ...
+    def __len__(self) -> int: ...
+
 class ConnectToken:
     def __init__(  # noqa: PLR0913
         self,
-        server_addresses: list[Address],
+        server_addresses: list[Address] | ServerAddressSet,
         protocol_id: int,
         client_id: int,
         private_key: bytes,
         expire_seconds: int | None = None,
         timeout_seconds: int | None = None,
     ) -> None: ...
+    @staticmethod
+    def from_bytes(data: bytes) -> ConnectToken: ...
     def __bytes__(self) -> bytes: ...
 
 class Client:
     client_id: ClientID
-    def __init__(self, token: ConnectToken) -> None: ...
+    def __init__(
+        self,
+        token: ConnectToken,
+        *,
+        network: LoopbackNetwork | None = None,
+        send_conditions: NetworkConditions | None = None,
+        recv_conditions: NetworkConditions | None = None,
+        send_interval: float | None = None,
+        num_disconnect_packets: int | None = None,
+        coalesce: bool = False,
+        reliable: bool = False,
+    ) -> None: ...
+    def fileno(self) -> int: ...
     def connect(self) -> None: ...
     def update(self, time: float) -> None: ...
     def recv(self) -> bytes | None: ...
-    def send(self, data: bytes) -> None: ...
+    def recv_many(self, max_packets: int | None = None) -> list[bytes]: ...
+    def recv_into(self, buffer: bytearray | memoryview) -> int | None: ...
+    def send(self, data: Buffer) -> None: ...
+    def send_reliable(self, data: Buffer) -> None: ...
+    def flush(self) -> None: ...
     def disconnect(self) -> None: ...
     def address(self) -> Address: ...
     def addr(self) -> Address: ...
@@ -62,3 +291,4 @@ class Client:
     def is_pending(self) -> bool: ...
     def is_connected(self) -> bool: ...
     def is_disconnected(self) -> bool: ...
+    def metrics(self) -> ClientMetrics: ...
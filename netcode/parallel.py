@@ -35,6 +35,9 @@ class SafeParallelMixin(ParallelProtocol):
     use_stop_event: bool = False
     subclass_name: Literal["process", "thread"]
     name: str
+    # set by `Process.__init__` / `Thread.__init__` from `args` and `kwargs`
+    _args: tuple[Any, ...]
+    _kwargs: dict[str, Any]
 
     def __init__(
         self,
@@ -114,7 +117,7 @@ class SafeParallelMixin(ParallelProtocol):
         try:
             self._not_running.clear()
             if self._target is not None:
-                self.result_queue.put(self._target())
+                self.result_queue.put(self._target(*self._args, **self._kwargs))
             else:
                 self.user_target()
         except Exception as e:
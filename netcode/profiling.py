@@ -0,0 +1,83 @@
+"""Export `Server` update profiles as Chrome trace JSON.
+
+The trace opens in `chrome://tracing`, Perfetto and viztracer's `vizviewer`:
+every recorded update is an `update` slice with its phases nested inside.
+
+```python
+server.start_profiling()
+run_game(server)
+netcode.profiling.save_chrome_trace(server, "update.json")
+```
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Any
+
+from .netcode import PROFILE_PHASES
+
+if TYPE_CHECKING:
+    from .netcode import Server
+
+_MICROSECONDS = 1e6
+
+
+def chrome_trace(server: Server, *, name: str = "netcode server") -> dict[str, Any]:
+    """The updates `server` recorded since `start_profiling`, as a Chrome trace.
+
+    `name` labels the process in the viewer.
+    """
+    frames = server.profile()
+    spans = server.profile_spans()
+    pid = os.getpid()
+    events: list[dict[str, Any]] = [
+        {"ph": "M", "name": "process_name", "pid": pid, "args": {"name": name}},
+        {
+            "ph": "M",
+            "name": "thread_name",
+            "pid": pid,
+            "tid": 0,
+            "args": {"name": "update"},
+        },
+    ]
+    for time, start, duration in zip(
+        frames["time"], frames["start"], frames["duration"], strict=True
+    ):
+        events.append(
+            {
+                "name": "update",
+                "cat": "netcode",
+                "ph": "X",
+                "ts": start * _MICROSECONDS,
+                "dur": duration * _MICROSECONDS,
+                "pid": pid,
+                "tid": 0,
+                "args": {"time": time},
+            }
+        )
+    for phase, start, duration in zip(
+        spans["phase"], spans["start"], spans["duration"], strict=True
+    ):
+        events.append(
+            {
+                "name": PROFILE_PHASES[phase],
+                "cat": "netcode",
+                "ph": "X",
+                "ts": start * _MICROSECONDS,
+                "dur": duration * _MICROSECONDS,
+                "pid": pid,
+                "tid": 0,
+            }
+        )
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def save_chrome_trace(
+    server: Server, path: str | os.PathLike[str], *, name: str = "netcode server"
+) -> None:
+    """Write `chrome_trace(server)` to `path`."""
+    with Path(path).open("w", encoding="utf-8") as file:
+        json.dump(chrome_trace(server, name=name), file)
@@ -0,0 +1,292 @@
+"""Run one `Server` per core behind a single UDP port.
+
+Every shard is a process with its own `Server` bound to the same address with
+`SO_REUSEPORT`. The kernel spreads the clients over the shards and keeps each
+client's packets on the same shard, so shards never need to talk to each other.
+A supervisor thread restarts shards that die; the new socket changes the
+kernel's spread, so some clients of the surviving shards may move and time out.
+
+Only available where `SO_REUSEPORT` load-balances UDP sockets (Linux, the BSDs).
+"""
+
+from __future__ import annotations
+
+import logging
+import multiprocessing as mp
+import os
+import socket
+import threading
+import time
+from typing import TYPE_CHECKING, NamedTuple, Protocol
+
+from .netcode import ClientIndex, ConnectToken, Server
+from .parallel import SafeProcess
+
+if TYPE_CHECKING:
+    from multiprocessing.sharedctypes import SynchronizedArray
+    from typing import Self
+
+    from .netcode import Address, ClientID
+
+logger = logging.getLogger(__name__)
+
+
+class PacketHandler(Protocol):
+    """Called in the shard process for every packet its `Server` receives."""
+
+    def __call__(
+        self, server: Server, packet: bytes, client_index: ClientIndex
+    ) -> None:
+        """Handle `packet` from `client_index`, replying through `server`."""
+
+
+class ShardClient(NamedTuple):
+    """A client connected to one of the shards."""
+
+    shard: int
+    client_index: int
+    client_id: ClientID
+    address: Address
+
+
+class ShardProcess(SafeProcess):
+    """Process that runs one shard of a `ShardedServer`."""
+
+    use_stop_event = True
+
+    def __init__(  # noqa: PLR0913
+        self,
+        shard: int,
+        listen_address: Address,
+        protocol_id: int,
+        private_key: bytes,
+        handler: PacketHandler | None,
+        update_interval: float,
+        connected: SynchronizedArray[int],
+    ) -> None:
+        """Init."""
+        super().__init__(name=f"Shard {shard}")
+        self.shard = shard
+        self.listen_address = listen_address
+        self.protocol_id = protocol_id
+        self.private_key = private_key
+        self.handler = handler
+        self.update_interval = update_interval
+        self.connected = connected
+        self.ready = mp.Event()
+        self.control, self._worker_control = mp.Pipe()
+
+    def user_target(self) -> None:
+        """Run the shard's server until stopped."""
+        assert self._stop_event is not None
+
+        server = Server(
+            self.listen_address, self.protocol_id, self.private_key, reuse_port=True
+        )
+        self.ready.set()
+        logger.info(f"'{self.name}' listening on {server.address()}")
+
+        start_time = time.monotonic()
+        next_tick = start_time
+        while not self._stop_event.is_set():
+            server.update(time.monotonic() - start_time)
+            while (result := server.recv()) is not None:
+                if self.handler is not None:
+                    self.handler(server, *result)
+
+            self.connected[self.shard] = server.num_connected_clients()
+            if self._worker_control.poll():
+                self._worker_control.recv()
+                self._worker_control.send(self._list_clients(server))
+
+            next_tick += self.update_interval
+            time.sleep(max(0.0, next_tick - time.monotonic()))
+
+        server.disconnect_all()
+        self.connected[self.shard] = 0
+
+    def _list_clients(self, server: Server) -> list[ShardClient]:
+        clients = []
+        for client_index in server.clients:
+            client_id = server.client_id(client_index)
+            address = server.client_address(client_index)
+            if client_id is not None and address is not None:
+                clients.append(
+                    ShardClient(self.shard, int(client_index), client_id, address)
+                )
+        return clients
+
+
+class ShardedServer:
+    """`workers` processes serving one address, restarted when they crash.
+
+    `handler` runs in the shard processes, so with the `spawn` start method it
+    must be picklable, e.g. a module level function.
+    """
+
+    def __init__(  # noqa: PLR0913
+        self,
+        listen_address: Address,
+        protocol_id: int,
+        private_key: bytes,
+        workers: int | None = None,
+        handler: PacketHandler | None = None,
+        update_interval: float = 1 / 60,
+        supervise_interval: float = 0.5,
+    ) -> None:
+        """Init."""
+        if not hasattr(socket, "SO_REUSEPORT"):
+            msg = "ShardedServer needs SO_REUSEPORT, which this platform lacks"
+            raise NotImplementedError(msg)
+
+        host, port = listen_address
+        self.listen_address: Address = (host, port or _free_port(host))
+        self.protocol_id = protocol_id
+        self.private_key = private_key
+        self.workers = workers or os.cpu_count() or 1
+        self.handler = handler
+        self.update_interval = update_interval
+        self.supervise_interval = supervise_interval
+        self.restarts = 0
+
+        self._connected: SynchronizedArray[int] = mp.Array("Q", self.workers)
+        self._shards: list[ShardProcess] = []
+        self._lock = threading.Lock()
+        self._stopping = threading.Event()
+        self._supervisor: threading.Thread | None = None
+
+    def __enter__(self) -> Self:
+        """Start the shards."""
+        self.start()
+        return self
+
+    def __exit__(self, *args: object) -> None:
+        """Stop the shards."""
+        self.stop()
+
+    def start(self, timeout: float = 10.0) -> None:
+        """Start the shards and wait until all of them are listening."""
+        with self._lock:
+            self._shards = [self._spawn(shard) for shard in range(self.workers)]
+        for shard in self._shards:
+            self._wait_ready(shard, timeout)
+
+        self._stopping.clear()
+        self._supervisor = threading.Thread(
+            target=self._supervise_forever, name="Shard supervisor", daemon=True
+        )
+        self._supervisor.start()
+
+    def stop(self, timeout: float = 5.0) -> None:
+        """Stop the supervisor and the shards."""
+        self._stopping.set()
+        if self._supervisor is not None:
+            self._supervisor.join()
+            self._supervisor = None
+        with self._lock:
+            for shard in self._shards:
+                if shard.is_alive():
+                    shard.stop()
+            for shard in self._shards:
+                if shard.is_alive():
+                    try:
+                        shard.join(timeout=timeout)
+                    except TimeoutError:
+                        logger.warning(f"'{shard.name}' did not stop, terminating")
+                        shard.terminate()
+            self._shards.clear()
+
+    def supervise(self) -> int:
+        """Restart the shards that died, returns how many were restarted."""
+        restarted = 0
+        with self._lock:
+            for i, shard in enumerate(self._shards):
+                if shard.is_alive() or self._stopping.is_set():
+                    continue
+                exception = shard.exception
+                logger.warning(
+                    "'%s' died (exit code %s), restarting%s",
+                    shard.name,
+                    shard.exitcode,
+                    f": {exception[1]}" if exception is not None else "",
+                )
+                self._connected[i] = 0
+                self._shards[i] = self._spawn(i)
+                restarted += 1
+        self.restarts += restarted
+        return restarted
+
+    def token(
+        self, client_id: ClientID, server_address: Address | None = None
+    ) -> ConnectToken:
+        """A connect token for any shard.
+
+        `server_address` is the address clients connect to, by default the listen
+        address, which does not work for wildcard addresses like `0.0.0.0`.
+        """
+        return ConnectToken(
+            [server_address or self.listen_address],
+            self.protocol_id,
+            client_id,
+            self.private_key,
+        )
+
+    def num_connected_clients(self) -> int:
+        """Connected clients across all shards, as of the shards' last tick."""
+        return sum(self._connected[:])
+
+    def num_connected_clients_per_shard(self) -> list[int]:
+        """Connected clients of each shard, as of the shards' last tick."""
+        return list(self._connected[:])
+
+    def clients(self, timeout: float = 1.0) -> list[ShardClient]:
+        """Ask every shard for its connected clients."""
+        with self._lock:
+            shards = [shard for shard in self._shards if shard.is_alive()]
+            for shard in shards:
+                shard.control.send("clients")
+            clients: list[ShardClient] = []
+            deadline = time.monotonic() + timeout
+            for shard in shards:
+                if shard.control.poll(max(0.0, deadline - time.monotonic())):
+                    clients.extend(shard.control.recv())
+                else:
+                    logger.warning(f"'{shard.name}' did not list its clients")
+        return clients
+
+    def _spawn(self, shard: int) -> ShardProcess:
+        process = ShardProcess(
+            shard=shard,
+            listen_address=self.listen_address,
+            protocol_id=self.protocol_id,
+            private_key=self.private_key,
+            handler=self.handler,
+            update_interval=self.update_interval,
+            connected=self._connected,
+        )
+        process.start()
+        return process
+
+    def _wait_ready(self, shard: ShardProcess, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        while not shard.ready.wait(timeout=0.01):
+            if not shard.is_alive() or time.monotonic() > deadline:
+                exception = shard.exception
+                self.stop()
+                msg = f"'{shard.name}' did not start"
+                if exception is not None:
+                    raise RuntimeError(msg) from exception[0]
+                raise RuntimeError(msg)
+
+    def _supervise_forever(self) -> None:
+        while not self._stopping.wait(self.supervise_interval):
+            self.supervise()
+
+
+def _free_port(host: str) -> int:
+    """Pick a free UDP port for the shards to share."""
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    with socket.socket(family, socket.SOCK_DGRAM) as sock:
+        sock.bind((host, 0))
+        port: int = sock.getsockname()[1]
+        return port
@@ -0,0 +1,359 @@
+"""Send world snapshots as deltas against what each client acknowledged.
+
+A snapshot maps field ids (an entity's position, its health, ...) to their
+encoded values. `SnapshotServer` remembers the recent snapshots it sent to each
+client and encodes the next one against the newest that client acknowledged,
+so only the fields that changed since then go out. A client that acknowledged
+nothing recent enough (its acks were lost, or it just connected) gets the full
+snapshot, which is also what a lost delta costs: nothing, until the client
+acknowledges a later snapshot.
+
+```python
+server = SnapshotServer(netcode.Server(address, protocol_id, key))
+for now in netcode.TickLoop(server):
+    server.send_snapshot({entity_id: struct.pack("<ff", *pos) for ...})
+
+client = SnapshotClient(netcode.Client(token))
+for now in netcode.TickLoop(client):
+    world = client.snapshot
+```
+
+Snapshots, their acks and other payloads share the endpoint's packets, told
+apart by a leading tag byte, so both ends have to be wrapped.
+"""
+
+from __future__ import annotations
+
+import struct
+from array import array
+from collections import deque
+from typing import TYPE_CHECKING, NamedTuple
+
+from .netcode import MAX_PACKET_SIZE
+
+if TYPE_CHECKING:
+    from collections.abc import Iterable, Mapping
+
+    from .netcode import Buffer, Client, ClientIndex, Server
+
+    Snapshot = Mapping[int, bytes]
+
+DEFAULT_MAX_BASELINE_AGE = 32
+
+# the first byte of every payload
+_DATA = 0
+_SNAPSHOT = 1
+_ACK = 2
+_NO_BASELINE = 0xFFFFFFFF
+
+# tag, sequence, baseline sequence
+_HEADER = struct.Struct("<BII")
+_COUNT = struct.Struct("<H")
+# field id, value length
+_FIELD = struct.Struct("<IH")
+_ACK_PACKET = struct.Struct("<BI")
+
+
+class SnapshotStats(NamedTuple):
+    """What a `SnapshotServer` sent so far."""
+
+    sent: int
+    """Snapshots sent, one per client."""
+    full: int
+    """Snapshots sent in full, for lack of a recent baseline or a smaller delta."""
+    wire_bytes: int
+    """Bytes of the snapshots sent."""
+    full_bytes: int
+    """Bytes they would have been in full."""
+
+    @property
+    def ratio(self) -> float:
+        """Bytes sent per byte of full snapshots."""
+        return self.wire_bytes / self.full_bytes if self.full_bytes else 1.0
+
+
+class _Peer:
+    """A client's snapshots the server still may encode against."""
+
+    def __init__(self, client_id: int) -> None:
+        self.client_id = client_id
+        # sequence to snapshot, oldest first
+        self.history: dict[int, Snapshot] = {}
+        self.acked: int | None = None
+
+
+class SnapshotServer:
+    """A `Server` that sends snapshots as deltas.
+
+    Baselines older than `max_baseline_age` snapshots are not used, and the
+    clients keep their decoded snapshots for as long. Other payloads pass
+    through `send*` and `recv*`.
+    """
+
+    def __init__(
+        self, server: Server, max_baseline_age: int = DEFAULT_MAX_BASELINE_AGE
+    ) -> None:
+        """Init."""
+        if max_baseline_age < 1:
+            msg = "max_baseline_age must be at least 1"
+            raise ValueError(msg)
+        self.server = server
+        self.max_baseline_age = max_baseline_age
+        self.sequence = 0
+        self._peers: dict[int, _Peer] = {}
+        self._received: deque[tuple[bytes, ClientIndex]] = deque()
+        self.reset_stats()
+
+    def update(self, time: float) -> None:
+        """Update the server and take in the acks that arrived."""
+        self.server.update(time)
+        while (result := self.server.recv()) is not None:
+            payload, client_index = result
+            tag = payload[0] if payload else None
+            if tag == _DATA:
+                self._received.append((payload[1:], client_index))
+            elif tag == _ACK and len(payload) == _ACK_PACKET.size:
+                self._ack(int(client_index), _ACK_PACKET.unpack(payload)[1])
+        if len(self._peers) > self.server.num_connected_clients():
+            connected = {int(index) for index in self.server.clients}
+            for value in self._peers.keys() - connected:
+                del self._peers[value]
+
+    def send_snapshot(
+        self,
+        snapshot: Snapshot,
+        client_indices: Iterable[ClientIndex | int] | None = None,
+    ) -> int:
+        """Send `snapshot` to `client_indices`, every connected client by default.
+
+        Clients with the same baseline share an encoding, so a tick's snapshot is
+        encoded once per baseline rather than once per client. Clients that are
+        not connected are skipped. Returns the snapshot's sequence number. The
+        snapshot must fit in a packet in full.
+        """
+        snapshot = dict(snapshot)
+        full_size = _encoded_size(snapshot.items(), ())
+        if full_size > MAX_PACKET_SIZE:
+            msg = f"a snapshot must fit in a packet, this one is {full_size} bytes"
+            raise ValueError(msg)
+        sequence = self.sequence + 1
+        table = self.server.client_table()
+        client_ids = dict(zip(table.indices, table.client_ids, strict=True))
+        values = (
+            client_ids
+            if client_indices is None
+            else [int(index) for index in client_indices if int(index) in client_ids]
+        )
+        # by baseline sequence and snapshot, the clients to send the same bytes
+        audiences: dict[tuple[int, int], tuple[Snapshot | None, list[int]]] = {}
+        baselines: list[tuple[_Peer, int | None]] = []
+        for value in values:
+            peer = self._peer(value, client_ids[value])
+            baseline = self._baseline(peer, sequence)
+            base = None if baseline is None else peer.history[baseline]
+            key = (_NO_BASELINE, 0) if baseline is None else (baseline, id(base))
+            audiences.setdefault(key, (base, []))[1].append(value)
+            baselines.append((peer, baseline))
+
+        # encode everything before recording the snapshot as sent
+        pairs: list[tuple[bytes, int]] = []
+        full = wire_bytes = 0
+        for (baseline, _), (base, audience) in audiences.items():
+            packet = _encode(sequence, snapshot, baseline, base, full_size)
+            pairs.extend((packet, value) for value in audience)
+            wire_bytes += len(packet) * len(audience)
+            if len(packet) == full_size:
+                full += len(audience)
+
+        self.sequence = sequence
+        for peer, baseline in baselines:
+            peer.history[sequence] = snapshot
+            self._forget_old(peer, baseline)
+        self._sent += len(pairs)
+        self._full += full
+        self._wire_bytes += wire_bytes
+        self._full_bytes += full_size * len(pairs)
+        self.server.send_many(pairs)
+        return self.sequence
+
+    def recv(self) -> tuple[bytes, ClientIndex] | None:
+        """The next payload that is not a snapshot ack."""
+        return self._received.popleft() if self._received else None
+
+    def recv_many(
+        self, max_packets: int | None = None
+    ) -> tuple[list[bytes], array[int]]:
+        """Up to `max_packets` payloads that are not snapshot acks, with senders."""
+        count = len(self._received) if max_packets is None else max_packets
+        payloads: list[bytes] = []
+        client_indices = array("Q")
+        while self._received and len(payloads) < count:
+            payload, client_index = self._received.popleft()
+            payloads.append(payload)
+            client_indices.append(int(client_index))
+        return payloads, client_indices
+
+    def send(self, data: Buffer, client_index: ClientIndex) -> None:
+        """Send a payload that is not a snapshot to a client."""
+        self.server.send(bytes([_DATA]) + data, client_index)
+
+    def send_all(self, data: Buffer) -> None:
+        """Send a payload that is not a snapshot to every connected client."""
+        self.server.send_all(bytes([_DATA]) + data)
+
+    def stats(self) -> SnapshotStats:
+        """What was sent since the last `reset_stats`."""
+        return SnapshotStats(
+            sent=self._sent,
+            full=self._full,
+            wire_bytes=self._wire_bytes,
+            full_bytes=self._full_bytes,
+        )
+
+    def reset_stats(self) -> None:
+        """Start counting from zero."""
+        self._sent = self._full = self._wire_bytes = self._full_bytes = 0
+
+    def _peer(self, value: int, client_id: int) -> _Peer:
+        peer = self._peers.get(value)
+        # a slot reused by another client starts over
+        if peer is None or peer.client_id != client_id:
+            peer = self._peers[value] = _Peer(client_id)
+        return peer
+
+    def _baseline(self, peer: _Peer, sequence: int) -> int | None:
+        """The newest snapshot the client acknowledged, unless it is too old."""
+        acked = peer.acked
+        if acked is None or sequence - acked > self.max_baseline_age:
+            return None
+        return acked
+
+    def _forget_old(self, peer: _Peer, baseline: int | None) -> None:
+        oldest = self.sequence - self.max_baseline_age
+        history = peer.history
+        while (first := next(iter(history))) < oldest and first != baseline:
+            del history[first]
+
+    def _ack(self, value: int, sequence: int) -> None:
+        peer = self._peers.get(value)
+        if peer is None or sequence not in peer.history:
+            return
+        if peer.acked is None or sequence > peer.acked:
+            peer.acked = sequence
+
+
+class SnapshotClient:
+    """A `Client` that decodes the snapshots of a `SnapshotServer`.
+
+    `snapshot` is the newest snapshot, updated by `update`. Snapshots are kept
+    for `history` sequence numbers to decode deltas against; it must be at
+    least the server's `max_baseline_age`. Other payloads pass through `send`
+    and `recv*`.
+    """
+
+    def __init__(
+        self, client: Client, history: int = DEFAULT_MAX_BASELINE_AGE
+    ) -> None:
+        """Init."""
+        if history < 1:
+            msg = "history must be at least 1"
+            raise ValueError(msg)
+        self.client = client
+        self.history = history
+        self.snapshot: Snapshot = {}
+        self.sequence: int | None = None
+        # truncated snapshots and ones against a baseline no longer kept
+        self.undecodable = 0
+        self._snapshots: dict[int, Snapshot] = {}
+        self._received: deque[bytes] = deque()
+
+    def update(self, time: float) -> None:
+        """Update the client, decode the snapshots that arrived and ack them."""
+        self.client.update(time)
+        while (payload := self.client.recv()) is not None:
+            tag = payload[0] if payload else None
+            if tag == _DATA:
+                self._received.append(payload[1:])
+            elif tag == _SNAPSHOT:
+                try:
+                    self._decode(payload)
+                except struct.error:
+                    self.undecodable += 1
+
+    def recv(self) -> bytes | None:
+        """The next payload that is not a snapshot."""
+        return self._received.popleft() if self._received else None
+
+    def recv_many(self, max_packets: int | None = None) -> list[bytes]:
+        """Up to `max_packets` payloads that are not snapshots."""
+        count = len(self._received)
+        if max_packets is not None:
+            count = min(count, max_packets)
+        return [self._received.popleft() for _ in range(count)]
+
+    def send(self, data: Buffer) -> None:
+        """Send a payload to the server."""
+        self.client.send(bytes([_DATA]) + data)
+
+    def _decode(self, packet: bytes) -> None:
+        _, sequence, baseline = _HEADER.unpack_from(packet)
+        if sequence in self._snapshots:
+            return
+        if baseline == _NO_BASELINE:
+            snapshot: dict[int, bytes] = {}
+        elif baseline in self._snapshots:
+            snapshot = dict(self._snapshots[baseline])
+        else:
+            self.undecodable += 1
+            return
+        offset = _HEADER.size
+        (changed,) = _COUNT.unpack_from(packet, offset)
+        offset += _COUNT.size
+        for _ in range(changed):
+            field, size = _FIELD.unpack_from(packet, offset)
+            offset += _FIELD.size
+            snapshot[field] = packet[offset : offset + size]
+            offset += size
+        (removed,) = _COUNT.unpack_from(packet, offset)
+        for field in struct.unpack_from(f"<{removed}I", packet, offset + _COUNT.size):
+            snapshot.pop(field, None)
+
+        self._snapshots[sequence] = snapshot
+        if self.sequence is None or sequence > self.sequence:
+            self.sequence, self.snapshot = sequence, snapshot
+            oldest = sequence - self.history
+            for old in [s for s in self._snapshots if s < oldest]:
+                del self._snapshots[old]
+        self.client.send(_ACK_PACKET.pack(_ACK, sequence))
+
+
+def _encoded_size(
+    changed: Iterable[tuple[int, bytes]], removed: Iterable[int]
+) -> int:
+    fields = sum(_FIELD.size + len(value) for _, value in changed)
+    return _HEADER.size + 2 * _COUNT.size + fields + 4 * sum(1 for _ in removed)
+
+
+def _encode(
+    sequence: int,
+    snapshot: Snapshot,
+    baseline: int,
+    base: Snapshot | None,
+    full_size: int,
+) -> bytes:
+    """Encode `snapshot` against `base`, or in full if that is not smaller."""
+    changed = list(snapshot.items())
+    removed: list[int] = []
+    if base is not None:
+        delta = [(k, v) for k, v in changed if base.get(k) != v]
+        gone = [k for k in base if k not in snapshot]
+        # removed fields cost 4 bytes each, which a full snapshot does not pay
+        if _encoded_size(delta, gone) < full_size:
+            changed, removed = delta, gone
+        else:
+            baseline = _NO_BASELINE
+    parts = [_HEADER.pack(_SNAPSHOT, sequence, baseline), _COUNT.pack(len(changed))]
+    for field, value in changed:
+        parts += (_FIELD.pack(field, len(value)), value)
+    parts += (_COUNT.pack(len(removed)), struct.pack(f"<{len(removed)}I", *removed))
+    return b"".join(parts)
@@ -0,0 +1,212 @@
+"""Run `update` at a fixed rate without drifting.
+
+Sleeping for a whole tick after doing a tick's work makes every tick as long as
+the work plus the sleep, so the rate sags under load and oversleeping piles up.
+`TickLoop` keeps every deadline on a fixed grid instead, sleeps until shortly
+before the next one and spins the rest of the way, because `time.sleep` can
+overshoot by a millisecond or more (much more on Windows).
+
+```python
+loop = netcode.TickLoop(server, tick_hz=60)
+for now in loop:
+    payloads, client_indices = server.recv_many()
+    ...
+```
+"""
+
+from __future__ import annotations
+
+import math
+import sys
+import time
+from typing import TYPE_CHECKING, Literal, NamedTuple, Protocol, TypeAlias
+
+if TYPE_CHECKING:
+    from collections.abc import Callable, Iterator
+
+OverrunPolicy: TypeAlias = Literal["catch_up", "skip"]
+"""What to do with ticks whose deadline passed while an earlier one ran.
+
+`"catch_up"` runs them back to back so the tick count keeps up with the clock,
+at most `max_catch_up` of them, and skips the rest. `"skip"` drops them all and
+carries on from the next deadline.
+"""
+
+# how long before a deadline to stop sleeping and start spinning
+DEFAULT_SPIN = 0.002 if sys.platform == "win32" else 0.0005
+
+
+class Updatable(Protocol):
+    """Anything with an `update(time)`, like `Server` and `Client`."""
+
+    def update(self, time: float) -> None:
+        """Advance to `time`, in seconds."""
+
+
+class _Flag(Protocol):
+    def is_set(self) -> bool: ...
+
+
+class TickStats(NamedTuple):
+    """How well a `TickLoop` kept to its rate."""
+
+    ticks: int
+    """Ticks run."""
+    skipped: int
+    """Ticks dropped because the loop fell too far behind."""
+    overruns: int
+    """Ticks that started later than `spin` after their deadline."""
+    mean_lateness: float
+    """How long after its deadline the average tick started, in seconds."""
+    max_lateness: float
+    """How long after its deadline the latest tick started, in seconds."""
+    mean_busy: float
+    """Time spent in the average tick (updates and loop body), in seconds."""
+    max_busy: float
+    """Time spent in the longest tick, in seconds."""
+
+
+class TickLoop:
+    """Update `targets` every `1 / tick_hz` seconds.
+
+    Iterating runs the loop: before every tick it waits for the tick's deadline,
+    then calls `update` on every target with the tick's time and yields that
+    time, so the loop body is part of the tick. The time starts at `start_time`
+    and grows by exactly one interval per tick, including skipped ticks, so it
+    stays in step with the clock.
+    """
+
+    def __init__(
+        self,
+        *targets: Updatable,
+        tick_hz: float = 60.0,
+        policy: OverrunPolicy = "catch_up",
+        max_catch_up: int = 5,
+        spin: float = DEFAULT_SPIN,
+        start_time: float = 0.0,
+    ) -> None:
+        """Init."""
+        if tick_hz <= 0:
+            msg = "tick_hz must be positive"
+            raise ValueError(msg)
+        if policy not in ("catch_up", "skip"):
+            msg = f"policy must be 'catch_up' or 'skip', not {policy!r}"
+            raise ValueError(msg)
+        if max_catch_up < 0:
+            msg = "max_catch_up must not be negative"
+            raise ValueError(msg)
+        if spin < 0:
+            msg = "spin must not be negative"
+            raise ValueError(msg)
+        self.targets = list(targets)
+        self.interval = 1 / tick_hz
+        self.policy = policy
+        self.max_catch_up = max_catch_up
+        self.spin = spin
+        self.start_time = start_time
+        self._stopped = False
+        self.reset_stats()
+
+    def add(self, target: Updatable) -> None:
+        """Update `target` too, from the next tick on."""
+        self.targets.append(target)
+
+    def remove(self, target: Updatable) -> None:
+        """Stop updating `target`, from the next tick on."""
+        self.targets.remove(target)
+
+    def stop(self) -> None:
+        """End the iteration before the next tick."""
+        self._stopped = True
+
+    def __iter__(self) -> Iterator[float]:
+        self._stopped = False
+        tick = 0
+        behind = 0
+        origin = time.perf_counter()
+        while not self._stopped:
+            deadline = origin + tick * self.interval
+            now = time.perf_counter()
+            if now < deadline:
+                self._wait_until(deadline)
+                behind = 0
+            else:
+                # deadlines after this one that have passed too
+                missed = math.floor((now - deadline) / self.interval)
+                if not missed:
+                    behind = 0
+                elif self.policy == "skip" or behind >= self.max_catch_up:
+                    tick += missed
+                    deadline += missed * self.interval
+                    self._skipped += missed
+                    behind = 0
+                else:
+                    behind += 1
+
+            started = time.perf_counter()
+            self._record_start(max(0.0, started - deadline))
+            tick_time = self.start_time + tick * self.interval
+            # a loop body that breaks out never resumes the generator, but
+            # closing it still runs the finally
+            try:
+                for target in self.targets:
+                    target.update(tick_time)
+                yield tick_time
+            finally:
+                self._record_busy(time.perf_counter() - started)
+            tick += 1
+
+    def run(
+        self,
+        callback: Callable[[float], object] | None = None,
+        *,
+        stop: _Flag | None = None,
+    ) -> None:
+        """Run until `stop` is set or `TickLoop.stop` is called.
+
+        `callback` is called with the time of every tick, after the updates.
+        """
+        for now in self:
+            if callback is not None:
+                callback(now)
+            if stop is not None and stop.is_set():
+                break
+
+    def stats(self) -> TickStats:
+        """How the ticks since the last `reset_stats` kept to their deadlines."""
+        ticks = self._ticks
+        return TickStats(
+            ticks=ticks,
+            skipped=self._skipped,
+            overruns=self._overruns,
+            mean_lateness=self._total_lateness / ticks if ticks else 0.0,
+            max_lateness=self._max_lateness,
+            mean_busy=self._total_busy / ticks if ticks else 0.0,
+            max_busy=self._max_busy,
+        )
+
+    def reset_stats(self) -> None:
+        """Start counting from zero."""
+        self._ticks = self._skipped = self._overruns = 0
+        self._total_lateness = self._max_lateness = 0.0
+        self._total_busy = self._max_busy = 0.0
+
+    def _record_start(self, lateness: float) -> None:
+        self._ticks += 1
+        # waking up a few microseconds late is the scheduler, not an overrun
+        if lateness > self.spin:
+            self._overruns += 1
+        self._total_lateness += lateness
+        self._max_lateness = max(self._max_lateness, lateness)
+
+    def _record_busy(self, busy: float) -> None:
+        self._total_busy += busy
+        self._max_busy = max(self._max_busy, busy)
+
+    def _wait_until(self, deadline: float) -> None:
+        remaining = deadline - time.perf_counter()
+        if remaining > self.spin:
+            time.sleep(remaining - self.spin)
+        while time.perf_counter() < deadline:
+            # let other threads run while spinning
+            time.sleep(0)
@@ -0,0 +1,379 @@
+//! A transceiver wrapper that turns away connection requests before `netcode`
+//! spends any crypto on them.
+
+use crate::conditioner::Clock;
+use crate::metrics::{packet_type, CONNECTION_RESPONSE, DISCONNECT};
+use ::netcode::{Transceiver, NETCODE_VERSION};
+use std::collections::{HashMap, HashSet, VecDeque};
+use std::io;
+use std::net::{IpAddr, SocketAddr};
+use std::sync::atomic::{AtomicBool, AtomicU64, Ordering};
+use std::sync::{Arc, Mutex, PoisonError};
+use std::time::{SystemTime, UNIX_EPOCH};
+
+/// The prefix byte of a connection request packet; every other packet type is
+/// non-zero.
+const CONNECTION_REQUEST: u8 = 0;
+
+/// A connection request: prefix byte, version info, protocol id, token expire
+/// timestamp, token nonce and the encrypted private token, whose last bytes are
+/// its MAC.
+const VERSION_START: usize = 1;
+const PROTOCOL_ID_START: usize = VERSION_START + NETCODE_VERSION.len();
+const EXPIRE_TIMESTAMP_START: usize = PROTOCOL_ID_START + 8;
+const TOKEN_NONCE_BYTES: usize = 24;
+const PRIVATE_TOKEN_BYTES: usize = 1024;
+const MAC_BYTES: usize = 16;
+const REQUEST_BYTES: usize = EXPIRE_TIMESTAMP_START + 8 + TOKEN_NONCE_BYTES + PRIVATE_TOKEN_BYTES;
+
+/// Why a connection request was dropped.
+#[derive(Clone, Copy, Debug, PartialEq, Eq)]
+pub enum Reason {
+    /// The server had `max_clients` clients.
+    Full,
+    /// Not the size of a connection request, or another protocol version.
+    Malformed,
+    /// The request is for another protocol id.
+    ProtocolId,
+    /// The token's expire timestamp has passed.
+    Expired,
+    /// A token already seen from another address.
+    Replayed,
+    /// Its source address sent more requests than its rate allows.
+    RateLimited,
+    /// The handshake budget for the current tick was spent.
+    OverBudget,
+}
+
+impl Reason {
+    pub const ALL: [Reason; 7] = [
+        Reason::Full,
+        Reason::Malformed,
+        Reason::ProtocolId,
+        Reason::Expired,
+        Reason::Replayed,
+        Reason::RateLimited,
+        Reason::OverBudget,
+    ];
+
+    pub fn as_str(self) -> &'static str {
+        match self {
+            Reason::Full => "full",
+            Reason::Malformed => "malformed",
+            Reason::ProtocolId => "protocol_id",
+            Reason::Expired => "expired",
+            Reason::Replayed => "replayed",
+            Reason::RateLimited => "rate_limited",
+            Reason::OverBudget => "over_budget",
+        }
+    }
+}
+
+/// Limits on the connection requests that reach `netcode`, `None` or zero for
+/// no limit.
+#[derive(Clone, Debug)]
+pub struct AdmissionConfig {
+    /// Requests per second each source IP may send, refilling a bucket of
+    /// `source_burst` requests.
+    pub source_rate: Option<f64>,
+    pub source_burst: f64,
+    /// Source IPs tracked at once; requests from new sources are dropped while
+    /// every tracked source is still limited.
+    pub max_sources: usize,
+    /// Connection requests passed on per tick, for all sources together.
+    pub handshakes_per_tick: Option<usize>,
+    /// Token MACs remembered to drop tokens replayed from other addresses.
+    pub replay_cache: usize,
+}
+
+impl Default for AdmissionConfig {
+    /// Header checks only.
+    fn default() -> Self {
+        Self {
+            source_rate: None,
+            source_burst: 0.0,
+            max_sources: 0,
+            handshakes_per_tick: None,
+            replay_cache: 0,
+        }
+    }
+}
+
+/// What the server tells its admission layer, and what it counted.
+#[derive(Default)]
+pub struct AdmissionState {
+    full: AtomicBool,
+    held: AtomicBool,
+    // sources whose connection response was handed on since `release`
+    responded: Mutex<HashSet<SocketAddr>>,
+    rejected: [AtomicU64; Reason::ALL.len()],
+}
+
+impl AdmissionState {
+    pub fn set_full(&self, full: bool) {
+        self.full.store(full, Ordering::Relaxed);
+    }
+
+    /// Hand packets on again, from a new pass of the server's update; returns
+    /// whether they were held.
+    pub fn release(&self) -> bool {
+        self.responded
+            .lock()
+            .unwrap_or_else(PoisonError::into_inner)
+            .clear();
+        self.held.swap(false, Ordering::Relaxed)
+    }
+
+    /// Whether to hold `packet`, and every packet after it, until `release`: a
+    /// disconnect from a source whose connection response was handed on in
+    /// this pass could end the connection before the server reads who it was.
+    fn holds(&self, packet: &[u8], addr: SocketAddr) -> bool {
+        let kind = packet_type(packet);
+        if kind != Some(CONNECTION_RESPONSE) && kind != Some(DISCONNECT) {
+            return false;
+        }
+        let mut responded = self
+            .responded
+            .lock()
+            .unwrap_or_else(PoisonError::into_inner);
+        if kind == Some(CONNECTION_RESPONSE) {
+            responded.insert(addr);
+            return false;
+        }
+        let held = responded.contains(&addr);
+        if held {
+            self.held.store(true, Ordering::Relaxed);
+        }
+        held
+    }
+
+    /// Connection requests dropped so far.
+    pub fn rejected(&self) -> u64 {
+        Reason::ALL
+            .iter()
+            .map(|&reason| self.rejected_for(reason))
+            .sum()
+    }
+
+    /// Connection requests dropped so far for `reason`.
+    pub fn rejected_for(&self, reason: Reason) -> u64 {
+        self.rejected[reason as usize].load(Ordering::Relaxed)
+    }
+
+    fn reject(&self, reason: Reason) {
+        self.rejected[reason as usize].fetch_add(1, Ordering::Relaxed);
+    }
+}
+
+struct Bucket {
+    tokens: f64,
+    last: f64,
+}
+
+/// The mutable side of the limits, behind one lock: only connection requests
+/// take it.
+#[derive(Default)]
+struct Limits {
+    buckets: HashMap<IpAddr, Bucket>,
+    last_prune: f64,
+    macs: HashMap<[u8; MAC_BYTES], SocketAddr>,
+    mac_order: VecDeque<[u8; MAC_BYTES]>,
+    tick: f64,
+    handshakes: usize,
+}
+
+impl Limits {
+    fn check(
+        &mut self,
+        config: &AdmissionConfig,
+        mac: [u8; MAC_BYTES],
+        addr: SocketAddr,
+        now: f64,
+    ) -> Result<(), Reason> {
+        self.check_replay(config, mac, addr)?;
+        if let Some(rate) = config.source_rate {
+            self.take_token(config, rate, addr.ip(), now)?;
+        }
+        if let Some(budget) = config.handshakes_per_tick {
+            if now != self.tick {
+                self.tick = now;
+                self.handshakes = 0;
+            }
+            if self.handshakes >= budget {
+                return Err(Reason::OverBudget);
+            }
+            self.handshakes += 1;
+        }
+        Ok(())
+    }
+
+    /// Clients resend the same request until they hear back, so a token is
+    /// only a replay when it comes from another address; `netcode` would
+    /// reject it too, after decrypting it.
+    fn check_replay(
+        &mut self,
+        config: &AdmissionConfig,
+        mac: [u8; MAC_BYTES],
+        addr: SocketAddr,
+    ) -> Result<(), Reason> {
+        if config.replay_cache == 0 {
+            return Ok(());
+        }
+        match self.macs.get(&mac) {
+            Some(&seen) if seen == addr => Ok(()),
+            Some(_) => Err(Reason::Replayed),
+            None => {
+                if self.mac_order.len() == config.replay_cache {
+                    if let Some(oldest) = self.mac_order.pop_front() {
+                        self.macs.remove(&oldest);
+                    }
+                }
+                self.macs.insert(mac, addr);
+                self.mac_order.push_back(mac);
+                Ok(())
+            }
+        }
+    }
+
+    fn take_token(
+        &mut self,
+        config: &AdmissionConfig,
+        rate: f64,
+        ip: IpAddr,
+        now: f64,
+    ) -> Result<(), Reason> {
+        let burst = config.source_burst.max(1.0);
+        if !self.buckets.contains_key(&ip) && self.buckets.len() >= config.max_sources {
+            // forget the sources whose buckets refilled, at most once a tick so a
+            // flood from spoofed addresses cannot make every request scan them
+            if now == self.last_prune {
+                return Err(Reason::RateLimited);
+            }
+            self.last_prune = now;
+            self.buckets
+                .retain(|_, bucket| bucket.tokens + (now - bucket.last) * rate < burst);
+            if self.buckets.len() >= config.max_sources {
+                return Err(Reason::RateLimited);
+            }
+        }
+        let bucket = self.buckets.entry(ip).or_insert(Bucket {
+            tokens: burst,
+            last: now,
+        });
+        bucket.tokens = (bucket.tokens + (now - bucket.last).max(0.0) * rate).min(burst);
+        bucket.last = now;
+        if bucket.tokens < 1.0 {
+            return Err(Reason::RateLimited);
+        }
+        bucket.tokens -= 1.0;
+        Ok(())
+    }
+}
+
+/// Wraps a server's transceiver and drops connection requests that `netcode`
+/// would reject anyway, or that are over a limit, so they do not cost a
+/// decryption each.
+pub struct Admission<T> {
+    inner: T,
+    state: Arc<AdmissionState>,
+    clock: Arc<Clock>,
+    protocol_id: u64,
+    config: AdmissionConfig,
+    limits: Mutex<Limits>,
+    // the packet that started a hold, handed on first once released
+    deferred: Mutex<Option<(Vec<u8>, SocketAddr)>>,
+}
+
+impl<T: Transceiver<IntoError = io::Error>> Admission<T> {
+    pub fn new(
+        inner: T,
+        state: Arc<AdmissionState>,
+        clock: Arc<Clock>,
+        protocol_id: u64,
+        config: AdmissionConfig,
+    ) -> Self {
+        Self {
+            inner,
+            state,
+            clock,
+            protocol_id,
+            config,
+            limits: Mutex::new(Limits::default()),
+            deferred: Mutex::new(None),
+        }
+    }
+
+    pub fn inner(&self) -> &T {
+        &self.inner
+    }
+
+    fn check(&self, packet: &[u8], addr: SocketAddr) -> Result<(), Reason> {
+        if packet.first() != Some(&CONNECTION_REQUEST) {
+            return Ok(());
+        }
+        // the cheap checks first, cheapest first
+        if packet.len() != REQUEST_BYTES
+            || &packet[VERSION_START..PROTOCOL_ID_START] != NETCODE_VERSION
+        {
+            return Err(Reason::Malformed);
+        }
+        if read_u64(packet, PROTOCOL_ID_START) != self.protocol_id {
+            return Err(Reason::ProtocolId);
+        }
+        let unix_time = SystemTime::now()
+            .duration_since(UNIX_EPOCH)
+            .map_or(0, |elapsed| elapsed.as_secs());
+        if read_u64(packet, EXPIRE_TIMESTAMP_START) <= unix_time {
+            return Err(Reason::Expired);
+        }
+        if self.state.full.load(Ordering::Relaxed) {
+            return Err(Reason::Full);
+        }
+        let mut mac = [0; MAC_BYTES];
+        mac.copy_from_slice(&packet[REQUEST_BYTES - MAC_BYTES..]);
+        self.limits
+            .lock()
+            .unwrap_or_else(PoisonError::into_inner)
+            .check(&self.config, mac, addr, self.clock.now())
+    }
+}
+
+fn read_u64(packet: &[u8], start: usize) -> u64 {
+    let mut bytes = [0; 8];
+    bytes.copy_from_slice(&packet[start..start + 8]);
+    u64::from_le_bytes(bytes)
+}
+
+impl<T: Transceiver<IntoError = io::Error>> Transceiver for Admission<T> {
+    type IntoError = io::Error;
+
+    fn addr(&self) -> SocketAddr {
+        self.inner.addr()
+    }
+
+    fn recv(&self, buf: &mut [u8]) -> io::Result<Option<(usize, SocketAddr)>> {
+        if self.state.held.load(Ordering::Relaxed) {
+            return Ok(None);
+        }
+        let mut deferred = self.deferred.lock().unwrap_or_else(PoisonError::into_inner);
+        if let Some((packet, addr)) = deferred.take() {
+            buf[..packet.len()].copy_from_slice(&packet);
+            return Ok(Some((packet.len(), addr)));
+        }
+        while let Some((len, addr)) = self.inner.recv(buf)? {
+            if let Err(reason) = self.check(&buf[..len], addr) {
+                self.state.reject(reason);
+            } else if self.state.holds(&buf[..len], addr) {
+                *deferred = Some((buf[..len].to_vec(), addr));
+                return Ok(None);
+            } else {
+                return Ok(Some((len, addr)));
+            }
+        }
+        Ok(None)
+    }
+
+    fn send(&self, buf: &[u8], addr: SocketAddr) -> io::Result<usize> {
+        self.inner.send(buf, addr)
+    }
+}
@@ -0,0 +1,88 @@
+//! Packs small messages into as few `netcode` packets as fit, and splits them
+//! again on the other side.
+//!
+//! Every message in a coalesced packet is framed by its length as a
+//! little-endian `u16`, so both ends have to coalesce.
+
+use std::collections::HashMap;
+use std::hash::Hash;
+
+pub const FRAME_HEADER_BYTES: usize = 2;
+
+/// Messages waiting to be sent to one peer, packed into packets of at most
+/// `max_packet` bytes. Only the last packet has room left.
+#[derive(Default)]
+pub struct Batch {
+    packets: Vec<Vec<u8>>,
+}
+
+impl Batch {
+    /// Append a framed `message`; it must fit in an empty packet.
+    pub fn push(&mut self, message: &[u8], max_packet: usize) {
+        debug_assert!(message.len() + FRAME_HEADER_BYTES <= max_packet);
+        let framed = message.len() + FRAME_HEADER_BYTES;
+        let packet = match self.packets.last_mut() {
+            Some(packet) if packet.len() + framed <= max_packet => packet,
+            _ => {
+                self.packets.push(Vec::with_capacity(max_packet));
+                self.packets.last_mut().expect("a packet was just pushed")
+            }
+        };
+        packet.extend_from_slice(&(message.len() as u16).to_le_bytes());
+        packet.extend_from_slice(message);
+    }
+
+    /// The packed packets, leaving the batch empty.
+    pub fn take(&mut self) -> Vec<Vec<u8>> {
+        std::mem::take(&mut self.packets)
+    }
+}
+
+/// A `Batch` per peer, keyed by `K` and remembering the peer's handle `P`.
+pub struct Batches<K, P> {
+    max_packet: usize,
+    batches: HashMap<K, (P, Batch)>,
+}
+
+impl<K: Eq + Hash, P: Copy> Batches<K, P> {
+    pub fn new(max_packet: usize) -> Self {
+        Self {
+            max_packet,
+            batches: HashMap::new(),
+        }
+    }
+
+    pub fn push(&mut self, key: K, peer: P, message: &[u8]) {
+        let (_, batch) = self
+            .batches
+            .entry(key)
+            .or_insert_with(|| (peer, Batch::default()));
+        batch.push(message, self.max_packet);
+    }
+
+    /// Every peer's packets, leaving no batch behind.
+    pub fn drain(&mut self) -> impl Iterator<Item = (P, Vec<u8>)> + '_ {
+        self.batches.drain().flat_map(|(_, (peer, mut batch))| {
+            batch.take().into_iter().map(move |packet| (peer, packet))
+        })
+    }
+}
+
+/// The largest message that fits in a packet of `max_packet` bytes.
+pub fn max_message(max_packet: usize) -> usize {
+    (max_packet - FRAME_HEADER_BYTES).min(u16::MAX as usize)
+}
+
+/// The messages in a coalesced packet, `None` if its framing is broken (it came
+/// from a peer that does not coalesce, for instance).
+pub fn split(packet: &[u8]) -> Option<Vec<Vec<u8>>> {
+    let mut messages = Vec::new();
+    let mut rest = packet;
+    while !rest.is_empty() {
+        let header = rest.get(..FRAME_HEADER_BYTES)?;
+        let end = FRAME_HEADER_BYTES + u16::from_le_bytes([header[0], header[1]]) as usize;
+        messages.push(rest.get(FRAME_HEADER_BYTES..end)?.to_vec());
+        rest = &rest[end..];
+    }
+    Some(messages)
+}
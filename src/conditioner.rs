@@ -0,0 +1,248 @@
+//! A transceiver wrapper that degrades traffic like a WAN link would: latency,
+//! jitter, loss, duplication, reordering and limited bandwidth, per direction.
+//!
+//! Delays are measured on the endpoint's own clock, the time passed to
+//! `update`, so conditioned runs on a virtual clock stay deterministic. Delayed
+//! packets are released whenever the endpoint sends or receives, which in
+//! practice means once per `update`.
+
+use ::netcode::Transceiver;
+use std::cmp::{Ordering, Reverse};
+use std::collections::BinaryHeap;
+use std::io;
+use std::net::SocketAddr;
+use std::sync::atomic::{self, AtomicU64};
+use std::sync::{Arc, Mutex, MutexGuard, PoisonError};
+use std::time::{SystemTime, UNIX_EPOCH};
+
+/// Packets that would wait longer than this for bandwidth are dropped, like a
+/// router dropping packets from a full queue.
+const MAX_QUEUE_DELAY: f64 = 0.25;
+
+/// How one direction of a link behaves. Times are in seconds, probabilities
+/// between 0 and 1, and `bandwidth` in bytes per second.
+#[derive(Clone, Debug, Default)]
+pub struct Conditions {
+    pub latency: f64,
+    pub jitter: f64,
+    pub loss: f64,
+    pub duplicate: f64,
+    pub reorder: f64,
+    pub reorder_delay: f64,
+    pub bandwidth: Option<f64>,
+    pub seed: Option<u64>,
+}
+
+/// The endpoint's current time, set by whoever calls `update`.
+#[derive(Default)]
+pub struct Clock(AtomicU64);
+
+impl Clock {
+    pub fn set(&self, time: f64) {
+        self.0.store(time.to_bits(), atomic::Ordering::Relaxed);
+    }
+
+    pub fn now(&self) -> f64 {
+        f64::from_bits(self.0.load(atomic::Ordering::Relaxed))
+    }
+}
+
+/// SplitMix64: tiny, fast and good enough to roll dice for packets.
+struct Rng(u64);
+
+impl Rng {
+    fn new(seed: Option<u64>) -> Self {
+        Self(seed.unwrap_or_else(|| {
+            SystemTime::now()
+                .duration_since(UNIX_EPOCH)
+                .map_or(0, |elapsed| elapsed.as_nanos() as u64)
+        }))
+    }
+
+    fn next_u64(&mut self) -> u64 {
+        self.0 = self.0.wrapping_add(0x9E37_79B9_7F4A_7C15);
+        let mut z = self.0;
+        z = (z ^ (z >> 30)).wrapping_mul(0xBF58_476D_1CE4_E5B9);
+        z = (z ^ (z >> 27)).wrapping_mul(0x94D0_49BB_1331_11EB);
+        z ^ (z >> 31)
+    }
+
+    /// Uniform in `[0, 1)`.
+    fn next_f64(&mut self) -> f64 {
+        (self.next_u64() >> 11) as f64 / (1u64 << 53) as f64
+    }
+}
+
+struct Delayed {
+    deliver_at: f64,
+    seq: u64,
+    data: Vec<u8>,
+    addr: SocketAddr,
+}
+
+impl Delayed {
+    fn key(&self) -> (f64, u64) {
+        (self.deliver_at, self.seq)
+    }
+}
+
+impl PartialEq for Delayed {
+    fn eq(&self, other: &Self) -> bool {
+        self.cmp(other) == Ordering::Equal
+    }
+}
+
+impl Eq for Delayed {}
+
+impl PartialOrd for Delayed {
+    fn partial_cmp(&self, other: &Self) -> Option<Ordering> {
+        Some(self.cmp(other))
+    }
+}
+
+impl Ord for Delayed {
+    fn cmp(&self, other: &Self) -> Ordering {
+        let ((a_at, a_seq), (b_at, b_seq)) = (self.key(), other.key());
+        a_at.total_cmp(&b_at).then(a_seq.cmp(&b_seq))
+    }
+}
+
+/// One direction of the link: packets wait here until they are due.
+struct Lane {
+    conditions: Conditions,
+    rng: Rng,
+    queue: BinaryHeap<Reverse<Delayed>>,
+    seq: u64,
+    link_free_at: f64,
+}
+
+impl Lane {
+    fn new(conditions: Conditions) -> Self {
+        Self {
+            rng: Rng::new(conditions.seed),
+            conditions,
+            queue: BinaryHeap::new(),
+            seq: 0,
+            link_free_at: 0.0,
+        }
+    }
+
+    fn push(&mut self, now: f64, data: &[u8], addr: SocketAddr) {
+        let conditions = &self.conditions;
+        if self.rng.next_f64() < conditions.loss {
+            return;
+        }
+        let copies = if self.rng.next_f64() < conditions.duplicate {
+            2
+        } else {
+            1
+        };
+        for _ in 0..copies {
+            let mut deliver_at = now;
+            if let Some(bandwidth) = conditions.bandwidth {
+                let start = self.link_free_at.max(now);
+                if start - now > MAX_QUEUE_DELAY {
+                    continue;
+                }
+                self.link_free_at = start + data.len() as f64 / bandwidth;
+                deliver_at = self.link_free_at;
+            }
+            deliver_at += conditions.latency + conditions.jitter * self.rng.next_f64();
+            if self.rng.next_f64() < conditions.reorder {
+                deliver_at += conditions.reorder_delay;
+            }
+            self.seq += 1;
+            self.queue.push(Reverse(Delayed {
+                deliver_at,
+                seq: self.seq,
+                data: data.to_vec(),
+                addr,
+            }));
+        }
+    }
+
+    fn pop_due(&mut self, now: f64) -> Option<Delayed> {
+        if self.queue.peek()?.0.deliver_at > now {
+            return None;
+        }
+        self.queue.pop().map(|Reverse(delayed)| delayed)
+    }
+}
+
+fn lock(lane: &Mutex<Lane>) -> MutexGuard<'_, Lane> {
+    lane.lock().unwrap_or_else(PoisonError::into_inner)
+}
+
+/// Wraps a transceiver and applies `send` conditions to outgoing packets and
+/// `recv` conditions to incoming ones.
+pub struct Conditioner<T> {
+    inner: T,
+    clock: Arc<Clock>,
+    send: Option<Mutex<Lane>>,
+    recv: Option<Mutex<Lane>>,
+}
+
+impl<T: Transceiver<IntoError = io::Error>> Conditioner<T> {
+    pub fn new(
+        inner: T,
+        clock: Arc<Clock>,
+        send: Option<Conditions>,
+        recv: Option<Conditions>,
+    ) -> Self {
+        Self {
+            inner,
+            clock,
+            send: send.map(|conditions| Mutex::new(Lane::new(conditions))),
+            recv: recv.map(|conditions| Mutex::new(Lane::new(conditions))),
+        }
+    }
+
+    pub fn inner(&self) -> &T {
+        &self.inner
+    }
+
+    fn flush_send(&self, now: f64) -> io::Result<()> {
+        if let Some(lane) = &self.send {
+            let mut lane = lock(lane);
+            while let Some(delayed) = lane.pop_due(now) {
+                self.inner.send(&delayed.data, delayed.addr)?;
+            }
+        }
+        Ok(())
+    }
+}
+
+impl<T: Transceiver<IntoError = io::Error>> Transceiver for Conditioner<T> {
+    type IntoError = io::Error;
+
+    fn addr(&self) -> SocketAddr {
+        self.inner.addr()
+    }
+
+    fn recv(&self, buf: &mut [u8]) -> io::Result<Option<(usize, SocketAddr)>> {
+        let now = self.clock.now();
+        self.flush_send(now)?;
+        let Some(lane) = &self.recv else {
+            return self.inner.recv(buf);
+        };
+        let mut lane = lock(lane);
+        while let Some((len, addr)) = self.inner.recv(buf)? {
+            lane.push(now, &buf[..len], addr);
+        }
+        Ok(lane.pop_due(now).map(|delayed| {
+            let len = delayed.data.len().min(buf.len());
+            buf[..len].copy_from_slice(&delayed.data[..len]);
+            (len, delayed.addr)
+        }))
+    }
+
+    fn send(&self, buf: &[u8], addr: SocketAddr) -> io::Result<usize> {
+        let Some(lane) = &self.send else {
+            return self.inner.send(buf, addr);
+        };
+        let now = self.clock.now();
+        lock(lane).push(now, buf, addr);
+        self.flush_send(now)?;
+        Ok(buf.len())
+    }
+}
@@ -6,17 +6,45 @@ use ::netcode::{
     try_generate_key as x_try_generate_key, Client as x_Client, ClientConfig as x_ClientConfig,
     ClientIndex as x_ClientIndex, ClientState as x_ClientState, ConnectToken as x_ConnectToken,
     ConnectTokenBuilder as x_ConnectTokenBuilder, Error as x_Error, InvalidTokenError, Key,
-    NetcodeSocket, Result as x_Result, Server as x_Server, ServerConfig as x_ServerConfig,
-    Transceiver, CONNECT_TOKEN_BYTES as x_CONNECT_TOKEN_BYTES,
-    MAX_PACKET_SIZE as x_MAX_PACKET_SIZE, NETCODE_VERSION as x_NETCODE_VERSION,
-    PRIVATE_KEY_BYTES as x_PRIVATE_KEY_BYTES, USER_DATA_BYTES as x_USER_DATA_BYTES,
+    Result as x_Result, Server as x_Server, ServerConfig as x_ServerConfig, Transceiver,
+    CONNECT_TOKEN_BYTES as x_CONNECT_TOKEN_BYTES, MAX_PACKET_SIZE as x_MAX_PACKET_SIZE,
+    NETCODE_VERSION as x_NETCODE_VERSION, PRIVATE_KEY_BYTES as x_PRIVATE_KEY_BYTES,
+    USER_DATA_BYTES as x_USER_DATA_BYTES,
 };
-use pyo3::exceptions::PyRuntimeError;
+use pyo3::buffer::PyBuffer;
+use pyo3::exceptions::{PyOSError, PyRuntimeError, PyValueError};
+use pyo3::marker::Ungil;
 use pyo3::prelude::*;
+use pyo3::pyclass::CompareOp;
 use pyo3::types::*;
+use std::borrow::Cow;
+use std::collections::{BTreeMap, HashMap, VecDeque};
 use std::fmt::{self, Debug};
 use std::net::SocketAddr;
 use std::net::ToSocketAddrs;
+use std::sync::atomic::{AtomicBool, AtomicU64, Ordering};
+use std::sync::mpsc::{self, Receiver, RecvTimeoutError, Sender, SyncSender};
+use std::sync::{Arc, Mutex, MutexGuard, OnceLock, PoisonError, RwLock};
+use std::thread::JoinHandle;
+use std::time::{Duration, Instant};
+
+mod admission;
+mod coalesce;
+mod conditioner;
+mod metrics;
+mod profile;
+mod reliable;
+mod transport;
+
+use admission::{Admission, AdmissionConfig, AdmissionState, Reason};
+use coalesce::{Batch, Batches};
+use conditioner::{Clock, Conditioner, Conditions};
+use metrics::{Histogram, Metered, Metrics};
+use profile::Phase;
+use reliable::{
+    Channel, ReliableStats, MAX_PENDING, RELIABLE_HEADER_BYTES, UNRELIABLE_HEADER_BYTES,
+};
+use transport::{LoopbackHub, LoopbackTransport, Transport, UdpTransport};
 
 #[pymodule]
 mod _netcode {
@@ -34,6 +62,9 @@ mod _netcode {
 
         m.add("PRIVATE_KEY_BYTES", x_PRIVATE_KEY_BYTES)?;
         m.add("USER_DATA_BYTES", x_USER_DATA_BYTES)?;
+
+        let phases = Phase::ALL.map(Phase::as_str);
+        m.add("PROFILE_PHASES", PyTuple::new_bound(m.py(), phases))?;
         Ok(())
     }
 
@@ -47,58 +78,589 @@ mod _netcode {
 
     /// TODO: try_generate_key?
 
-    #[pyclass]
-    struct ConnectToken {
-        inner: x_ConnectToken, // TODO: is this necessary?
-        bytes: [u8; 2048],
+    /// `x_ClientIndex` keeps its slot number private, so every index gets an
+    /// integer value of its own the first time it is seen. Servers reuse a fixed
+    /// set of slots, so the table stays as small as the largest server and a
+    /// slot keeps its value for as long as the process runs.
+    #[derive(Default)]
+    struct IndexValues {
+        values: HashMap<x_ClientIndex, u64>,
+        indices: Vec<x_ClientIndex>,
+    }
+
+    fn index_values() -> &'static RwLock<IndexValues> {
+        static INDEX_VALUES: OnceLock<RwLock<IndexValues>> = OnceLock::new();
+        INDEX_VALUES.get_or_init(Default::default)
+    }
+
+    /// The integer value of `index`, as Python sees it.
+    fn index_value(index: x_ClientIndex) -> u64 {
+        let table = index_values();
+        let known = table
+            .read()
+            .unwrap_or_else(PoisonError::into_inner)
+            .values
+            .get(&index)
+            .copied();
+        if let Some(value) = known {
+            return value;
+        }
+        let mut table = table.write().unwrap_or_else(PoisonError::into_inner);
+        let IndexValues { values, indices } = &mut *table;
+        *values.entry(index).or_insert_with(|| {
+            indices.push(index);
+            indices.len() as u64 - 1
+        })
+    }
+
+    /// The index whose integer value is `value`, if there is one.
+    fn value_index(value: u64) -> Option<x_ClientIndex> {
+        let table = index_values()
+            .read()
+            .unwrap_or_else(PoisonError::into_inner);
+        let position = usize::try_from(value).ok()?;
+        table.indices.get(position).copied()
+    }
+
+    /// Build an `array.array` from native-endian item bytes.
+    fn typed_array(py: Python<'_>, typecode: &str, raw: &[u8]) -> PyResult<PyObject> {
+        let array = py.import_bound("array")?.getattr("array")?;
+        Ok(array
+            .call1((typecode, PyBytes::new_bound(py, raw)))?
+            .unbind())
+    }
+
+    /// Build an `array.array('Q')` without going through a Python int per value.
+    fn u64_array(py: Python<'_>, values: &[u64]) -> PyResult<PyObject> {
+        let raw: Vec<u8> = values
+            .iter()
+            .flat_map(|value| value.to_ne_bytes())
+            .collect();
+        typed_array(py, "Q", &raw)
+    }
+
+    /// Build an `array.array('H')` without going through a Python int per value.
+    fn u16_array(py: Python<'_>, values: &[u16]) -> PyResult<PyObject> {
+        let raw: Vec<u8> = values
+            .iter()
+            .flat_map(|value| value.to_ne_bytes())
+            .collect();
+        typed_array(py, "H", &raw)
+    }
+
+    /// Build an `array.array('d')` without going through a Python float per value.
+    fn f64_array(py: Python<'_>, values: &[f64]) -> PyResult<PyObject> {
+        let raw: Vec<u8> = values
+            .iter()
+            .flat_map(|value| value.to_ne_bytes())
+            .collect();
+        typed_array(py, "d", &raw)
+    }
+
+    /// Lock `mutex`, ignoring poisoning: a panic while the lock was held has
+    /// already been raised in Python as a `PanicException`.
+    fn lock<T>(mutex: &Mutex<T>) -> MutexGuard<'_, T> {
+        mutex.lock().unwrap_or_else(PoisonError::into_inner)
+    }
+
+    /// Check that `buffer` can take any packet before one is dequeued, so a
+    /// packet is never dropped because the caller's buffer was too small.
+    fn check_recv_buffer(buffer: &PyBuffer<u8>) -> PyResult<()> {
+        if buffer.readonly() || !buffer.is_c_contiguous() {
+            return Err(PyValueError::new_err(
+                "buffer must be writable and C-contiguous",
+            ));
+        }
+        if buffer.item_count() < x_MAX_PACKET_SIZE {
+            return Err(PyValueError::new_err(format!(
+                "buffer must hold at least MAX_PACKET_SIZE ({}) bytes",
+                x_MAX_PACKET_SIZE
+            )));
+        }
+        Ok(())
+    }
+
+    /// The bytes of a buffer-protocol object, borrowed when it is read-only.
+    ///
+    /// The result is used with the GIL released, when other threads may run
+    /// Python code, so a writable buffer (a `bytearray`, say) is copied first
+    /// rather than read while it could be changing.
+    fn buffer_bytes(buffer: &PyBuffer<u8>) -> PyResult<Cow<'_, [u8]>> {
+        if !buffer.is_c_contiguous() {
+            return Err(PyValueError::new_err("buffer must be C-contiguous"));
+        }
+        // SAFETY: the buffer is C-contiguous and `buffer` keeps it alive (and its
+        // memory in place) until it is released, which outlives the returned slice.
+        let bytes = unsafe {
+            std::slice::from_raw_parts(buffer.buf_ptr() as *const u8, buffer.len_bytes())
+        };
+        Ok(if buffer.readonly() {
+            Cow::Borrowed(bytes)
+        } else {
+            Cow::Owned(bytes.to_vec())
+        })
+    }
+
+    /// The most a payload can be before `netcode` frames it, less when it is
+    /// packed into a coalesced packet.
+    fn max_packet(coalesce: bool) -> usize {
+        if coalesce {
+            coalesce::max_message(x_MAX_PACKET_SIZE)
+        } else {
+            x_MAX_PACKET_SIZE
+        }
+    }
+
+    /// Check that a message fits once framed (behind `header` bytes, and in a
+    /// coalesced packet) before it is batched, rather than failing the whole
+    /// batch when it is flushed.
+    fn check_message(data: &[u8], coalesce: bool, header: usize) -> PyResult<()> {
+        let max_message = max_packet(coalesce) - header;
+        if data.len() > max_message {
+            let what = if header == RELIABLE_HEADER_BYTES {
+                "reliable message"
+            } else if coalesce {
+                "coalesced message"
+            } else {
+                "message"
+            };
+            return Err(PyValueError::new_err(format!(
+                "a {} must be at most {} bytes, got {}",
+                what,
+                max_message,
+                data.len()
+            )));
+        }
+        Ok(())
+    }
+
+    /// Pass on a received payload, or when coalescing each message packed
+    /// into it. A packet whose framing is broken is dropped whole.
+    fn unpack<P: Copy>(
+        (data, peer): (Vec<u8>, P),
+        coalesce: bool,
+        mut deliver: impl FnMut((Vec<u8>, P)),
+    ) {
+        if coalesce {
+            for message in coalesce::split(&data).unwrap_or_default() {
+                deliver((message, peer));
+            }
+        } else {
+            deliver((data, peer));
+        }
+    }
+
+    /// A client index passed from Python, either as a `ClientIndex` or as the
+    /// integer value handed out by `recv_many`/`recv_into`.
+    #[derive(FromPyObject)]
+    enum IndexArg<'py> {
+        Index(PyRef<'py, ClientIndex>),
+        Value(u64),
+    }
+
+    /// An `IndexArg` detached from Python, so it can cross `allow_threads`.
+    #[derive(Clone, Copy)]
+    enum RawIndex {
+        Index(x_ClientIndex),
+        Value(u64),
+    }
+
+    impl From<&IndexArg<'_>> for RawIndex {
+        fn from(client_idx: &IndexArg<'_>) -> Self {
+            match client_idx {
+                IndexArg::Index(index) => Self::Index(index.inner),
+                IndexArg::Value(value) => Self::Value(*value),
+            }
+        }
+    }
+
+    /// The `x_ClientIndex` of a `RawIndex`; an integer value has to be one of
+    /// a connected client.
+    fn resolve_index(server: &XServer, client_idx: RawIndex) -> PyResult<x_ClientIndex> {
+        match client_idx {
+            RawIndex::Index(index) => Ok(index),
+            RawIndex::Value(value) => value_index(value)
+                .filter(|index| server.client_id(*index).is_some())
+                .ok_or_else(|| {
+                    PyValueError::new_err(format!("no connected client with index {}", value))
+                }),
+        }
+    }
+
+    fn write_into(py: Python<'_>, buffer: &PyBuffer<u8>, data: &[u8]) -> usize {
+        let cells = buffer
+            .as_mut_slice(py)
+            .expect("buffer was checked to be writable and C-contiguous");
+        for (cell, byte) in cells.iter().zip(data) {
+            cell.set(*byte);
+        }
+        data.len()
+    }
+
+    /// The first address `host` resolves to; IP literals skip the resolver.
+    fn resolve_address(host: &str, port: u16) -> std::io::Result<SocketAddr> {
+        (host, port).to_socket_addrs()?.next().ok_or_else(|| {
+            std::io::Error::new(
+                std::io::ErrorKind::NotFound,
+                format!("{host} has no addresses"),
+            )
+        })
+    }
+
+    fn resolve_addresses(tuple_addresses: &[(String, u16)]) -> Vec<SocketAddr> {
+        tuple_addresses
+            .iter()
+            .filter_map(|(host, port)| match resolve_address(host, *port) {
+                Ok(addr) => Some(addr),
+                Err(e) => {
+                    log::warn!("skipping server address {host}:{port}: {e}");
+                    None
+                }
+            })
+            .collect()
+    }
+
+    /// Like `resolve_addresses`, but every address must resolve.
+    fn resolve_all(tuple_addresses: &[(String, u16)]) -> PyResult<Vec<SocketAddr>> {
+        tuple_addresses
+            .iter()
+            .map(|(host, port)| {
+                resolve_address(host, *port).map_err(|e| {
+                    PyValueError::new_err(format!("cannot resolve {host}:{port}: {e}"))
+                })
+            })
+            .collect()
+    }
+
+    /// How long a token stays valid and how long its connection may go silent,
+    /// in seconds; -1 means forever, `None` keeps the library's default.
+    #[derive(Clone, Copy, Default)]
+    struct TokenLifetime {
+        expire_seconds: Option<i32>,
+        timeout_seconds: Option<i32>,
+    }
+
+    /// Tokens below this many per thread are not worth spawning a thread for.
+    const MIN_TOKENS_PER_THREAD: usize = 256;
+
+    fn token_error(e: impl ToString) -> PyErr {
+        PyRuntimeError::new_err(e.to_string())
+    }
+
+    /// Generate one token straight into `out`, encrypting it once.
+    fn write_token(
+        addresses: &[SocketAddr],
+        protocol_id: u64,
+        client_id: u64,
+        private_key: Key,
+        lifetime: TokenLifetime,
+        out: &mut [u8],
+    ) -> PyResult<()> {
+        let mut builder = x_ConnectToken::build(addresses, protocol_id, client_id, private_key);
+        if let Some(expire_seconds) = lifetime.expire_seconds {
+            builder = builder.expire_seconds(expire_seconds);
+        }
+        if let Some(timeout_seconds) = lifetime.timeout_seconds {
+            builder = builder.timeout_seconds(timeout_seconds);
+        }
+        let bytes = builder
+            .generate()
+            .map_err(token_error)?
+            .try_into_bytes()
+            .map_err(token_error)?;
+        out.copy_from_slice(&bytes);
+        Ok(())
+    }
+
+    /// Fill `out` with one `CONNECT_TOKEN_BYTES` record per client id, spreading
+    /// the encryption over all cores. Call it with the GIL released.
+    fn write_tokens(
+        addresses: &[SocketAddr],
+        protocol_id: u64,
+        client_ids: &[u64],
+        private_key: Key,
+        lifetime: TokenLifetime,
+        out: &mut [u8],
+    ) -> PyResult<()> {
+        let threads = std::thread::available_parallelism()
+            .map_or(1, |n| n.get())
+            .min(client_ids.len().div_ceil(MIN_TOKENS_PER_THREAD))
+            .max(1);
+        let per_thread = client_ids.len().div_ceil(threads).max(1);
+        std::thread::scope(|scope| {
+            let workers: Vec<_> = out
+                .chunks_mut(per_thread * x_CONNECT_TOKEN_BYTES)
+                .zip(client_ids.chunks(per_thread))
+                .map(|(out, client_ids)| {
+                    scope.spawn(move || -> PyResult<()> {
+                        let records = out.chunks_exact_mut(x_CONNECT_TOKEN_BYTES);
+                        for (record, &client_id) in records.zip(client_ids) {
+                            write_token(
+                                addresses,
+                                protocol_id,
+                                client_id,
+                                private_key,
+                                lifetime,
+                                record,
+                            )?;
+                        }
+                        Ok(())
+                    })
+                })
+                .collect();
+            workers
+                .into_iter()
+                .try_for_each(|worker| worker.join().expect("token worker panicked"))
+        })
+    }
+
+    /// A `bytes` of `client_ids.len()` token records, generated with the GIL
+    /// released.
+    fn tokens_bytes(
+        py: Python<'_>,
+        addresses: &[SocketAddr],
+        protocol_id: u64,
+        client_ids: &[u64],
+        private_key: Key,
+        lifetime: TokenLifetime,
+    ) -> PyResult<Py<PyBytes>> {
+        let len = client_ids.len() * x_CONNECT_TOKEN_BYTES;
+        let bytes = PyBytes::new_bound_with(py, len, |out| {
+            py.allow_threads(|| {
+                write_tokens(
+                    addresses,
+                    protocol_id,
+                    client_ids,
+                    private_key,
+                    lifetime,
+                    out,
+                )
+            })
+        })?;
+        Ok(bytes.unbind())
+    }
+
+    fn extract_addresses(server_addresses: &Bound<'_, PyList>) -> PyResult<Vec<(String, u16)>> {
+        server_addresses
+            .iter()
+            .map(|item| -> PyResult<(String, u16)> {
+                let tuple: &PyTuple = item.extract()?;
+                let host: String = tuple.get_item(0)?.extract()?;
+                let port: u16 = tuple.get_item(1)?.extract()?;
+                Ok((host, port))
+            })
+            .collect()
+    }
+
+    fn resolve_nonempty(tuple_addresses: &[(String, u16)]) -> PyResult<Vec<SocketAddr>> {
+        let addresses = resolve_addresses(tuple_addresses);
+        if addresses.is_empty() {
+            return Err(PyErr::new::<pyo3::exceptions::PyValueError, _>(
+                "No valid socket addresses found",
+            ));
+        }
+        Ok(addresses)
+    }
+
+    struct Resolved {
+        addresses: Vec<SocketAddr>,
+        at: Instant,
+        refreshing: bool,
+    }
+
+    impl Resolved {
+        fn new(addresses: Vec<SocketAddr>) -> Self {
+            Self {
+                addresses,
+                at: Instant::now(),
+                refreshing: false,
+            }
+        }
+    }
+
+    /// Server addresses resolved once, to mint many tokens without a resolver
+    /// lookup each. With `ttl` (seconds), they are resolved again in the
+    /// background when used after that long, and the previous addresses are
+    /// used until that is done (or for good, if it fails).
+    #[pyclass(frozen)]
+    struct ServerAddressSet {
+        tuple_addresses: Vec<(String, u16)>,
+        ttl: Option<Duration>,
+        resolved: Arc<Mutex<Resolved>>,
+    }
+
+    impl ServerAddressSet {
+        /// The resolved addresses, refreshed in the background if the TTL ran
+        /// out. Call it with the GIL released.
+        fn addresses(&self) -> Vec<SocketAddr> {
+            let mut resolved = lock(&self.resolved);
+            if !resolved.refreshing && self.ttl.is_some_and(|ttl| resolved.at.elapsed() >= ttl) {
+                resolved.refreshing = true;
+                let shared = Arc::clone(&self.resolved);
+                let tuple_addresses = self.tuple_addresses.clone();
+                let spawned = std::thread::Builder::new()
+                    .name("netcode-resolver".to_string())
+                    .spawn(move || {
+                        // a slow resolver must not hold up the tokens minted meanwhile
+                        let result = resolve_all(&tuple_addresses);
+                        let mut resolved = lock(&shared);
+                        match result {
+                            Ok(addresses) => resolved.addresses = addresses,
+                            Err(e) => log::warn!("keeping stale server addresses: {e}"),
+                        }
+                        resolved.at = Instant::now();
+                        resolved.refreshing = false;
+                    });
+                if let Err(e) = spawned {
+                    log::warn!("keeping stale server addresses: {e}");
+                    resolved.at = Instant::now();
+                    resolved.refreshing = false;
+                }
+            }
+            resolved.addresses.clone()
+        }
     }
 
     #[pymethods]
-    impl ConnectToken {
+    impl ServerAddressSet {
         #[new]
+        #[pyo3(signature = (server_addresses, *, ttl=None))]
         fn new<'py>(
+            py: Python<'py>,
             server_addresses: &Bound<'py, PyList>,
-            protocol_id: u64,
-            client_id: u64,
-            private_key: Key,
+            ttl: Option<f64>,
         ) -> PyResult<Self> {
-            let tuple_addresses: Vec<(&str, u16)> = server_addresses
-                .iter()
-                .map(|item| -> PyResult<(&str, u16)> {
-                    let tuple: &PyTuple = item.extract()?;
-                    let host: &str = tuple.get_item(0)?.extract()?;
-                    let port: u16 = tuple.get_item(1)?.extract()?;
-                    Ok((host, port))
+            let ttl = ttl
+                .map(|ttl| {
+                    Duration::try_from_secs_f64(ttl)
+                        .ok()
+                        .filter(|ttl| !ttl.is_zero())
+                        .ok_or_else(|| PyValueError::new_err("ttl must be a positive number"))
                 })
-                .collect::<PyResult<_>>()?;
+                .transpose()?;
+            let tuple_addresses = extract_addresses(server_addresses)?;
+            if tuple_addresses.is_empty() {
+                return Err(PyValueError::new_err("no server addresses"));
+            }
+            let addresses = py.allow_threads(|| resolve_all(&tuple_addresses))?;
+            Ok(Self {
+                tuple_addresses,
+                ttl,
+                resolved: Arc::new(Mutex::new(Resolved::new(addresses))),
+            })
+        }
+
+        /// Resolve the addresses again now.
+        fn refresh(&self, py: Python<'_>) -> PyResult<()> {
+            let addresses = py.allow_threads(|| resolve_all(&self.tuple_addresses))?;
+            let mut resolved = lock(&self.resolved);
+            resolved.addresses = addresses;
+            resolved.at = Instant::now();
+            Ok(())
+        }
 
-            let addresses: Vec<SocketAddr> = tuple_addresses
+        /// The resolved `(ip, port)` pairs, in the order they were given.
+        #[getter]
+        fn resolved(&self) -> Vec<(String, u16)> {
+            lock(&self.resolved)
+                .addresses
                 .iter()
-                .filter_map(|(host, port)| {
-                    format!("{}:{}", host, port)
-                        .to_socket_addrs()
-                        .ok()
-                        .and_then(|mut addrs| addrs.next())
-                })
-                .collect();
+                .map(|addr| (addr.ip().to_string(), addr.port()))
+                .collect()
+        }
 
-            if addresses.is_empty() {
-                return Err(PyErr::new::<pyo3::exceptions::PyValueError, _>(
-                    "No valid socket addresses found",
-                ));
+        fn __len__(&self) -> usize {
+            self.tuple_addresses.len()
+        }
+
+        fn __repr__(&self) -> String {
+            format!("ServerAddressSet({:?})", self.tuple_addresses)
+        }
+    }
+
+    /// Server addresses as given to `ConnectToken` and `generate_tokens`.
+    #[derive(FromPyObject)]
+    enum ServerAddresses<'py> {
+        Set(PyRef<'py, ServerAddressSet>),
+        List(Bound<'py, PyList>),
+    }
+
+    impl ServerAddresses<'_> {
+        /// Resolve the addresses with the GIL released; a `ServerAddressSet`
+        /// answers from its cache.
+        fn resolve(&self, py: Python<'_>) -> PyResult<Vec<SocketAddr>> {
+            match self {
+                Self::Set(set) => {
+                    let set: &ServerAddressSet = set;
+                    Ok(py.allow_threads(|| set.addresses()))
+                }
+                Self::List(list) => {
+                    let tuple_addresses = extract_addresses(list)?;
+                    py.allow_threads(|| resolve_nonempty(&tuple_addresses))
+                }
             }
+        }
+    }
+
+    #[pyclass(frozen)]
+    struct ConnectToken {
+        bytes: [u8; 2048],
+    }
+
+    #[pymethods]
+    impl ConnectToken {
+        #[new]
+        #[pyo3(signature = (
+            server_addresses,
+            protocol_id,
+            client_id,
+            private_key,
+            expire_seconds=None,
+            timeout_seconds=None,
+        ))]
+        fn new<'py>(
+            py: Python<'py>,
+            server_addresses: ServerAddresses<'py>,
+            protocol_id: u64,
+            client_id: u64,
+            private_key: Key,
+            expire_seconds: Option<i32>,
+            timeout_seconds: Option<i32>,
+        ) -> PyResult<Self> {
+            let addresses = server_addresses.resolve(py)?;
+            let lifetime = TokenLifetime {
+                expire_seconds,
+                timeout_seconds,
+            };
 
-            let builder_1 =
-                x_ConnectToken::build(&addresses[..], protocol_id, client_id, private_key);
-            // TODO: handle optional args
-            let inner = builder_1.generate().unwrap();
+            // encrypting takes a while, let other threads run
+            py.allow_threads(|| {
+                let mut bytes = [0; 2048];
+                write_token(
+                    &addresses,
+                    protocol_id,
+                    client_id,
+                    private_key,
+                    lifetime,
+                    &mut bytes,
+                )?;
+                Ok(Self { bytes })
+            })
+        }
 
-            let builder_2 =
-                x_ConnectToken::build(&addresses[..], protocol_id, client_id, private_key);
-            // TODO: handle optional args
-            let to_become_bytes = builder_2.generate().unwrap();
-            let bytes = to_become_bytes.try_into_bytes().unwrap();
-            Ok(Self { inner, bytes })
+        /// A token from its `CONNECT_TOKEN_BYTES` serialized form, e.g. one
+        /// record of `generate_tokens`.
+        #[staticmethod]
+        fn from_bytes(data: &[u8]) -> PyResult<Self> {
+            let bytes: [u8; 2048] = data.try_into().map_err(|_| {
+                PyValueError::new_err(format!(
+                    "a connect token is {x_CONNECT_TOKEN_BYTES} bytes, got {}",
+                    data.len()
+                ))
+            })?;
+            x_ConnectToken::try_from_bytes(&bytes)
+                .map_err(|e| PyValueError::new_err(e.to_string()))?;
+            Ok(Self { bytes })
         }
 
         fn __bytes__(&self, py: Python) -> PyObject {
@@ -106,6 +668,43 @@ mod _netcode {
         }
     }
 
+    /// Generate one token per client id in a single `bytes` of
+    /// `CONNECT_TOKEN_BYTES`-sized records, in `client_ids` order, on all cores
+    /// with the GIL released.
+    #[pyfunction]
+    #[pyo3(signature = (
+        server_addresses,
+        protocol_id,
+        client_ids,
+        private_key,
+        *,
+        expire_seconds=None,
+        timeout_seconds=None,
+    ))]
+    fn generate_tokens<'py>(
+        py: Python<'py>,
+        server_addresses: ServerAddresses<'py>,
+        protocol_id: u64,
+        client_ids: Vec<u64>,
+        private_key: Key,
+        expire_seconds: Option<i32>,
+        timeout_seconds: Option<i32>,
+    ) -> PyResult<Py<PyBytes>> {
+        let addresses = server_addresses.resolve(py)?;
+        let lifetime = TokenLifetime {
+            expire_seconds,
+            timeout_seconds,
+        };
+        tokens_bytes(
+            py,
+            &addresses,
+            protocol_id,
+            &client_ids,
+            private_key,
+            lifetime,
+        )
+    }
+
     // this is a huge mess
     #[derive(Debug, Clone, Copy, PartialEq, Eq, PartialOrd, Ord)]
 
@@ -182,203 +781,2505 @@ mod _netcode {
         }
     }
 
-    #[pyclass]
-    struct Client {
-        inner: x_Client<NetcodeSocket>,
+    /// An in-process network: servers and clients created with `network=` talk
+    /// through memory queues instead of UDP sockets, with no syscalls, in send
+    /// order. `time` is a virtual clock for their `update` calls.
+    #[pyclass(frozen)]
+    struct LoopbackNetwork {
+        hub: Arc<LoopbackHub>,
+        time: Mutex<f64>,
+    }
+
+    impl LoopbackNetwork {
+        fn bind(&self, addr: impl ToSocketAddrs) -> PyResult<Transport> {
+            Ok(Transport::Loopback(LoopbackTransport::bind(
+                self.hub.clone(),
+                addr,
+            )?))
+        }
     }
 
     #[pymethods]
-    impl Client {
+    impl LoopbackNetwork {
+        /// `queue_capacity` is how many packets an endpoint can have waiting
+        /// before more are dropped, like a socket's receive buffer.
         #[new]
-        fn new<'py>(token: &mut ConnectToken) -> PyResult<Self> {
-            let inner = x_Client::new(&token.bytes).unwrap();
-            Ok(Self { inner })
+        #[pyo3(signature = (queue_capacity=65536))]
+        fn new(queue_capacity: usize) -> Self {
+            Self {
+                hub: Arc::new(LoopbackHub::new(queue_capacity)),
+                time: Mutex::new(0.0),
+            }
         }
 
-        // TODO: with_config
+        #[getter]
+        fn time(&self) -> f64 {
+            *lock(&self.time)
+        }
 
-        // TODO: with_config_and_transceiver (is this even possible?)
+        /// Move the virtual clock forward, returns the new time.
+        fn advance(&self, dt: f64) -> PyResult<f64> {
+            if dt < 0.0 {
+                return Err(PyValueError::new_err("time cannot go backwards"));
+            }
+            let mut time = lock(&self.time);
+            *time += dt;
+            Ok(*time)
+        }
 
-        fn connect(&mut self) {
-            self.inner.connect();
+        /// Packets sent so far, including dropped ones.
+        fn sent_packets(&self) -> u64 {
+            self.hub.sent().0
         }
 
-        fn update(&mut self, time: f64) {
-            self.inner.update(time);
+        /// Bytes sent so far, including dropped packets, without UDP/IP headers.
+        fn sent_bytes(&self) -> u64 {
+            self.hub.sent().1
         }
 
-        fn recv(&mut self, py: Python<'_>) -> PyResult<Option<Py<PyBytes>>> {
-            match self.inner.recv() {
-                Some(data) => {
-                    let py_bytes = PyBytes::new_bound(py, &data);
-                    Ok(Some(py_bytes.into()))
-                }
-                None => Ok(None),
-            }
+        /// Packets sent but not received yet.
+        fn in_flight(&self) -> usize {
+            self.hub.in_flight()
         }
 
-        fn send(&mut self, data: &[u8]) {
-            self.inner.send(data).unwrap();
+        /// Packets dropped because the receiver's queue was full or nothing was
+        /// bound to the destination.
+        fn dropped(&self) -> u64 {
+            self.hub.dropped()
         }
 
-        fn disconnect(&mut self) {
-            self.inner.disconnect().unwrap();
+        /// Number of servers and clients on the network.
+        fn endpoints(&self) -> usize {
+            self.hub.endpoints()
         }
+    }
 
-        fn address(&self) -> PyResult<(String, u16)> {
-            let addr = self.inner.addr();
-            Ok((addr.ip().to_string(), addr.port()))
+    /// How one direction of a simulated link degrades packets, for `Server` and
+    /// `Client`'s `send_conditions` / `recv_conditions`.
+    ///
+    /// Packets are delayed by `latency` plus up to `jitter` seconds, lost with
+    /// probability `loss`, sent twice with probability `duplicate`, and held back
+    /// an extra `reorder_delay` with probability `reorder`. With `bandwidth`
+    /// (bytes per second) packets queue behind each other, and are dropped when
+    /// the queue is over a quarter of a second long. The same `seed` gives the
+    /// same dice rolls.
+    #[pyclass(frozen, get_all)]
+    #[derive(Clone)]
+    struct NetworkConditions {
+        latency: f64,
+        jitter: f64,
+        loss: f64,
+        duplicate: f64,
+        reorder: f64,
+        reorder_delay: f64,
+        bandwidth: Option<f64>,
+        seed: Option<u64>,
+    }
+
+    impl NetworkConditions {
+        fn conditions(&self) -> Conditions {
+            Conditions {
+                latency: self.latency,
+                jitter: self.jitter,
+                loss: self.loss,
+                duplicate: self.duplicate,
+                reorder: self.reorder,
+                reorder_delay: self.reorder_delay,
+                bandwidth: self.bandwidth,
+                seed: self.seed,
+            }
         }
+    }
 
-        fn addr(&self) -> PyResult<(String, u16)> {
-            self.address()
+    #[pymethods]
+    impl NetworkConditions {
+        #[new]
+        #[pyo3(signature = (
+            *,
+            latency=0.0,
+            jitter=0.0,
+            loss=0.0,
+            duplicate=0.0,
+            reorder=0.0,
+            reorder_delay=0.05,
+            bandwidth=None,
+            seed=None,
+        ))]
+        #[allow(clippy::too_many_arguments)]
+        fn new(
+            latency: f64,
+            jitter: f64,
+            loss: f64,
+            duplicate: f64,
+            reorder: f64,
+            reorder_delay: f64,
+            bandwidth: Option<f64>,
+            seed: Option<u64>,
+        ) -> PyResult<Self> {
+            for (name, value) in [
+                ("latency", latency),
+                ("jitter", jitter),
+                ("reorder_delay", reorder_delay),
+            ] {
+                if !(value >= 0.0 && value.is_finite()) {
+                    return Err(PyValueError::new_err(format!(
+                        "{name} must be a non-negative number of seconds"
+                    )));
+                }
+            }
+            for (name, value) in [
+                ("loss", loss),
+                ("duplicate", duplicate),
+                ("reorder", reorder),
+            ] {
+                if !(0.0..=1.0).contains(&value) {
+                    return Err(PyValueError::new_err(format!(
+                        "{name} must be a probability between 0 and 1"
+                    )));
+                }
+            }
+            if bandwidth.is_some_and(|bandwidth| !(bandwidth > 0.0)) {
+                return Err(PyValueError::new_err("bandwidth must be positive"));
+            }
+            Ok(Self {
+                latency,
+                jitter,
+                loss,
+                duplicate,
+                reorder,
+                reorder_delay,
+                bandwidth,
+                seed,
+            })
         }
 
-        fn state(&self) -> String {
-            let x_state = self.inner.state();
-            let state: ClientState = x_state.into();
-            state.to_string()
+        fn __repr__(&self) -> String {
+            format!(
+                "NetworkConditions(latency={}, jitter={}, loss={}, duplicate={}, reorder={}, \
+                 reorder_delay={}, bandwidth={:?}, seed={:?})",
+                self.latency,
+                self.jitter,
+                self.loss,
+                self.duplicate,
+                self.reorder,
+                self.reorder_delay,
+                self.bandwidth,
+                self.seed
+            )
         }
+    }
+
+    /// Limits on the connection requests that reach the handshake, for
+    /// `Server`'s `admission`. Dropped requests cost no decryption.
+    ///
+    /// Each source IP may send `source_rate` requests per second, in bursts of
+    /// up to `source_burst`; clients resend their request ten times a second
+    /// until they hear back, and several may share an address. At most
+    /// `max_sources` addresses are tracked, requests from new ones are dropped
+    /// while all of them are busy. At most `handshakes_per_tick` requests reach
+    /// `netcode` per `update`. The last `replay_cache` tokens are remembered to
+    /// drop a token replayed from another address. `None` or 0 turns a limit off.
+    #[pyclass(frozen, get_all)]
+    #[derive(Clone)]
+    struct AdmissionControl {
+        source_rate: Option<f64>,
+        source_burst: f64,
+        max_sources: usize,
+        handshakes_per_tick: Option<usize>,
+        replay_cache: usize,
+    }
 
-        fn is_error(&self) -> bool {
-            self.inner.is_error()
+    impl AdmissionControl {
+        fn config(&self) -> AdmissionConfig {
+            AdmissionConfig {
+                source_rate: self.source_rate,
+                source_burst: self.source_burst,
+                max_sources: self.max_sources,
+                handshakes_per_tick: self.handshakes_per_tick,
+                replay_cache: self.replay_cache,
+            }
         }
+    }
 
-        fn is_pending(&self) -> bool {
-            self.inner.is_pending()
+    #[pymethods]
+    impl AdmissionControl {
+        #[new]
+        #[pyo3(signature = (
+            *,
+            source_rate=Some(20.0),
+            source_burst=20.0,
+            max_sources=65536,
+            handshakes_per_tick=Some(64),
+            replay_cache=4096,
+        ))]
+        fn new(
+            source_rate: Option<f64>,
+            source_burst: f64,
+            max_sources: usize,
+            handshakes_per_tick: Option<usize>,
+            replay_cache: usize,
+        ) -> PyResult<Self> {
+            if source_rate.is_some_and(|rate| !(rate > 0.0 && rate.is_finite())) {
+                return Err(PyValueError::new_err("source_rate must be positive"));
+            }
+            if !(source_burst >= 1.0 && source_burst.is_finite()) {
+                return Err(PyValueError::new_err("source_burst must be at least 1"));
+            }
+            if source_rate.is_some() && max_sources == 0 {
+                return Err(PyValueError::new_err("max_sources must be at least 1"));
+            }
+            Ok(Self {
+                source_rate,
+                source_burst,
+                max_sources,
+                handshakes_per_tick: handshakes_per_tick.filter(|&budget| budget > 0),
+                replay_cache,
+            })
         }
 
-        fn is_connected(&self) -> bool {
-            self.inner.is_connected()
+        fn __repr__(&self) -> String {
+            format!(
+                "AdmissionControl(source_rate={}, source_burst={:?}, max_sources={}, \
+                 handshakes_per_tick={}, replay_cache={})",
+                self.source_rate
+                    .map_or("None".to_string(), |rate| format!("{rate:?}")),
+                self.source_burst,
+                self.max_sources,
+                self.handshakes_per_tick
+                    .map_or("None".to_string(), |budget| budget.to_string()),
+                self.replay_cache
+            )
         }
+    }
 
-        fn is_disconnected(&self) -> bool {
-            self.inner.is_disconnected()
+    /// Wrap `transport` in a conditioner if any conditions are given.
+    fn condition(
+        transport: Transport,
+        clock: &Arc<Clock>,
+        send: Option<&NetworkConditions>,
+        recv: Option<&NetworkConditions>,
+    ) -> Transport {
+        if send.is_none() && recv.is_none() {
+            return transport;
         }
+        Transport::Conditioned(Box::new(Conditioner::new(
+            transport,
+            clock.clone(),
+            send.map(NetworkConditions::conditions),
+            recv.map(NetworkConditions::conditions),
+        )))
     }
 
-    #[pyclass]
-    struct ClientIndex {
-        inner: x_ClientIndex,
+    /// Wrap `transport` so everything it sends and receives is counted.
+    fn meter(transport: Transport, metrics: &Arc<Metrics>) -> Transport {
+        Transport::Metered(Box::new(Metered::new(transport, Arc::clone(metrics))))
     }
 
-    #[pyclass]
-    struct Server {
-        inner: x_Server<NetcodeSocket>,
+    /// `{"buckets": [...], "counts": [...], "sum": ...}`, with one more count
+    /// than bucket bounds for the unbounded last bucket.
+    fn histogram_dict<'py>(py: Python<'py>, histogram: &Histogram) -> PyResult<Bound<'py, PyDict>> {
+        let dict = PyDict::new_bound(py);
+        dict.set_item("buckets", histogram.bounds().to_vec())?;
+        dict.set_item("counts", histogram.counts())?;
+        dict.set_item("sum", histogram.sum())?;
+        Ok(dict)
     }
 
-    #[pymethods]
-    impl Server {
-        #[new]
-        fn new<'py>(bind_addr: (&str, u16), protocol_id: u64, private_key: Key) -> PyResult<Self> {
-            let inner = x_Server::new(bind_addr, protocol_id, private_key).unwrap();
-            Ok(Self { inner })
+    /// The counters a server and a client both have.
+    fn traffic_dict<'py>(py: Python<'py>, metrics: &Metrics) -> PyResult<Bound<'py, PyDict>> {
+        let dict = PyDict::new_bound(py);
+        for (name, counter) in [
+            ("packets_in", &metrics.packets_in),
+            ("bytes_in", &metrics.bytes_in),
+            ("packets_out", &metrics.packets_out),
+            ("bytes_out", &metrics.bytes_out),
+        ] {
+            dict.set_item(name, counter.load(Ordering::Relaxed))?;
         }
+        dict.set_item(
+            "update_seconds",
+            histogram_dict(py, &metrics.update_seconds)?,
+        )?;
+        Ok(dict)
+    }
 
-        // TODO: with_config_and_transceiver (can I even?)
-
-        fn update(&mut self, time: f64) -> PyResult<()> {
-            self.inner
-                .try_update(time)
-                .map_err(|e| PyRuntimeError::new_err(e.to_string()))
+    /// The counters of every reliable channel of an endpoint.
+    fn reliable_items(
+        py: Python<'_>,
+        dict: &Bound<'_, PyDict>,
+        stats: &ReliableStats,
+    ) -> PyResult<()> {
+        for (name, counter) in [
+            ("reliable_sent", &stats.sent),
+            ("reliable_resent", &stats.resent),
+            ("reliable_acked", &stats.acked),
+            ("reliable_delivered", &stats.delivered),
+            ("reliable_duplicates", &stats.duplicates),
+            ("reliable_dropped", &stats.dropped),
+        ] {
+            dict.set_item(name, counter.load(Ordering::Relaxed))?;
         }
+        dict.set_item(
+            "reliable_ack_seconds",
+            histogram_dict(py, &stats.ack_seconds)?,
+        )
+    }
 
-        // fn recv(&mut self) -> PyResult<Option<(Vec<u8>, ClientIndex)>> {
-        //     match self.inner.recv() {
-        //         Some((data, index)) => Ok(Some((data, _netcode::ClientIndex { inner: index }))),
-        //         None => Ok(None),
-        //     }
-        // }
+    /// A reliable channel's row in `client_metrics`.
+    struct ChannelRow {
+        rtt: f64,
+        pending: u64,
+        sent: u64,
+        resent: u64,
+        delivered: u64,
+    }
 
-        fn recv(&mut self, py: Python<'_>) -> PyResult<Option<(PyObject, ClientIndex)>> {
-            match self.inner.recv() {
-                Some((data, index)) => {
-                    let py_bytes = PyBytes::new_bound(py, &data);
-                    Ok(Some((py_bytes.into(), ClientIndex { inner: index })))
-                }
-                None => Ok(None),
+    impl ChannelRow {
+        fn new(channel: &Channel) -> Self {
+            let (sent, resent, delivered) = channel.counts();
+            Self {
+                rtt: channel.rtt().unwrap_or(f64::NAN),
+                pending: channel.pending() as u64,
+                sent,
+                resent,
+                delivered,
             }
         }
+    }
 
-        fn send(&mut self, data: &[u8], client_idx: &ClientIndex) -> PyResult<()> {
-            self.inner
-                .send(data, client_idx.inner)
-                .map_err(|e| PyRuntimeError::new_err(e.to_string()))
+    impl Default for ChannelRow {
+        // a client nothing was sent to or received from yet
+        fn default() -> Self {
+            Self {
+                rtt: f64::NAN,
+                pending: 0,
+                sent: 0,
+                resent: 0,
+                delivered: 0,
+            }
         }
+    }
 
-        fn send_all(&mut self, buf: &[u8]) -> PyResult<()> {
-            self.inner
-                .send_all(buf)
-                .map_err(|e| PyRuntimeError::new_err(e.to_string()))
-        }
+    /// The file descriptor behind `fileno()`, loopback endpoints have none.
+    fn fileno_or_err(fileno: Option<i64>) -> PyResult<i64> {
+        fileno.ok_or_else(|| PyOSError::new_err("loopback endpoints have no file descriptor"))
+    }
 
-        // TODO: handle optional args
-
-        fn token(&mut self, client_id: u64) -> PyResult<ConnectToken> {
-            let token_builder_1 = self
-                .inner
-                .token(client_id)
-                .expire_seconds(-1)
-                .timeout_seconds(-1);
-            let token_1 = token_builder_1.generate().unwrap();
-            let token_builder_2 = self
-                .inner
-                .token(client_id)
-                .expire_seconds(-1)
-                .timeout_seconds(-1);
-            let token_2 = token_builder_2.generate().unwrap();
-            let bytes = token_2.try_into_bytes().unwrap();
-            Ok(ConnectToken {
-                inner: token_1,
-                bytes,
-            })
+    type XClient = x_Client<Transport>;
+
+    /// The client lives behind a mutex so the pyclass can be shared between
+    /// threads, and every method runs with the GIL released.
+    #[pyclass(frozen)]
+    struct Client {
+        inner: Mutex<XClient>,
+        fileno: Option<i64>,
+        clock: Arc<Clock>,
+        metrics: Arc<Metrics>,
+        // with `coalesce`, the messages sent since the last flush, and the
+        // messages of received packets that were not returned yet
+        batch: Option<Mutex<Batch>>,
+        received: Mutex<VecDeque<Vec<u8>>>,
+        reliable: Option<ClientReliable>,
+    }
+
+    /// A client's end of the reliable channel.
+    #[derive(Default)]
+    struct ClientReliable {
+        channel: Mutex<Channel>,
+        stats: ReliableStats,
+    }
+
+    impl Client {
+        /// Run `f` on the locked client with the GIL released.
+        fn with_inner<F, R>(&self, py: Python<'_>, f: F) -> R
+        where
+            F: FnOnce(&mut XClient) -> R + Ungil,
+            R: Ungil,
+        {
+            py.allow_threads(|| f(&mut lock(&self.inner)))
         }
 
-        fn disconnect(&mut self, client_idx: &ClientIndex) -> PyResult<()> {
-            self.inner
-                .disconnect(client_idx.inner)
-                .map_err(|e| PyRuntimeError::new_err(e.to_string()))
+        /// The next payload, or when coalescing the next message; with
+        /// `reliable`, reliable messages once the ones before them arrived.
+        fn next_message(&self, client: &mut XClient) -> Option<Vec<u8>> {
+            if self.batch.is_none() && self.reliable.is_none() {
+                return client.recv();
+            }
+            let mut received = lock(&self.received);
+            loop {
+                if let Some(message) = received.pop_front() {
+                    return Some(message);
+                }
+                let now = self.clock.now();
+                unpack(
+                    (client.recv()?, ()),
+                    self.batch.is_some(),
+                    |(message, _)| match &self.reliable {
+                        Some(reliable) => {
+                            lock(&reliable.channel).receive(
+                                &message,
+                                now,
+                                &reliable.stats,
+                                |payload| received.push_back(payload),
+                            );
+                        }
+                        None => received.push_back(message),
+                    },
+                );
+            }
         }
 
-        fn disconnect_all(&mut self) -> PyResult<()> {
-            self.inner
-                .disconnect_all()
-                .map_err(|e| PyRuntimeError::new_err(e.to_string()))
+        /// Batch a framed packet, or send it.
+        fn transmit(&self, client: &mut XClient, packet: &[u8]) -> x_Result<()> {
+            match &self.batch {
+                Some(batch) => {
+                    lock(batch).push(packet, x_MAX_PACKET_SIZE);
+                    Ok(())
+                }
+                None => client.send(packet),
+            }
         }
 
-        fn address(&self) -> PyResult<(String, u16)> {
-            let addr = self.inner.addr();
-            Ok((addr.ip().to_string(), addr.port()))
+        /// Send the reliable messages and acks that are due, then the batched
+        /// messages.
+        fn flush_queued(&self, client: &mut XClient, now: f64) {
+            if let Some(reliable) = &self.reliable {
+                let mut packets: Vec<Vec<u8>> = Vec::new();
+                lock(&reliable.channel).poll(now, &reliable.stats, |packet| packets.push(packet));
+                for packet in packets {
+                    let _ = self.transmit(client, &packet);
+                }
+            }
+            if let Some(batch) = &self.batch {
+                for packet in lock(batch).take() {
+                    let _ = client.send(&packet);
+                }
+            }
         }
+    }
 
-        fn addr(&self) -> PyResult<(String, u16)> {
-            self.address()
+    #[pymethods]
+    impl Client {
+        /// `send_conditions` and `recv_conditions` simulate a degraded link in
+        /// each direction, see `NetworkConditions`.
+        ///
+        /// `send_interval` is how often the client sends connection requests
+        /// and keep-alives, in seconds, and `num_disconnect_packets` how many
+        /// disconnect packets it sends to make sure one arrives. Both default to
+        /// the library's settings.
+        ///
+        /// With `coalesce`, `send` batches messages until the next `update` or
+        /// `flush` and packs them into as few packets as fit, and `recv*` return
+        /// the messages one by one. The server has to coalesce too.
+        ///
+        /// With `reliable`, `send_reliable` sends messages that are resent until
+        /// acked and delivered in order, see `Server.send_reliable`. The server
+        /// has to be `reliable` too.
+        #[new]
+        #[pyo3(signature = (
+            token,
+            *,
+            network=None,
+            send_conditions=None,
+            recv_conditions=None,
+            send_interval=None,
+            num_disconnect_packets=None,
+            coalesce=false,
+            reliable=false,
+        ))]
+        #[allow(clippy::too_many_arguments)]
+        fn new<'py>(
+            py: Python<'py>,
+            token: &ConnectToken,
+            network: Option<PyRef<'py, LoopbackNetwork>>,
+            send_conditions: Option<PyRef<'py, NetworkConditions>>,
+            recv_conditions: Option<PyRef<'py, NetworkConditions>>,
+            send_interval: Option<f64>,
+            num_disconnect_packets: Option<usize>,
+            coalesce: bool,
+            reliable: bool,
+        ) -> PyResult<Self> {
+            check_interval("send_interval", send_interval)?;
+            let network = network.as_deref();
+            let (send_conditions, recv_conditions) =
+                (send_conditions.as_deref(), recv_conditions.as_deref());
+            let clock = Arc::new(Clock::default());
+            let metrics = Arc::new(Metrics::new(Arc::clone(&clock)));
+            let (inner, fileno) = py.allow_threads(|| -> PyResult<(XClient, Option<i64>)> {
+                let transport = match network {
+                    Some(network) => network.bind("0.0.0.0:0")?,
+                    None => Transport::Udp(UdpTransport::bind("0.0.0.0:0", false)?),
+                };
+                let transport = condition(transport, &clock, send_conditions, recv_conditions);
+                let transport = meter(transport, &metrics);
+                let fileno = transport.fileno();
+                let mut config = x_ClientConfig::new();
+                if let Some(send_interval) = send_interval {
+                    config = config.packet_send_rate(send_interval);
+                }
+                if let Some(num_disconnect_packets) = num_disconnect_packets {
+                    config = config.num_disconnect_packets(num_disconnect_packets);
+                }
+                let inner = x_Client::with_config_and_transceiver(&token.bytes, config, transport)
+                    .map_err(|e| PyRuntimeError::new_err(e.to_string()))?;
+                Ok((inner, fileno))
+            })?;
+            Ok(Self {
+                inner: Mutex::new(inner),
+                fileno,
+                clock,
+                metrics,
+                batch: coalesce.then(|| Mutex::new(Batch::default())),
+                received: Mutex::new(VecDeque::new()),
+                reliable: reliable.then(ClientReliable::default),
+            })
         }
 
-        fn num_connected_clients(&self) -> usize {
-            self.inner.num_connected_clients()
+        /// The socket's file descriptor (a `SOCKET` on Windows), to wait for
+        /// incoming packets with `select` or an event loop.
+        fn fileno(&self) -> PyResult<i64> {
+            fileno_or_err(self.fileno)
         }
 
-        fn client_id(&self, client_idx: &ClientIndex) -> Option<u64> {
-            self.inner.client_id(client_idx.inner)
+        fn connect(&self, py: Python<'_>) {
+            self.with_inner(py, |client| client.connect());
         }
 
-        fn client_address(&self, client_idx: &ClientIndex) -> Option<(String, u16)> {
-            self.inner
-                .client_addr(client_idx.inner)
-                .map(|addr| (addr.ip().to_string(), addr.port()))
+        fn update(&self, py: Python<'_>, time: f64) {
+            self.clock.set(time);
+            let metrics = &self.metrics;
+            self.with_inner(py, |client| {
+                self.flush_queued(client, time);
+                let started = Instant::now();
+                client.update(time);
+                metrics.update_seconds.observe(started.elapsed());
+            });
         }
 
-        fn client_addr(&self, client_idx: &ClientIndex) -> Option<(String, u16)> {
-            self.client_address(client_idx)
+        /// Send the messages batched by `send`, and the reliable resends and acks
+        /// that are due, now instead of at the next `update`. Does nothing
+        /// without `coalesce` or `reliable`.
+        fn flush(&self, py: Python<'_>) {
+            let now = self.clock.now();
+            self.with_inner(py, |client| self.flush_queued(client, now));
         }
 
-        #[getter]
-        fn clients(&self) -> Vec<ClientIndex> {
-            self.inner
-                .iter_clients()
-                .map(|idx| _netcode::ClientIndex { inner: idx })
+        fn recv(&self, py: Python<'_>) -> PyResult<Option<Py<PyBytes>>> {
+            match self.with_inner(py, |client| self.next_message(client)) {
+                Some(data) => {
+                    let py_bytes = PyBytes::new_bound(py, &data);
+                    Ok(Some(py_bytes.into()))
+                }
+                None => Ok(None),
+            }
+        }
+
+        #[pyo3(signature = (max_packets=None))]
+        fn recv_many(&self, py: Python<'_>, max_packets: Option<usize>) -> PyResult<Py<PyList>> {
+            let limit = max_packets.unwrap_or(usize::MAX);
+            let packets: Vec<Vec<u8>> = self.with_inner(py, |client| {
+                std::iter::from_fn(|| self.next_message(client))
+                    .take(limit)
+                    .collect()
+            });
+            let payloads = PyList::empty_bound(py);
+            for data in packets {
+                payloads.append(PyBytes::new_bound(py, &data))?;
+            }
+            Ok(payloads.unbind())
+        }
+
+        /// Copy the next packet into `buffer` and return its length.
+        fn recv_into(&self, py: Python<'_>, buffer: PyBuffer<u8>) -> PyResult<Option<usize>> {
+            check_recv_buffer(&buffer)?;
+            Ok(self
+                .with_inner(py, |client| self.next_message(client))
+                .map(|data| write_into(py, &buffer, &data)))
+        }
+
+        fn send(&self, py: Python<'_>, data: PyBuffer<u8>) -> PyResult<()> {
+            let bytes = buffer_bytes(&data)?;
+            let bytes: &[u8] = &bytes;
+            let coalesce = self.batch.is_some();
+            if let Some(reliable) = &self.reliable {
+                check_message(bytes, coalesce, UNRELIABLE_HEADER_BYTES)?;
+                return self
+                    .with_inner(py, |client| {
+                        let packet =
+                            lock(&reliable.channel).unreliable(bytes, max_packet(coalesce));
+                        self.transmit(client, &packet)
+                    })
+                    .map_err(|e| PyRuntimeError::new_err(e.to_string()));
+            }
+            if let Some(batch) = &self.batch {
+                check_message(bytes, true, 0)?;
+                py.allow_threads(|| lock(batch).push(bytes, x_MAX_PACKET_SIZE));
+                return Ok(());
+            }
+            self.with_inner(py, |client| client.send(bytes).unwrap());
+            Ok(())
+        }
+
+        /// Send `data` to the server on the reliable channel; see
+        /// `Server.send_reliable`.
+        fn send_reliable(&self, py: Python<'_>, data: PyBuffer<u8>) -> PyResult<()> {
+            let bytes = buffer_bytes(&data)?;
+            let bytes: &[u8] = &bytes;
+            let Some(reliable) = &self.reliable else {
+                return Err(PyRuntimeError::new_err(
+                    "the client was not created with reliable=True",
+                ));
+            };
+            check_message(bytes, self.batch.is_some(), RELIABLE_HEADER_BYTES)?;
+            let now = self.clock.now();
+            self.with_inner(py, |client| {
+                let packet = lock(&reliable.channel)
+                    .send(bytes, now, &reliable.stats)
+                    .map_err(|_| {
+                        PyRuntimeError::new_err(format!(
+                            "{} reliable messages are not acked yet",
+                            MAX_PENDING
+                        ))
+                    })?;
+                // once queued the message is resent until acked, so a failed
+                // send is a lost packet; raising would make a retry send it twice
+                if let Some(packet) = packet {
+                    let _ = self.transmit(client, &packet);
+                }
+                Ok(())
+            })
+        }
+
+        fn disconnect(&self, py: Python<'_>) {
+            let now = self.clock.now();
+            self.with_inner(py, |client| {
+                self.flush_queued(client, now);
+                client.disconnect().unwrap()
+            });
+        }
+
+        fn address(&self, py: Python<'_>) -> PyResult<(String, u16)> {
+            let addr = self.with_inner(py, |client| client.addr());
+            Ok((addr.ip().to_string(), addr.port()))
+        }
+
+        fn addr(&self, py: Python<'_>) -> PyResult<(String, u16)> {
+            self.address(py)
+        }
+
+        fn state(&self, py: Python<'_>) -> String {
+            let x_state = self.with_inner(py, |client| client.state());
+            let state: ClientState = x_state.into();
+            state.to_string()
+        }
+
+        fn is_error(&self, py: Python<'_>) -> bool {
+            self.with_inner(py, |client| client.is_error())
+        }
+
+        fn is_pending(&self, py: Python<'_>) -> bool {
+            self.with_inner(py, |client| client.is_pending())
+        }
+
+        fn is_connected(&self, py: Python<'_>) -> bool {
+            self.with_inner(py, |client| client.is_connected())
+        }
+
+        fn is_disconnected(&self, py: Python<'_>) -> bool {
+            self.with_inner(py, |client| client.is_disconnected())
+        }
+
+        /// Packets and bytes sent and received, counting handshakes and
+        /// keep-alives, and a histogram of `update` durations; see `Server.metrics`.
+        ///
+        /// With `reliable`, also the reliable channel's messages: `reliable_sent`,
+        /// `reliable_resent` and `reliable_acked` ones, the ones received and
+        /// `reliable_delivered` in order, `reliable_duplicates` received again,
+        /// `reliable_dropped` by `send_reliable` for lack of room, and
+        /// `reliable_pending` waiting for their ack. `reliable_rtt` is the
+        /// smoothed round trip in seconds (NaN until a message was acked) and
+        /// `reliable_ack_seconds` a histogram of the time from `send_reliable` to
+        /// the ack, resends included.
+        fn metrics(&self, py: Python<'_>) -> PyResult<Py<PyDict>> {
+            let dict = traffic_dict(py, &self.metrics)?;
+            if let Some(reliable) = &self.reliable {
+                reliable_items(py, &dict, &reliable.stats)?;
+                let (rtt, pending) = py.allow_threads(|| {
+                    let channel = lock(&reliable.channel);
+                    (channel.rtt().unwrap_or(f64::NAN), channel.pending())
+                });
+                dict.set_item("reliable_pending", pending)?;
+                dict.set_item("reliable_rtt", rtt)?;
+            }
+            Ok(dict.unbind())
+        }
+    }
+
+    /// A client's slot on the server. Hashable and ordered by its integer value,
+    /// so it can key dicts of per-client state.
+    #[pyclass(frozen)]
+    struct ClientIndex {
+        inner: x_ClientIndex,
+        value: u64,
+    }
+
+    impl ClientIndex {
+        fn new(inner: x_ClientIndex) -> Self {
+            Self {
+                inner,
+                value: index_value(inner),
+            }
+        }
+    }
+
+    #[pymethods]
+    impl ClientIndex {
+        fn __int__(&self) -> u64 {
+            self.value
+        }
+
+        fn __index__(&self) -> u64 {
+            self.value
+        }
+
+        fn __hash__(&self) -> u64 {
+            self.value
+        }
+
+        fn __richcmp__(&self, other: &Bound<'_, PyAny>, op: CompareOp) -> PyObject {
+            let py = other.py();
+            match other.downcast::<ClientIndex>() {
+                Ok(other) => op.matches(self.value.cmp(&other.get().value)).into_py(py),
+                Err(_) => py.NotImplemented(),
+            }
+        }
+
+        fn __repr__(&self) -> String {
+            format!("ClientIndex({})", self.value)
+        }
+    }
+
+    /// One connected client, as stored in a `ClientTable`.
+    #[derive(Clone, Copy, PartialEq)]
+    struct ClientRow {
+        value: u64,
+        client_id: u64,
+        addr: SocketAddr,
+    }
+
+    /// The connected clients as parallel arrays: row `i` is the client in slot
+    /// `indices[i]`, with id `client_ids[i]`, at `ips[16 * i : 16 * (i + 1)]`
+    /// (IPv4 addresses are IPv4-mapped IPv6) and port `ports[i]`.
+    ///
+    /// `Server.client_table` hands out the same table until a client connects or
+    /// disconnects, so do not modify the arrays.
+    #[pyclass(frozen)]
+    struct ClientTable {
+        #[pyo3(get)]
+        indices: PyObject,
+        #[pyo3(get)]
+        client_ids: PyObject,
+        #[pyo3(get)]
+        ips: Py<PyBytes>,
+        #[pyo3(get)]
+        ports: PyObject,
+        addresses: Vec<SocketAddr>,
+    }
+
+    impl ClientTable {
+        fn new(py: Python<'_>, rows: &[ClientRow]) -> PyResult<Self> {
+            let values: Vec<u64> = rows.iter().map(|row| row.value).collect();
+            let client_ids: Vec<u64> = rows.iter().map(|row| row.client_id).collect();
+            let ports: Vec<u16> = rows.iter().map(|row| row.addr.port()).collect();
+            let ips: Vec<u8> = rows
+                .iter()
+                .flat_map(|row| match row.addr.ip() {
+                    std::net::IpAddr::V4(ip) => ip.to_ipv6_mapped().octets(),
+                    std::net::IpAddr::V6(ip) => ip.octets(),
+                })
+                .collect();
+            Ok(Self {
+                indices: u64_array(py, &values)?,
+                client_ids: u64_array(py, &client_ids)?,
+                ips: PyBytes::new_bound(py, &ips).unbind(),
+                ports: u16_array(py, &ports)?,
+                addresses: rows.iter().map(|row| row.addr).collect(),
+            })
+        }
+    }
+
+    #[pymethods]
+    impl ClientTable {
+        fn __len__(&self) -> usize {
+            self.addresses.len()
+        }
+
+        /// The `(ip, port)` of row `i`.
+        fn address(&self, i: usize) -> PyResult<(String, u16)> {
+            let addr = self
+                .addresses
+                .get(i)
+                .ok_or_else(|| pyo3::exceptions::PyIndexError::new_err("row out of range"))?;
+            Ok((addr.ip().to_string(), addr.port()))
+        }
+    }
+
+    type XServer = x_Server<Transport>;
+
+    /// A received payload and the client it came from.
+    type Packet = (Vec<u8>, x_ClientIndex);
+
+    /// Received payloads beyond this many are dropped if nobody drains them
+    /// between updates.
+    const MAX_PENDING_PACKETS: usize = 65536;
+
+    /// A packet waiting for the background thread to send it.
+    enum Outbound {
+        To(Vec<u8>, RawIndex),
+        All(Vec<u8>),
+        // to the members of the group when the packet is sent
+        Group(Vec<u8>, String),
+        // on the reliable channel, dropped if the client's queue is full
+        Reliable(Vec<u8>, RawIndex),
+        // send the batched messages now instead of at the next tick
+        Flush,
+    }
+
+    /// State shared between a `Server` and its background thread.
+    #[derive(Default)]
+    struct BackgroundShared {
+        stop: AtomicBool,
+        dropped: AtomicU64,
+        error: Mutex<Option<String>>,
+    }
+
+    struct Background {
+        shared: Arc<BackgroundShared>,
+        thread: JoinHandle<()>,
+        outbound: Sender<Outbound>,
+    }
+
+    /// Messages batched per client by a coalescing server, until they are
+    /// flushed.
+    type ServerBatches = Mutex<Batches<u64, x_ClientIndex>>;
+
+    /// A server's end of the reliable channel of every client it talked to, by
+    /// slot value.
+    #[derive(Default)]
+    struct ServerReliable {
+        channels: Mutex<HashMap<u64, (x_ClientIndex, Channel)>>,
+        stats: ReliableStats,
+    }
+
+    impl ServerReliable {
+        /// Run `f` on the channel of `index`, opened on first use.
+        fn with_channel<R>(
+            &self,
+            index: x_ClientIndex,
+            f: impl FnOnce(&mut Channel, &ReliableStats) -> R,
+        ) -> R {
+            let mut channels = lock(&self.channels);
+            let (_, channel) = channels
+                .entry(index_value(index))
+                .or_insert_with(|| (index, Channel::default()));
+            f(channel, &self.stats)
+        }
+    }
+
+    /// What a server does to payloads between Python and `netcode`: with
+    /// `reliable` they are framed for the reliable channel, then with
+    /// `coalesce` batched per client. Shared with the background thread.
+    struct Framing {
+        reliable: Option<ServerReliable>,
+        batches: Option<ServerBatches>,
+    }
+
+    impl Framing {
+        fn new(reliable: bool, coalesce: bool) -> Self {
+            Self {
+                reliable: reliable.then(ServerReliable::default),
+                batches: coalesce.then(|| Mutex::new(Batches::new(x_MAX_PACKET_SIZE))),
+            }
+        }
+
+        /// Check that a payload fits once framed, before it is batched or
+        /// queued, rather than failing later where Python cannot see it.
+        fn check(&self, data: &[u8], reliable: bool) -> PyResult<()> {
+            if self.reliable.is_none() && self.batches.is_none() {
+                // `netcode` checks unframed payloads itself
+                return Ok(());
+            }
+            check_message(data, self.batches.is_some(), self.header(reliable))
+        }
+
+        fn header(&self, reliable: bool) -> usize {
+            match (reliable, &self.reliable) {
+                (true, _) => RELIABLE_HEADER_BYTES,
+                (false, Some(_)) => UNRELIABLE_HEADER_BYTES,
+                (false, None) => 0,
+            }
+        }
+
+        /// Send `data` to `index`, framed and batched as configured.
+        fn send(
+            &self,
+            server: &mut XServer,
+            data: &[u8],
+            index: x_ClientIndex,
+        ) -> Result<(), x_Error> {
+            match &self.reliable {
+                Some(reliable) => {
+                    let max_packet = max_packet(self.batches.is_some());
+                    let packet = reliable
+                        .with_channel(index, |channel, _| channel.unreliable(data, max_packet));
+                    self.transmit(server, &packet, index)
+                }
+                None => self.transmit(server, data, index),
+            }
+        }
+
+        /// Send `data` to every connected client.
+        fn send_all(&self, server: &mut XServer, data: &[u8]) -> Result<(), x_Error> {
+            if self.reliable.is_none() && self.batches.is_none() {
+                return server.send_all(data);
+            }
+            let indices: Vec<x_ClientIndex> = server.iter_clients().collect();
+            for index in indices {
+                self.send(server, data, index)?;
+            }
+            Ok(())
+        }
+
+        /// Queue `data` on the reliable channel of a connected client, and send
+        /// it unless too many messages to that client are in flight.
+        fn send_reliable(
+            &self,
+            server: &mut XServer,
+            data: &[u8],
+            index: x_ClientIndex,
+            now: f64,
+        ) -> PyResult<()> {
+            let Some(reliable) = &self.reliable else {
+                return Err(PyRuntimeError::new_err(
+                    "the server was not created with reliable=True",
+                ));
+            };
+            if server.client_id(index).is_none() {
+                return Err(PyValueError::new_err(format!(
+                    "no connected client with index {}",
+                    index_value(index)
+                )));
+            }
+            let packet = reliable
+                .with_channel(index, |channel, stats| channel.send(data, now, stats))
+                .map_err(|_| {
+                    PyRuntimeError::new_err(format!(
+                        "{} reliable messages to client {} are not acked yet",
+                        MAX_PENDING,
+                        index_value(index)
+                    ))
+                })?;
+            // once queued the message is resent until acked, so a failed send
+            // is a lost packet; raising would make a retry send it twice
+            if let Some(packet) = packet {
+                let _ = self.transmit(server, &packet, index);
+            }
+            Ok(())
+        }
+
+        /// Batch a framed packet, or send it.
+        fn transmit(
+            &self,
+            server: &mut XServer,
+            packet: &[u8],
+            index: x_ClientIndex,
+        ) -> Result<(), x_Error> {
+            match &self.batches {
+                Some(batches) => {
+                    lock(batches).push(index_value(index), index, packet);
+                    Ok(())
+                }
+                None => server.send(packet, index),
+            }
+        }
+
+        /// Send the reliable messages and acks that are due, then the batched
+        /// messages, packed into as few packets as fit. A client may disconnect
+        /// in the meantime, that is not an error.
+        fn flush(&self, server: &mut XServer, now: f64) {
+            if let Some(reliable) = &self.reliable {
+                let mut packets: Vec<(x_ClientIndex, Vec<u8>)> = Vec::new();
+                for (index, channel) in lock(&reliable.channels).values_mut() {
+                    channel.poll(now, &reliable.stats, |packet| {
+                        packets.push((*index, packet))
+                    });
+                }
+                for (index, packet) in packets {
+                    let _ = self.transmit(server, &packet, index);
+                }
+            }
+            if let Some(batches) = &self.batches {
+                let packets: Vec<(x_ClientIndex, Vec<u8>)> = lock(batches).drain().collect();
+                for (index, packet) in packets {
+                    let _ = server.send(&packet, index);
+                }
+            }
+        }
+
+        /// Pass on the payloads a received packet holds.
+        fn unpack(&self, packet: Packet, now: f64, mut deliver: impl FnMut(Packet)) {
+            match &self.reliable {
+                Some(reliable) => {
+                    unpack(packet, self.batches.is_some(), |(message, index)| {
+                        reliable.with_channel(index, |channel, stats| {
+                            channel
+                                .receive(&message, now, stats, |payload| deliver((payload, index)))
+                        });
+                    });
+                }
+                None => unpack(packet, self.batches.is_some(), deliver),
+            }
+        }
+
+        /// Close the channels of disconnected clients, so a client that gets
+        /// their slot next starts over.
+        fn forget(&self, disconnected: &[u64]) {
+            if let (Some(reliable), false) = (&self.reliable, disconnected.is_empty()) {
+                let mut channels = lock(&reliable.channels);
+                for value in disconnected {
+                    channels.remove(value);
+                }
+            }
+        }
+    }
+
+    fn send_outbound(
+        server: &mut XServer,
+        groups: &Groups,
+        framing: &Framing,
+        now: f64,
+        packets: impl IntoIterator<Item = Outbound>,
+    ) {
+        // a client may disconnect between queueing and sending, that is not an error
+        for packet in packets {
+            match packet {
+                Outbound::To(data, index) => {
+                    if let Ok(index) = resolve_index(server, index) {
+                        let _ = framing.send(server, &data, index);
+                    }
+                }
+                Outbound::All(data) => {
+                    let _ = framing.send_all(server, &data);
+                }
+                Outbound::Group(data, group) => {
+                    let _ = groups.send(server, framing, &group, &data);
+                }
+                Outbound::Reliable(data, index) => {
+                    if let Ok(index) = resolve_index(server, index) {
+                        let _ = framing.send_reliable(server, &data, index, now);
+                    }
+                }
+                Outbound::Flush => framing.flush(server, now),
+            }
+        }
+    }
+
+    #[derive(Clone, Copy, PartialEq, Eq)]
+    enum EventKind {
+        Connect,
+        Disconnect,
+    }
+
+    impl EventKind {
+        fn as_str(self) -> &'static str {
+            match self {
+                Self::Connect => "connect",
+                Self::Disconnect => "disconnect",
+            }
+        }
+    }
+
+    /// The id and user data a client connected with.
+    type Identity = (u64, [u8; x_USER_DATA_BYTES]);
+
+    /// A connect or disconnect, with the client's identity as of its connect.
+    struct Event {
+        kind: EventKind,
+        index: x_ClientIndex,
+        identity: Identity,
+    }
+
+    /// Events beyond this many are dropped, oldest first, if nobody polls.
+    const MAX_PENDING_EVENTS: usize = 65536;
+
+    #[derive(Default)]
+    struct ResolvedEvents {
+        // identities of the connected clients, to describe their disconnect
+        // after the server forgot them
+        known: HashMap<u64, Identity>,
+        ready: VecDeque<Event>,
+        dropped: u64,
+    }
+
+    /// Connects and disconnects reported by the server's callbacks.
+    #[derive(Default)]
+    struct Events {
+        // pushed by the callbacks, which only get the slot
+        raw: Mutex<Vec<(EventKind, x_ClientIndex)>>,
+        resolved: Mutex<ResolvedEvents>,
+    }
+
+    impl Events {
+        fn push(&self, kind: EventKind, index: x_ClientIndex) {
+            lock(&self.raw).push((kind, index));
+        }
+
+        /// Attach identities to the raw events while `server` still knows the
+        /// clients that just connected; call it after every server operation.
+        fn resolve(&self, server: &XServer) -> Churn {
+            let raw = std::mem::take(&mut *lock(&self.raw));
+            let mut churn = Churn::default();
+            if raw.is_empty() {
+                return churn;
+            }
+            let mut resolved = lock(&self.resolved);
+            for (kind, index) in raw {
+                let value = index_value(index);
+                let identity = match kind {
+                    EventKind::Connect => {
+                        let identity = (
+                            server.client_id(index).unwrap_or_default(),
+                            server
+                                .client_user_data(index)
+                                .map(|user_data| user_data.to_owned())
+                                .unwrap_or([0; x_USER_DATA_BYTES]),
+                        );
+                        resolved.known.insert(value, identity);
+                        churn.connected.push(index);
+                        identity
+                    }
+                    EventKind::Disconnect => {
+                        churn.disconnected.push(value);
+                        resolved
+                            .known
+                            .remove(&value)
+                            .unwrap_or((0, [0; x_USER_DATA_BYTES]))
+                    }
+                };
+                if resolved.ready.len() == MAX_PENDING_EVENTS {
+                    resolved.ready.pop_front();
+                    resolved.dropped += 1;
+                }
+                resolved.ready.push_back(Event {
+                    kind,
+                    index,
+                    identity,
+                });
+            }
+            churn
+        }
+    }
+
+    /// The clients that connected and the slots that disconnected in one
+    /// server operation, oldest first.
+    #[derive(Default)]
+    struct Churn {
+        connected: Vec<x_ClientIndex>,
+        disconnected: Vec<u64>,
+    }
+
+    /// Named sets of connected clients for `send_group`, by index value so the
+    /// members go out in index order. Empty groups are dropped.
+    #[derive(Default)]
+    struct Groups(Mutex<HashMap<String, BTreeMap<u64, x_ClientIndex>>>);
+
+    impl Groups {
+        /// Returns whether `index` was not in `group` yet.
+        fn add(&self, group: &str, index: x_ClientIndex) -> bool {
+            lock(&self.0)
+                .entry(group.to_owned())
+                .or_default()
+                .insert(index_value(index), index)
+                .is_none()
+        }
+
+        /// Returns whether `value` was in `group`.
+        fn remove(&self, group: &str, value: u64) -> bool {
+            let mut groups = lock(&self.0);
+            let Some(members) = groups.get_mut(group) else {
+                return false;
+            };
+            let removed = members.remove(&value).is_some();
+            if members.is_empty() {
+                groups.remove(group);
+            }
+            removed
+        }
+
+        fn members(&self, group: &str) -> Vec<x_ClientIndex> {
+            lock(&self.0)
+                .get(group)
+                .map(|members| members.values().copied().collect())
+                .unwrap_or_default()
+        }
+
+        fn names(&self) -> Vec<String> {
+            let mut names: Vec<String> = lock(&self.0).keys().cloned().collect();
+            names.sort();
+            names
+        }
+
+        /// Take disconnected clients out of every group.
+        fn forget(&self, disconnected: &[u64]) {
+            if disconnected.is_empty() {
+                return;
+            }
+            lock(&self.0).retain(|_, members| {
+                for value in disconnected {
+                    members.remove(value);
+                }
+                !members.is_empty()
+            });
+        }
+
+        /// Send `data` to every member of `group`, returns how many there were.
+        fn send(
+            &self,
+            server: &mut XServer,
+            framing: &Framing,
+            group: &str,
+            data: &[u8],
+        ) -> Result<usize, x_Error> {
+            let members = self.members(group);
+            for &index in &members {
+                framing.send(server, data, index)?;
+            }
+            Ok(members.len())
+        }
+    }
+
+    /// Enforces `max_clients`, which `netcode` has no setting for, through the
+    /// admission layer that also counts the connection requests it drops.
+    struct ClientLimit {
+        max_clients: Option<usize>,
+        admission: Arc<AdmissionState>,
+    }
+
+    /// Bookkeeping after anything that may have connected or disconnected
+    /// clients: resolve their events, enforce the client limit, take
+    /// disconnected clients out of their groups, close their reliable channels
+    /// and keep the per-client metrics in step with the connected clients.
+    fn settle(
+        server: &mut XServer,
+        events: &Events,
+        limit: &ClientLimit,
+        groups: &Groups,
+        framing: &Framing,
+        metrics: &Metrics,
+    ) {
+        let churn = events.resolve(server);
+        let churned = !churn.connected.is_empty() || !churn.disconnected.is_empty();
+        groups.forget(&churn.disconnected);
+        framing.forget(&churn.disconnected);
+        if let Some(max_clients) = limit.max_clients {
+            let excess = server.num_connected_clients().saturating_sub(max_clients);
+            if excess > 0 {
+                // handshakes that were already underway when the server filled up
+                for index in churn.connected.into_iter().rev().take(excess) {
+                    let _ = server.disconnect(index);
+                }
+                let disconnected = events.resolve(server).disconnected;
+                groups.forget(&disconnected);
+                framing.forget(&disconnected);
+            }
+            limit
+                .admission
+                .set_full(server.num_connected_clients() >= max_clients);
+        }
+        // only connected clients are tracked, so spoofed addresses cost nothing
+        if churned || metrics.num_peers() != server.num_connected_clients() {
+            metrics.set_peers(
+                server
+                    .iter_clients()
+                    .filter_map(|index| server.client_addr(index)),
+            );
+        }
+    }
+
+    /// Update `server` and settle, at most twice.
+    ///
+    /// The callbacks only get the slot, so a client's id and user data are read
+    /// from the server afterwards. A client that connected and left (or whose
+    /// slot was reused) within one update would be reported with no or someone
+    /// else's identity, so the admission layer holds back a disconnect from a
+    /// source whose connection response it handed on in the same pass, and the
+    /// packets after it. That ends the update, and they are taken by updating
+    /// again at the same time once the identities are recorded; a hold in that
+    /// second pass leaves them to the next update.
+    fn update_server(
+        server: &mut XServer,
+        time: f64,
+        events: &Events,
+        limit: &ClientLimit,
+        groups: &Groups,
+        framing: &Framing,
+        metrics: &Metrics,
+    ) -> Result<(), x_Error> {
+        let result = server.try_update(time);
+        settle(server, events, limit, groups, framing, metrics);
+        if !limit.admission.release() || result.is_err() {
+            return result;
+        }
+        let result = server.try_update(time);
+        settle(server, events, limit, groups, framing, metrics);
+        limit.admission.release();
+        result
+    }
+
+    /// Reject intervals that are not a positive number of seconds.
+    fn check_interval(name: &str, interval: Option<f64>) -> PyResult<()> {
+        match interval {
+            Some(interval) if !(interval > 0.0 && interval.is_finite()) => Err(
+                PyValueError::new_err(format!("{name} must be a positive number of seconds")),
+            ),
+            _ => Ok(()),
+        }
+    }
+
+    /// The background thread: update the server on a fixed clock, push what it
+    /// receives into the inbound queue and send queued packets as they arrive.
+    fn run_background(
+        server: Arc<Mutex<XServer>>,
+        clock: Arc<Clock>,
+        events: Arc<Events>,
+        limit: Arc<ClientLimit>,
+        groups: Arc<Groups>,
+        framing: Arc<Framing>,
+        metrics: Arc<Metrics>,
+        shared: Arc<BackgroundShared>,
+        period: Duration,
+        start_time: f64,
+        inbound: SyncSender<Packet>,
+        outbound: Receiver<Outbound>,
+    ) {
+        let start = Instant::now();
+        let mut next_tick = start;
+        while !shared.stop.load(Ordering::Acquire) {
+            let now = Instant::now();
+            if now < next_tick {
+                // wait for the next tick, but send anything queued in the meantime
+                match outbound.recv_timeout(next_tick - now) {
+                    Ok(packet) => {
+                        let now = start_time + start.elapsed().as_secs_f64();
+                        send_outbound(&mut lock(&server), &groups, &framing, now, [packet])
+                    }
+                    Err(RecvTimeoutError::Timeout) => {}
+                    Err(RecvTimeoutError::Disconnected) => break,
+                }
+                continue;
+            }
+
+            let time = start_time + start.elapsed().as_secs_f64();
+            clock.set(time);
+            let mut guard = lock(&server);
+            send_outbound(&mut guard, &groups, &framing, time, outbound.try_iter());
+            framing.flush(&mut guard, time);
+            metrics.profiler.begin(time);
+            let started = Instant::now();
+            let result = update_server(
+                &mut guard, time, &events, &limit, &groups, &framing, &metrics,
+            );
+            metrics.update_seconds.observe(started.elapsed());
+            metrics.profiler.switch(Phase::Bookkeeping);
+            if let Err(e) = result {
+                *lock(&shared.error) = Some(e.to_string());
+                break;
+            }
+            while let Some(packet) = guard.recv() {
+                metrics.payloads_received.fetch_add(1, Ordering::Relaxed);
+                framing.unpack(packet, time, |message| {
+                    if inbound.try_send(message).is_err() {
+                        shared.dropped.fetch_add(1, Ordering::Relaxed);
+                        metrics.payloads_dropped.fetch_add(1, Ordering::Relaxed);
+                    }
+                });
+            }
+            metrics.profiler.end();
+            drop(guard);
+
+            // deadlines do not depend on how long a tick took, so there is no drift;
+            // if we fell behind, skip the missed ticks instead of bursting through them
+            next_tick = (next_tick + period).max(Instant::now());
+        }
+    }
+
+    /// The server lives behind a mutex so the pyclass can be shared between
+    /// threads, and every method runs with the GIL released.
+    #[pyclass(frozen)]
+    struct Server {
+        inner: Arc<Mutex<XServer>>,
+        fileno: Option<i64>,
+        clock: Arc<Clock>,
+        events: Arc<Events>,
+        limit: Arc<ClientLimit>,
+        groups: Arc<Groups>,
+        framing: Arc<Framing>,
+        metrics: Arc<Metrics>,
+        // to mint tokens without holding the server's lock
+        protocol_id: u64,
+        private_key: Key,
+        token_lifetime: TokenLifetime,
+        // the last `client_table` and the rows it was built from
+        client_table: Mutex<Option<(Vec<ClientRow>, Py<ClientTable>)>>,
+        // the last time passed to `update`, the background clock continues from it
+        time: Mutex<f64>,
+        // packets the background thread received but Python did not drain yet
+        pending: Mutex<VecDeque<Packet>>,
+        background: Mutex<Option<Background>>,
+        inbound: Mutex<Option<Receiver<Packet>>>,
+    }
+
+    impl Server {
+        /// Run `f` on the locked server with the GIL released, so a long
+        /// `update` on one thread never blocks the interpreter for the others.
+        fn with_inner<F, R>(&self, py: Python<'_>, f: F) -> R
+        where
+            F: FnOnce(&mut XServer) -> R + Ungil,
+            R: Ungil,
+        {
+            py.allow_threads(|| {
+                let mut server = lock(&self.inner);
+                let result = f(&mut server);
+                settle(
+                    &mut server,
+                    &self.events,
+                    &self.limit,
+                    &self.groups,
+                    &self.framing,
+                    &self.metrics,
+                );
+                result
+            })
+        }
+
+        /// The token lifetime for `token`/`tokens`, falling back to the server's.
+        fn lifetime_or_default(
+            &self,
+            expire_seconds: Option<i32>,
+            timeout_seconds: Option<i32>,
+        ) -> TokenLifetime {
+            TokenLifetime {
+                expire_seconds: expire_seconds.or(self.token_lifetime.expire_seconds),
+                timeout_seconds: timeout_seconds.or(self.token_lifetime.timeout_seconds),
+            }
+        }
+
+        /// The queue feeding the background thread, if it runs.
+        fn outbound(&self) -> Option<Sender<Outbound>> {
+            lock(&self.background)
+                .as_ref()
+                .map(|background| background.outbound.clone())
+        }
+
+        /// Take up to `limit` received packets, from the background queue when the
+        /// background thread runs. Only a background queue can be waited on.
+        fn take_packets(&self, py: Python<'_>, limit: usize, timeout: Option<f64>) -> Vec<Packet> {
+            py.allow_threads(|| {
+                let mut packets: Vec<Packet> = Vec::new();
+                {
+                    let mut pending = lock(&self.pending);
+                    while packets.len() < limit {
+                        match pending.pop_front() {
+                            Some(packet) => packets.push(packet),
+                            None => break,
+                        }
+                    }
+                }
+                let limit = limit - packets.len();
+                if let Some(inbound) = lock(&self.inbound).as_ref() {
+                    packets.extend(inbound.try_iter().take(limit));
+                    let wait = timeout.filter(|_| packets.is_empty() && limit > 0);
+                    if let Some(timeout) = wait {
+                        let timeout = Duration::from_secs_f64(timeout.max(0.0));
+                        if let Ok(packet) = inbound.recv_timeout(timeout) {
+                            packets.push(packet);
+                            packets.extend(inbound.try_iter().take(limit - 1));
+                        }
+                    }
+                    return packets;
+                }
+                let mut server = lock(&self.inner);
+                let limit = packets.len() + limit;
+                let mut received = 0;
+                while packets.len() < limit {
+                    let Some(packet) = server.recv() else {
+                        break;
+                    };
+                    received += 1;
+                    self.framing
+                        .unpack(packet, self.clock.now(), |message| packets.push(message));
+                }
+                self.metrics
+                    .payloads_received
+                    .fetch_add(received, Ordering::Relaxed);
+                // the rest of the last coalesced packet, for the next call
+                if packets.len() > limit {
+                    lock(&self.pending).extend(packets.drain(limit..));
+                }
+                packets
+            })
+        }
+
+        /// Send packets to clients, or queue copies for the background thread.
+        fn send_to(&self, py: Python<'_>, packets: &[(&[u8], RawIndex)]) -> PyResult<usize> {
+            for (bytes, _) in packets {
+                self.framing.check(bytes, false)?;
+            }
+            py.allow_threads(|| {
+                if let Some(outbound) = self.outbound() {
+                    for (bytes, index) in packets {
+                        outbound
+                            .send(Outbound::To(bytes.to_vec(), *index))
+                            .map_err(|_| PyRuntimeError::new_err("background thread stopped"))?;
+                    }
+                    return Ok(packets.len());
+                }
+
+                let mut server = lock(&self.inner);
+                // check every index first, so that a bad one sends nothing
+                let mut indices = Vec::with_capacity(packets.len());
+                for (_, index) in packets {
+                    let index = resolve_index(&server, *index)?;
+                    if server.client_id(index).is_none() {
+                        return Err(PyValueError::new_err(format!(
+                            "no connected client with index {}",
+                            index_value(index)
+                        )));
+                    }
+                    indices.push(index);
+                }
+                for ((bytes, _), index) in packets.iter().zip(indices) {
+                    self.framing
+                        .send(&mut server, bytes, index)
+                        .map_err(|e| PyRuntimeError::new_err(e.to_string()))?;
+                }
+                Ok(packets.len())
+            })
+        }
+    }
+
+    #[pymethods]
+    impl Server {
+        /// With `reuse_port`, several server processes can bind the same address
+        /// (`SO_REUSEPORT`); the kernel keeps each client on one of them.
+        /// With `network`, the server binds on that `LoopbackNetwork` instead of
+        /// a UDP socket. `send_conditions` and `recv_conditions` simulate a
+        /// degraded link in each direction, see `NetworkConditions`.
+        ///
+        /// `max_clients` caps the connected clients below the library's limit;
+        /// once full, connection requests are dropped unread. Requests that
+        /// `netcode` would reject anyway (wrong size, version or protocol id, or
+        /// an expired token) are always dropped before decryption; `admission`
+        /// adds rate limits, see `AdmissionControl`. `keep_alive_interval`
+        /// is how often idle clients get a keep-alive, in seconds, and
+        /// `num_disconnect_packets` how many disconnect packets are sent to make
+        /// sure one arrives. `token_expire_seconds` and `token_timeout_seconds`
+        /// are the defaults for `token` and `tokens`, -1 meaning never.
+        ///
+        /// With `coalesce`, the `send*` methods batch messages per client until
+        /// the next `update` or `flush` (or the next tick in the background) and
+        /// pack them into as few packets as fit, and `recv*` return the messages
+        /// one by one. Clients have to coalesce too. A message batched for a
+        /// client that disconnects before the flush is dropped silently.
+        ///
+        /// With `reliable`, `send_reliable` sends messages that are resent until
+        /// acked and delivered in order, over the same packets as `send*`; see
+        /// `send_reliable`. Every payload gets a header byte, so clients have to
+        /// be `reliable` too.
+        #[new]
+        #[pyo3(signature = (
+            bind_addr,
+            protocol_id,
+            private_key,
+            *,
+            reuse_port=false,
+            network=None,
+            send_conditions=None,
+            recv_conditions=None,
+            max_clients=None,
+            admission=None,
+            keep_alive_interval=None,
+            num_disconnect_packets=None,
+            token_expire_seconds=-1,
+            token_timeout_seconds=-1,
+            coalesce=false,
+            reliable=false,
+        ))]
+        #[allow(clippy::too_many_arguments)]
+        fn new<'py>(
+            py: Python<'py>,
+            bind_addr: (String, u16),
+            protocol_id: u64,
+            private_key: Key,
+            reuse_port: bool,
+            network: Option<PyRef<'py, LoopbackNetwork>>,
+            send_conditions: Option<PyRef<'py, NetworkConditions>>,
+            recv_conditions: Option<PyRef<'py, NetworkConditions>>,
+            max_clients: Option<usize>,
+            admission: Option<PyRef<'py, AdmissionControl>>,
+            keep_alive_interval: Option<f64>,
+            num_disconnect_packets: Option<usize>,
+            token_expire_seconds: i32,
+            token_timeout_seconds: i32,
+            coalesce: bool,
+            reliable: bool,
+        ) -> PyResult<Self> {
+            check_interval("keep_alive_interval", keep_alive_interval)?;
+            if max_clients == Some(0) {
+                return Err(PyValueError::new_err("max_clients must be at least 1"));
+            }
+            let limit = Arc::new(ClientLimit {
+                max_clients,
+                admission: Arc::new(AdmissionState::default()),
+            });
+            let admission_config =
+                admission.map_or_else(AdmissionConfig::default, |admission| admission.config());
+            let network = network.as_deref();
+            let (send_conditions, recv_conditions) =
+                (send_conditions.as_deref(), recv_conditions.as_deref());
+            let clock = Arc::new(Clock::default());
+            let metrics = Arc::new(Metrics::new(Arc::clone(&clock)));
+            let events = Arc::new(Events::default());
+            if reuse_port && network.is_some() {
+                return Err(PyValueError::new_err(
+                    "reuse_port is not supported on a loopback network",
+                ));
+            }
+            let (inner, fileno) = py.allow_threads(|| -> PyResult<(XServer, Option<i64>)> {
+                let addr = (bind_addr.0.as_str(), bind_addr.1);
+                let transport = match network {
+                    Some(network) => network.bind(addr)?,
+                    None => Transport::Udp(UdpTransport::bind(addr, reuse_port)?),
+                };
+                let transport = condition(transport, &clock, send_conditions, recv_conditions);
+                // counted below admission, to see the connection requests it drops
+                let transport = meter(transport, &metrics);
+                let admission = Admission::new(
+                    transport,
+                    Arc::clone(&limit.admission),
+                    Arc::clone(&clock),
+                    protocol_id,
+                    admission_config,
+                );
+                let transport = Transport::Admission(Box::new(admission));
+                let fileno = transport.fileno();
+                let (on_connect, on_disconnect) = (Arc::clone(&events), Arc::clone(&events));
+                let mut config = x_ServerConfig::new()
+                    .on_connect(move |index, _| on_connect.push(EventKind::Connect, index))
+                    .on_disconnect(move |index, _| {
+                        on_disconnect.push(EventKind::Disconnect, index)
+                    });
+                if let Some(keep_alive_interval) = keep_alive_interval {
+                    config = config.keep_alive_send_rate(keep_alive_interval);
+                }
+                if let Some(num_disconnect_packets) = num_disconnect_packets {
+                    config = config.num_disconnect_packets(num_disconnect_packets);
+                }
+                let inner = x_Server::with_config_and_transceiver(
+                    protocol_id,
+                    private_key,
+                    transport,
+                    config,
+                )
+                .map_err(|e| PyRuntimeError::new_err(e.to_string()))?;
+                Ok((inner, fileno))
+            })?;
+            Ok(Self {
+                inner: Arc::new(Mutex::new(inner)),
+                fileno,
+                clock,
+                events,
+                limit,
+                groups: Arc::new(Groups::default()),
+                framing: Arc::new(Framing::new(reliable, coalesce)),
+                metrics,
+                protocol_id,
+                private_key,
+                token_lifetime: TokenLifetime {
+                    expire_seconds: Some(token_expire_seconds),
+                    timeout_seconds: Some(token_timeout_seconds),
+                },
+                client_table: Mutex::new(None),
+                time: Mutex::new(0.0),
+                pending: Mutex::new(VecDeque::new()),
+                background: Mutex::new(None),
+                inbound: Mutex::new(None),
+            })
+        }
+
+        /// The socket's file descriptor (a `SOCKET` on Windows), to wait for
+        /// incoming packets with `select` or an event loop.
+        fn fileno(&self) -> PyResult<i64> {
+            fileno_or_err(self.fileno)
+        }
+
+        fn update(&self, py: Python<'_>, time: f64) -> PyResult<()> {
+            if self.is_background_running() {
+                return Err(PyRuntimeError::new_err(
+                    "the server is updated by its background thread",
+                ));
+            }
+            *lock(&self.time) = time;
+            self.clock.set(time);
+            let (metrics, pending) = (&self.metrics, &self.pending);
+            let (events, limit, groups, framing) =
+                (&self.events, &self.limit, &self.groups, &self.framing);
+            let result = self.with_inner(py, |server| {
+                framing.flush(server, time);
+                metrics.profiler.begin(time);
+                let started = Instant::now();
+                let result = update_server(server, time, events, limit, groups, framing, metrics);
+                metrics.update_seconds.observe(started.elapsed());
+                // from here on, until `settle` is done
+                metrics.profiler.switch(Phase::Bookkeeping);
+                // take what arrived right away, so `payloads_rejected` is exact
+                // between updates and not inflated by packets Python did not drain
+                let mut received: Vec<Packet> = Vec::new();
+                let mut payloads = 0;
+                while let Some(packet) = server.recv() {
+                    payloads += 1;
+                    framing.unpack(packet, time, |message| received.push(message));
+                }
+                metrics
+                    .payloads_received
+                    .fetch_add(payloads, Ordering::Relaxed);
+                let mut pending = lock(pending);
+                // like the background queue, a full queue drops what arrives
+                let room = MAX_PENDING_PACKETS.saturating_sub(pending.len());
+                let dropped = received.len().saturating_sub(room);
+                if dropped > 0 {
+                    received.truncate(room);
+                    metrics
+                        .payloads_dropped
+                        .fetch_add(dropped as u64, Ordering::Relaxed);
+                }
+                pending.extend(received);
+                result
+            });
+            self.metrics.profiler.end();
+            result.map_err(|e| PyRuntimeError::new_err(e.to_string()))
+        }
+
+        /// Hand the socket to a native thread that updates the server `tick_hz`
+        /// times per second, continuing from the last time passed to `update`.
+        ///
+        /// While it runs, `recv*` drain a queue of at most `queue_capacity` packets
+        /// filled by that thread (packets arriving when it is full are dropped),
+        /// `send*` queue packets that the thread sends as soon as it wakes up, and
+        /// calling `update` is an error.
+        #[pyo3(signature = (tick_hz=60.0, queue_capacity=65536))]
+        fn start_background(&self, tick_hz: f64, queue_capacity: usize) -> PyResult<()> {
+            if !(tick_hz > 0.0 && tick_hz.is_finite()) {
+                return Err(PyValueError::new_err("tick_hz must be a positive number"));
+            }
+            let mut background = lock(&self.background);
+            if background.is_some() {
+                return Err(PyRuntimeError::new_err("background thread already running"));
+            }
+
+            let shared = Arc::new(BackgroundShared::default());
+            let (inbound_tx, inbound_rx) = mpsc::sync_channel(queue_capacity);
+            let (outbound_tx, outbound_rx) = mpsc::channel();
+            let server = Arc::clone(&self.inner);
+            let clock = Arc::clone(&self.clock);
+            let events = Arc::clone(&self.events);
+            let limit = Arc::clone(&self.limit);
+            let groups = Arc::clone(&self.groups);
+            let framing = Arc::clone(&self.framing);
+            let metrics = Arc::clone(&self.metrics);
+            let thread_shared = Arc::clone(&shared);
+            let period = Duration::from_secs_f64(1.0 / tick_hz);
+            let start_time = *lock(&self.time);
+            let thread = std::thread::Builder::new()
+                .name("netcode-server".to_string())
+                .spawn(move || {
+                    run_background(
+                        server,
+                        clock,
+                        events,
+                        limit,
+                        groups,
+                        framing,
+                        metrics,
+                        thread_shared,
+                        period,
+                        start_time,
+                        inbound_tx,
+                        outbound_rx,
+                    )
+                })
+                .map_err(|e| PyRuntimeError::new_err(e.to_string()))?;
+
+            *lock(&self.inbound) = Some(inbound_rx);
+            *background = Some(Background {
+                shared,
+                thread,
+                outbound: outbound_tx,
+            });
+            Ok(())
+        }
+
+        /// Stop the background thread and go back to calling `update` by hand.
+        ///
+        /// Packets still queued by the thread are kept for the next `recv*`.
+        /// Raises `RuntimeError` if the thread stopped because `update` failed.
+        fn stop_background(&self, py: Python<'_>) -> PyResult<()> {
+            let Some(background) = lock(&self.background).take() else {
+                return Ok(());
+            };
+            background.shared.stop.store(true, Ordering::Release);
+            // dropping the sender wakes the thread up if it is waiting for a tick
+            drop(background.outbound);
+            py.allow_threads(|| background.thread.join())
+                .map_err(|_| PyRuntimeError::new_err("background thread panicked"))?;
+
+            if let Some(inbound) = lock(&self.inbound).take() {
+                lock(&self.pending).extend(inbound.try_iter());
+            }
+            let dropped = background.shared.dropped.load(Ordering::Relaxed);
+            if dropped > 0 {
+                log::warn!("background queue was full, dropped {} packets", dropped);
+            }
+            match lock(&background.shared.error).take() {
+                Some(error) => Err(PyRuntimeError::new_err(error)),
+                None => Ok(()),
+            }
+        }
+
+        fn is_background_running(&self) -> bool {
+            lock(&self.background).is_some()
+        }
+
+        // fn recv(&mut self) -> PyResult<Option<(Vec<u8>, ClientIndex)>> {
+        //     match self.inner.recv() {
+        //         Some((data, index)) => Ok(Some((data, _netcode::ClientIndex { inner: index }))),
+        //         None => Ok(None),
+        //     }
+        // }
+
+        fn recv(&self, py: Python<'_>) -> PyResult<Option<(PyObject, ClientIndex)>> {
+            match self.take_packets(py, 1, None).pop() {
+                Some((data, index)) => {
+                    let py_bytes = PyBytes::new_bound(py, &data);
+                    Ok(Some((py_bytes.into(), ClientIndex::new(index))))
+                }
+                None => Ok(None),
+            }
+        }
+
+        /// Drain up to `max_packets` queued packets in one call.
+        ///
+        /// Returns the payloads and an `array('Q')` holding the matching client
+        /// index of each payload, so no `ClientIndex` object is created per packet.
+        /// In background mode, waits up to `timeout` seconds for a first packet.
+        #[pyo3(signature = (max_packets=None, timeout=None))]
+        fn recv_many(
+            &self,
+            py: Python<'_>,
+            max_packets: Option<usize>,
+            timeout: Option<f64>,
+        ) -> PyResult<(Py<PyList>, PyObject)> {
+            let limit = max_packets.unwrap_or(usize::MAX);
+            let packets = self.take_packets(py, limit, timeout);
+            let payloads = PyList::empty_bound(py);
+            let mut indices: Vec<u64> = Vec::with_capacity(packets.len());
+            for (data, index) in packets {
+                payloads.append(PyBytes::new_bound(py, &data))?;
+                indices.push(index_value(index));
+            }
+            Ok((payloads.unbind(), u64_array(py, &indices)?))
+        }
+
+        /// Copy the next packet into `buffer`.
+        ///
+        /// Returns the packet length and the integer value of the sender's
+        /// client index.
+        fn recv_into(
+            &self,
+            py: Python<'_>,
+            buffer: PyBuffer<u8>,
+        ) -> PyResult<Option<(usize, u64)>> {
+            check_recv_buffer(&buffer)?;
+            Ok(self
+                .take_packets(py, 1, None)
+                .pop()
+                .map(|(data, index)| (write_into(py, &buffer, &data), index_value(index))))
+        }
+
+        fn send(
+            &self,
+            py: Python<'_>,
+            data: PyBuffer<u8>,
+            client_idx: &ClientIndex,
+        ) -> PyResult<()> {
+            let bytes = buffer_bytes(&data)?;
+            let bytes: &[u8] = &bytes;
+            self.send_to(py, &[(bytes, RawIndex::Index(client_idx.inner))])?;
+            Ok(())
+        }
+
+        /// Send `data` to a client on the reliable channel: it is resent until the
+        /// client acks it, and the client's `recv*` return it in order with the
+        /// other reliable messages, between the payloads of `send*`.
+        ///
+        /// Acks ride on whatever goes to the client next, and resends go out from
+        /// `update` (or the next tick, in the background) once a message waited
+        /// longer than the measured round trip allows. Up to 33 messages per
+        /// client are in flight, the rest wait for the oldest to be acked; once
+        /// 256 are waiting, this raises `RuntimeError` (in the background, the
+        /// message is dropped and counted in `reliable_dropped`).
+        fn send_reliable(
+            &self,
+            py: Python<'_>,
+            data: PyBuffer<u8>,
+            client_idx: IndexArg<'_>,
+        ) -> PyResult<()> {
+            let bytes = buffer_bytes(&data)?;
+            let bytes: &[u8] = &bytes;
+            if self.framing.reliable.is_none() {
+                return Err(PyRuntimeError::new_err(
+                    "the server was not created with reliable=True",
+                ));
+            }
+            self.framing.check(bytes, true)?;
+            let client_idx = RawIndex::from(&client_idx);
+            if let Some(outbound) = self.outbound() {
+                return outbound
+                    .send(Outbound::Reliable(bytes.to_vec(), client_idx))
+                    .map_err(|_| PyRuntimeError::new_err("background thread stopped"));
+            }
+            let now = self.clock.now();
+            self.with_inner(py, |server| {
+                let index = match client_idx {
+                    RawIndex::Index(index) => index,
+                    RawIndex::Value(_) => resolve_index(server, client_idx)?,
+                };
+                self.framing.send_reliable(server, bytes, index, now)
+            })
+        }
+
+        fn send_all(&self, py: Python<'_>, buf: PyBuffer<u8>) -> PyResult<()> {
+            let bytes = buffer_bytes(&buf)?;
+            let bytes: &[u8] = &bytes;
+            self.framing.check(bytes, false)?;
+            if let Some(outbound) = self.outbound() {
+                return outbound
+                    .send(Outbound::All(bytes.to_vec()))
+                    .map_err(|_| PyRuntimeError::new_err("background thread stopped"));
+            }
+            self.with_inner(py, |server| self.framing.send_all(server, bytes))
+                .map_err(|e| PyRuntimeError::new_err(e.to_string()))
+        }
+
+        /// Send the messages batched by `send*`, and the reliable resends and acks
+        /// that are due, now instead of at the next `update` (or tick, in the
+        /// background). Does nothing without `coalesce` or `reliable`.
+        fn flush(&self, py: Python<'_>) -> PyResult<()> {
+            if let Some(outbound) = self.outbound() {
+                return outbound
+                    .send(Outbound::Flush)
+                    .map_err(|_| PyRuntimeError::new_err("background thread stopped"));
+            }
+            let now = self.clock.now();
+            self.with_inner(py, |server| self.framing.flush(server, now));
+            Ok(())
+        }
+
+        /// Add a connected client to `group`, creating the group on first use.
+        /// Returns `False` if it was a member already.
+        ///
+        /// Groups are sets of clients to `send_group` to, like a room, a team or
+        /// a cell of the map. Disconnected clients leave all their groups.
+        fn add_to_group(
+            &self,
+            py: Python<'_>,
+            group: &str,
+            client_idx: IndexArg<'_>,
+        ) -> PyResult<bool> {
+            let client_idx = RawIndex::from(&client_idx);
+            self.with_inner(py, |server| {
+                let index = match client_idx {
+                    RawIndex::Index(index) if server.client_id(index).is_some() => index,
+                    RawIndex::Index(index) => {
+                        return Err(PyValueError::new_err(format!(
+                            "no connected client with index {}",
+                            index_value(index)
+                        )))
+                    }
+                    RawIndex::Value(_) => resolve_index(server, client_idx)?,
+                };
+                Ok(self.groups.add(group, index))
+            })
+        }
+
+        /// Take a client out of `group`; the last one out removes the group.
+        /// Returns `False` if it was not a member.
+        fn remove_from_group(&self, py: Python<'_>, group: &str, client_idx: IndexArg<'_>) -> bool {
+            let value = match &client_idx {
+                IndexArg::Index(index) => index_value(index.inner),
+                IndexArg::Value(value) => *value,
+            };
+            py.allow_threads(|| self.groups.remove(group, value))
+        }
+
+        /// The members of `group` in index order, empty if there is no such group.
+        fn group_members(&self, py: Python<'_>, group: &str) -> Vec<ClientIndex> {
+            py.allow_threads(|| self.groups.members(group))
+                .into_iter()
+                .map(ClientIndex::new)
+                .collect()
+        }
+
+        /// The names of the groups with members, sorted.
+        fn groups(&self, py: Python<'_>) -> Vec<String> {
+            py.allow_threads(|| self.groups.names())
+        }
+
+        /// Send the same payload to every member of `group` in one call, and
+        /// return how many members it went to (0 for an unknown group).
+        ///
+        /// Every client has its own key, so the payload is still encrypted once
+        /// per member; what this saves is a call per member. While the
+        /// background thread runs, the packet is queued and goes to the members
+        /// the group has when the thread sends it.
+        fn send_group(&self, py: Python<'_>, group: &str, data: PyBuffer<u8>) -> PyResult<usize> {
+            let bytes = buffer_bytes(&data)?;
+            let bytes: &[u8] = &bytes;
+            self.framing.check(bytes, false)?;
+            if let Some(outbound) = self.outbound() {
+                let members = py.allow_threads(|| self.groups.members(group).len());
+                outbound
+                    .send(Outbound::Group(bytes.to_vec(), group.to_owned()))
+                    .map_err(|_| PyRuntimeError::new_err("background thread stopped"))?;
+                return Ok(members);
+            }
+            self.with_inner(py, |server| {
+                self.groups.send(server, &self.framing, group, bytes)
+            })
+            .map_err(|e| PyRuntimeError::new_err(e.to_string()))
+        }
+
+        /// Send a different payload to each client in one call.
+        ///
+        /// `pairs` is an iterable of `(payload, client_index)`, where the payload
+        /// is any buffer-protocol object and the index is a `ClientIndex` or its
+        /// integer value. Returns the number of packets sent. Every payload and
+        /// index is checked before the first packet goes out, so a bad one sends
+        /// nothing.
+        fn send_many(&self, py: Python<'_>, pairs: &Bound<'_, PyAny>) -> PyResult<usize> {
+            let mut buffers: Vec<(PyBuffer<u8>, RawIndex)> = Vec::new();
+            for pair in pairs.iter()? {
+                let (data, client_idx): (PyBuffer<u8>, IndexArg) = pair?.extract()?;
+                buffers.push((data, RawIndex::from(&client_idx)));
+            }
+            let mut payloads = Vec::with_capacity(buffers.len());
+            for (data, index) in &buffers {
+                payloads.push((buffer_bytes(data)?, *index));
+            }
+            let packets: Vec<(&[u8], RawIndex)> = payloads
+                .iter()
+                .map(|(bytes, index)| (&**bytes, *index))
+                .collect();
+            self.send_to(py, &packets)
+        }
+
+        /// Send packets packed back to back in one buffer.
+        ///
+        /// Packet `i` spans `ends[i - 1]` (or 0) up to `ends[i]` in `data` and goes
+        /// to `client_indices[i]`; both are `array('Q')`-compatible buffers, the
+        /// same layout a `ServerPacketArena` exposes.
+        fn send_packed(
+            &self,
+            py: Python<'_>,
+            data: PyBuffer<u8>,
+            ends: PyBuffer<u64>,
+            client_indices: PyBuffer<u64>,
+        ) -> PyResult<usize> {
+            let bytes = buffer_bytes(&data)?;
+            let bytes: &[u8] = &bytes;
+            let ends = ends.to_vec(py)?;
+            let client_indices = client_indices.to_vec(py)?;
+            if ends.len() != client_indices.len() {
+                return Err(PyValueError::new_err(
+                    "ends and client_indices must have the same length",
+                ));
+            }
+
+            let mut packets: Vec<(&[u8], RawIndex)> = Vec::with_capacity(ends.len());
+            let mut start = 0;
+            for (&end, &value) in ends.iter().zip(&client_indices) {
+                let end = end as usize;
+                if end < start || end > bytes.len() {
+                    return Err(PyValueError::new_err(format!(
+                        "packet end offset {} is out of order or out of bounds",
+                        end
+                    )));
+                }
+                packets.push((&bytes[start..end], RawIndex::Value(value)));
+                start = end;
+            }
+            self.send_to(py, &packets)
+        }
+
+        /// A token for this server; `expire_seconds` and `timeout_seconds`
+        /// default to the server's `token_expire_seconds` / `token_timeout_seconds`.
+        #[pyo3(signature = (client_id, *, expire_seconds=None, timeout_seconds=None))]
+        fn token(
+            &self,
+            py: Python<'_>,
+            client_id: u64,
+            expire_seconds: Option<i32>,
+            timeout_seconds: Option<i32>,
+        ) -> PyResult<ConnectToken> {
+            let addr = self.with_inner(py, |server| server.addr());
+            let (protocol_id, private_key) = (self.protocol_id, self.private_key);
+            let lifetime = self.lifetime_or_default(expire_seconds, timeout_seconds);
+            py.allow_threads(|| {
+                let mut bytes = [0; 2048];
+                write_token(
+                    &[addr],
+                    protocol_id,
+                    client_id,
+                    private_key,
+                    lifetime,
+                    &mut bytes,
+                )?;
+                Ok(ConnectToken { bytes })
+            })
+        }
+
+        /// Tokens for many clients at once, see `generate_tokens`.
+        #[pyo3(signature = (client_ids, *, expire_seconds=None, timeout_seconds=None))]
+        fn tokens(
+            &self,
+            py: Python<'_>,
+            client_ids: Vec<u64>,
+            expire_seconds: Option<i32>,
+            timeout_seconds: Option<i32>,
+        ) -> PyResult<Py<PyBytes>> {
+            let addr = self.with_inner(py, |server| server.addr());
+            let lifetime = self.lifetime_or_default(expire_seconds, timeout_seconds);
+            tokens_bytes(
+                py,
+                &[addr],
+                self.protocol_id,
+                &client_ids,
+                self.private_key,
+                lifetime,
+            )
+        }
+
+        fn disconnect(&self, py: Python<'_>, client_idx: &ClientIndex) -> PyResult<()> {
+            let index = client_idx.inner;
+            self.with_inner(py, |server| server.disconnect(index))
+                .map_err(|e| PyRuntimeError::new_err(e.to_string()))
+        }
+
+        fn disconnect_all(&self, py: Python<'_>) -> PyResult<()> {
+            self.with_inner(py, |server| server.disconnect_all())
+                .map_err(|e| PyRuntimeError::new_err(e.to_string()))
+        }
+
+        fn address(&self, py: Python<'_>) -> PyResult<(String, u16)> {
+            let addr = self.with_inner(py, |server| server.addr());
+            Ok((addr.ip().to_string(), addr.port()))
+        }
+
+        fn addr(&self, py: Python<'_>) -> PyResult<(String, u16)> {
+            self.address(py)
+        }
+
+        fn num_connected_clients(&self, py: Python<'_>) -> usize {
+            self.with_inner(py, |server| server.num_connected_clients())
+        }
+
+        fn client_id(&self, py: Python<'_>, client_idx: &ClientIndex) -> Option<u64> {
+            let index = client_idx.inner;
+            self.with_inner(py, |server| server.client_id(index))
+        }
+
+        fn client_address(
+            &self,
+            py: Python<'_>,
+            client_idx: &ClientIndex,
+        ) -> Option<(String, u16)> {
+            let index = client_idx.inner;
+            self.with_inner(py, |server| server.client_addr(index))
+                .map(|addr| (addr.ip().to_string(), addr.port()))
+        }
+
+        fn client_addr(&self, py: Python<'_>, client_idx: &ClientIndex) -> Option<(String, u16)> {
+            self.client_address(py, client_idx)
+        }
+
+        /// Connects and disconnects since the last call, oldest first, as
+        /// `(kind, client_index, client_id, user_data)` with `kind` either
+        /// `"connect"` or `"disconnect"`.
+        fn poll_events(&self, py: Python<'_>) -> PyResult<Py<PyList>> {
+            let (events, dropped) = py.allow_threads(|| {
+                let mut resolved = lock(&self.events.resolved);
+                let events: Vec<Event> = resolved.ready.drain(..).collect();
+                (events, std::mem::take(&mut resolved.dropped))
+            });
+            if dropped > 0 {
+                log::warn!("event queue was full, dropped {} events", dropped);
+            }
+            let list = PyList::empty_bound(py);
+            for event in events {
+                let (client_id, user_data) = event.identity;
+                list.append((
+                    event.kind.as_str(),
+                    ClientIndex::new(event.index),
+                    client_id,
+                    PyBytes::new_bound(py, &user_data),
+                ))?;
+            }
+            Ok(list.unbind())
+        }
+
+        /// Look up the `ClientIndex` of a connected client by its integer value.
+        fn client_index(&self, py: Python<'_>, value: u64) -> Option<ClientIndex> {
+            let inner = value_index(value)?;
+            self.with_inner(py, |server| server.client_id(inner).is_some())
+                .then_some(ClientIndex { inner, value })
+        }
+
+        #[getter]
+        fn clients(&self, py: Python<'_>) -> Vec<ClientIndex> {
+            self.with_inner(py, |server| server.iter_clients().collect::<Vec<_>>())
+                .into_iter()
+                .map(ClientIndex::new)
                 .collect()
         }
+
+        /// The connected clients as a `ClientTable`, without a Python object per
+        /// client. The same table is returned until the set of clients changes.
+        fn client_table(&self, py: Python<'_>) -> PyResult<Py<ClientTable>> {
+            let rows = self.with_inner(py, |server| {
+                server
+                    .iter_clients()
+                    .filter_map(|idx| {
+                        Some(ClientRow {
+                            value: index_value(idx),
+                            client_id: server.client_id(idx)?,
+                            addr: server.client_addr(idx)?,
+                        })
+                    })
+                    .collect::<Vec<_>>()
+            });
+            let mut cache = lock(&self.client_table);
+            if let Some((cached_rows, table)) = cache.as_ref() {
+                if *cached_rows == rows {
+                    return Ok(table.clone_ref(py));
+                }
+            }
+            let table = Py::new(py, ClientTable::new(py, &rows)?)?;
+            *cache = Some((rows, table.clone_ref(py)));
+            Ok(table)
+        }
+
+        /// Every counter in one dict, read without taking the server's lock.
+        ///
+        /// Packets and bytes count everything the socket sent and received,
+        /// handshakes and keep-alives included. `connection_requests_rejected`
+        /// counts the requests dropped before decryption, and one
+        /// `connection_requests_rejected_<reason>` per reason (see
+        /// `AdmissionControl`). `payloads_rejected` are payload
+        /// packets `netcode` discarded unread: failed decryption, replays or an
+        /// unknown sender, which it does not tell apart. `update_seconds` is a
+        /// histogram of how long `update` took. With `reliable`, the `reliable_*`
+        /// counters cover every client's channel, see `Client.metrics`.
+        fn metrics(&self, py: Python<'_>) -> PyResult<Py<PyDict>> {
+            let metrics = &self.metrics;
+            let dict = traffic_dict(py, metrics)?;
+            for (name, counter) in [
+                ("connection_requests", &metrics.connection_requests),
+                ("payload_packets_in", &metrics.payload_packets_in),
+                ("payloads_received", &metrics.payloads_received),
+                ("payloads_dropped", &metrics.payloads_dropped),
+            ] {
+                dict.set_item(name, counter.load(Ordering::Relaxed))?;
+            }
+            let admission = &self.limit.admission;
+            dict.set_item("connection_requests_rejected", admission.rejected())?;
+            for reason in Reason::ALL {
+                dict.set_item(
+                    format!("connection_requests_rejected_{}", reason.as_str()),
+                    admission.rejected_for(reason),
+                )?;
+            }
+            dict.set_item("payloads_rejected", metrics.payloads_rejected())?;
+            dict.set_item("connected_clients", metrics.num_peers())?;
+            if let Some(reliable) = &self.framing.reliable {
+                reliable_items(py, &dict, &reliable.stats)?;
+            }
+            Ok(dict.unbind())
+        }
+
+        /// Record where each `update` spends its time, for the last `capacity`
+        /// updates; see `profile`. Restarting forgets what was recorded.
+        ///
+        /// `netcode` updates in one call, so the phases are inferred from the
+        /// socket calls it makes: `socket_recv` and `socket_send` time the socket,
+        /// a packet type (`connection_request`, `payload`, ...) is the time spent
+        /// handling a packet of that type after reading it, `housekeeping` what
+        /// follows the last read (keep-alives and timeouts) and `bookkeeping` the
+        /// wrapper's own work after the update. Costs nothing while stopped.
+        #[pyo3(signature = (capacity=1024))]
+        fn start_profiling(&self, capacity: usize) -> PyResult<()> {
+            if capacity == 0 {
+                return Err(PyValueError::new_err("capacity must be at least 1"));
+            }
+            self.metrics.profiler.start(capacity);
+            Ok(())
+        }
+
+        /// Stop recording, keeping the recorded updates readable.
+        fn stop_profiling(&self) {
+            self.metrics.profiler.stop();
+        }
+
+        /// One row per recorded update, oldest first, one `array('d')` per
+        /// column: `time` (passed to `update`), `start` (seconds since profiling
+        /// started), `duration`, and the seconds spent in each phase of
+        /// `PROFILE_PHASES`, keyed by its name.
+        fn profile(&self, py: Python<'_>) -> PyResult<Py<PyDict>> {
+            let frames = py.allow_threads(|| self.metrics.profiler.frames());
+            let column = |value: &dyn Fn(&profile::Frame) -> f64| -> Vec<f64> {
+                frames.iter().map(value).collect()
+            };
+            let dict = PyDict::new_bound(py);
+            dict.set_item("time", f64_array(py, &column(&|frame| frame.time))?)?;
+            dict.set_item(
+                "start",
+                f64_array(py, &column(&|frame| frame.start.as_secs_f64()))?,
+            )?;
+            dict.set_item(
+                "duration",
+                f64_array(py, &column(&|frame| frame.duration.as_secs_f64()))?,
+            )?;
+            for phase in Phase::ALL {
+                let totals = column(&|frame| frame.totals[phase as usize].as_secs_f64());
+                dict.set_item(phase.as_str(), f64_array(py, &totals)?)?;
+            }
+            Ok(dict.unbind())
+        }
+
+        /// Every phase span of the recorded updates, one array per column:
+        /// `frame` (the row in `profile`) as `array('Q')`, `phase` (an index
+        /// into `PROFILE_PHASES`) as `array('B')`, and `start` (seconds since
+        /// profiling started) and `duration` as `array('d')`. Only the first
+        /// 4096 spans of an update are kept; its `profile` totals are complete.
+        fn profile_spans(&self, py: Python<'_>) -> PyResult<Py<PyDict>> {
+            let frames = py.allow_threads(|| self.metrics.profiler.frames());
+            let (mut rows, mut phases, mut starts, mut durations) =
+                (Vec::new(), Vec::new(), Vec::new(), Vec::new());
+            for (row, frame) in frames.iter().enumerate() {
+                for span in &frame.spans {
+                    rows.push(row as u64);
+                    phases.push(span.phase as u8);
+                    starts.push(span.start.as_secs_f64());
+                    durations.push(span.duration.as_secs_f64());
+                }
+            }
+            let dict = PyDict::new_bound(py);
+            dict.set_item("frame", u64_array(py, &rows)?)?;
+            dict.set_item("phase", typed_array(py, "B", &phases)?)?;
+            dict.set_item("start", f64_array(py, &starts)?)?;
+            dict.set_item("duration", f64_array(py, &durations)?)?;
+            Ok(dict.unbind())
+        }
+
+        /// Per-client counters of the connected clients, one array per column:
+        /// `indices`, `packets_in`, `bytes_in`, `packets_out` and `bytes_out` as
+        /// `array('Q')`, and `last_receive_age`, the seconds since the client's
+        /// last packet on the clock passed to `update`, as `array('d')` (NaN if
+        /// nothing arrived since it connected).
+        ///
+        /// With `reliable`, also each client's channel: `reliable_rtt`, the
+        /// smoothed round trip in seconds (NaN until a message was acked), as
+        /// `array('d')`, and `reliable_pending`, `reliable_sent`,
+        /// `reliable_resent` and `reliable_delivered` as `array('Q')`.
+        fn client_metrics(&self, py: Python<'_>) -> PyResult<Py<PyDict>> {
+            let metrics = &self.metrics;
+            let reliable = self.framing.reliable.as_ref();
+            let (peers, channels) = self.with_inner(py, |server| {
+                let peers = server
+                    .iter_clients()
+                    .filter_map(|index| {
+                        let peer = metrics.peer(&server.client_addr(index)?)?;
+                        Some((index_value(index), peer))
+                    })
+                    .collect::<Vec<_>>();
+                let channels = reliable.map(|reliable| {
+                    let channels = lock(&reliable.channels);
+                    peers
+                        .iter()
+                        .map(|(value, _)| {
+                            channels
+                                .get(value)
+                                .map(|(_, channel)| ChannelRow::new(channel))
+                                .unwrap_or_default()
+                        })
+                        .collect::<Vec<_>>()
+                });
+                (peers, channels)
+            });
+            let mut columns: [Vec<u64>; 5] = Default::default();
+            for (value, peer) in &peers {
+                let row = [
+                    *value,
+                    peer.packets_in,
+                    peer.bytes_in,
+                    peer.packets_out,
+                    peer.bytes_out,
+                ];
+                for (column, cell) in columns.iter_mut().zip(row) {
+                    column.push(cell);
+                }
+            }
+            let dict = PyDict::new_bound(py);
+            let names = [
+                "indices",
+                "packets_in",
+                "bytes_in",
+                "packets_out",
+                "bytes_out",
+            ];
+            for (name, column) in names.into_iter().zip(&columns) {
+                dict.set_item(name, u64_array(py, column)?)?;
+            }
+            let now = metrics.now();
+            let ages: Vec<f64> = peers
+                .iter()
+                .map(|(_, peer)| peer.last_recv.map_or(f64::NAN, |at| now - at))
+                .collect();
+            dict.set_item("last_receive_age", f64_array(py, &ages)?)?;
+            if let Some(channels) = channels {
+                let rtts: Vec<f64> = channels.iter().map(|row| row.rtt).collect();
+                dict.set_item("reliable_rtt", f64_array(py, &rtts)?)?;
+                let columns: [(&str, fn(&ChannelRow) -> u64); 4] = [
+                    ("reliable_pending", |row| row.pending),
+                    ("reliable_sent", |row| row.sent),
+                    ("reliable_resent", |row| row.resent),
+                    ("reliable_delivered", |row| row.delivered),
+                ];
+                for (name, cell) in columns {
+                    let column: Vec<u64> = channels.iter().map(cell).collect();
+                    dict.set_item(name, u64_array(py, &column)?)?;
+                }
+            }
+            Ok(dict.unbind())
+        }
     }
 }
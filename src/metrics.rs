@@ -0,0 +1,283 @@
+//! Counters and histograms for a server or client, and a transceiver wrapper
+//! that counts every packet crossing it.
+//!
+//! Everything a packet touches is a relaxed atomic, so counting costs a few
+//! uncontended adds. The per-client table is read-mostly: packets only take its
+//! read lock to find their client's counters, and it is written when the
+//! connected clients change.
+//!
+//! The wrapper also marks socket calls for the `update` profiler, see `profile`.
+
+use crate::conditioner::Clock;
+use crate::profile::{Phase, Profiler};
+use ::netcode::Transceiver;
+use std::collections::HashMap;
+use std::io;
+use std::net::SocketAddr;
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::sync::{Arc, PoisonError, RwLock, RwLockReadGuard};
+use std::time::Duration;
+
+pub const CONNECTION_REQUEST: u8 = 0;
+pub const CONNECTION_RESPONSE: u8 = 3;
+pub const KEEP_ALIVE: u8 = 4;
+pub const PAYLOAD: u8 = 5;
+pub const DISCONNECT: u8 = 6;
+
+/// The packet type, the low nibble of a packet's prefix byte.
+pub fn packet_type(packet: &[u8]) -> Option<u8> {
+    packet.first().map(|prefix| prefix & 0x0f)
+}
+
+/// Upper bounds of the `update` duration buckets, in seconds; anything slower
+/// lands in a last, unbounded bucket.
+pub const UPDATE_BUCKETS: [f64; 12] = [
+    0.000_05, 0.000_1, 0.000_25, 0.000_5, 0.001, 0.002_5, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25,
+];
+
+fn read<T>(lock: &RwLock<T>) -> RwLockReadGuard<'_, T> {
+    lock.read().unwrap_or_else(PoisonError::into_inner)
+}
+
+/// A fixed-bucket histogram of durations.
+pub struct Histogram {
+    bounds: &'static [f64],
+    counts: Vec<AtomicU64>,
+    sum_nanos: AtomicU64,
+}
+
+impl Histogram {
+    pub fn new(bounds: &'static [f64]) -> Self {
+        Self {
+            bounds,
+            counts: (0..=bounds.len()).map(|_| AtomicU64::new(0)).collect(),
+            sum_nanos: AtomicU64::new(0),
+        }
+    }
+
+    pub fn observe(&self, duration: Duration) {
+        let seconds = duration.as_secs_f64();
+        let bucket = self.bounds.partition_point(|&bound| bound < seconds);
+        self.counts[bucket].fetch_add(1, Ordering::Relaxed);
+        self.sum_nanos
+            .fetch_add(duration.as_nanos() as u64, Ordering::Relaxed);
+    }
+
+    pub fn bounds(&self) -> &'static [f64] {
+        self.bounds
+    }
+
+    /// The count of each bucket (not cumulative), the last one unbounded.
+    pub fn counts(&self) -> Vec<u64> {
+        self.counts
+            .iter()
+            .map(|count| count.load(Ordering::Relaxed))
+            .collect()
+    }
+
+    pub fn sum(&self) -> f64 {
+        self.sum_nanos.load(Ordering::Relaxed) as f64 / 1e9
+    }
+}
+
+/// Traffic to and from one peer.
+#[derive(Clone, Copy, Default)]
+pub struct Peer {
+    pub packets_in: u64,
+    pub bytes_in: u64,
+    pub packets_out: u64,
+    pub bytes_out: u64,
+    /// Endpoint time of the last packet from this peer, if any.
+    pub last_recv: Option<f64>,
+}
+
+/// The counters behind a `Peer`, bumped without a lock.
+struct PeerCounters {
+    packets_in: AtomicU64,
+    bytes_in: AtomicU64,
+    packets_out: AtomicU64,
+    bytes_out: AtomicU64,
+    /// The bits of `Peer::last_recv`, `NEVER` until a packet arrives.
+    last_recv: AtomicU64,
+}
+
+/// No endpoint time has these bits, they are a NaN.
+const NEVER: u64 = u64::MAX;
+
+impl Default for PeerCounters {
+    fn default() -> Self {
+        Self {
+            packets_in: AtomicU64::new(0),
+            bytes_in: AtomicU64::new(0),
+            packets_out: AtomicU64::new(0),
+            bytes_out: AtomicU64::new(0),
+            last_recv: AtomicU64::new(NEVER),
+        }
+    }
+}
+
+impl PeerCounters {
+    fn get(&self) -> Peer {
+        let last_recv = self.last_recv.load(Ordering::Relaxed);
+        Peer {
+            packets_in: self.packets_in.load(Ordering::Relaxed),
+            bytes_in: self.bytes_in.load(Ordering::Relaxed),
+            packets_out: self.packets_out.load(Ordering::Relaxed),
+            bytes_out: self.bytes_out.load(Ordering::Relaxed),
+            last_recv: (last_recv != NEVER).then(|| f64::from_bits(last_recv)),
+        }
+    }
+}
+
+/// Everything counted for one server or client.
+pub struct Metrics {
+    pub packets_in: AtomicU64,
+    pub bytes_in: AtomicU64,
+    pub packets_out: AtomicU64,
+    pub bytes_out: AtomicU64,
+    /// Connection requests that reached the endpoint, admitted or not.
+    pub connection_requests: AtomicU64,
+    /// Payload packets that reached the endpoint, before `netcode` decrypts them.
+    pub payload_packets_in: AtomicU64,
+    /// Payloads `netcode` accepted and handed out.
+    pub payloads_received: AtomicU64,
+    /// Received payloads dropped because the queue `recv*` drain was full.
+    pub payloads_dropped: AtomicU64,
+    pub update_seconds: Histogram,
+    pub profiler: Profiler,
+    clock: Arc<Clock>,
+    peers: RwLock<HashMap<SocketAddr, PeerCounters>>,
+}
+
+impl Metrics {
+    pub fn new(clock: Arc<Clock>) -> Self {
+        Self {
+            packets_in: AtomicU64::new(0),
+            bytes_in: AtomicU64::new(0),
+            packets_out: AtomicU64::new(0),
+            bytes_out: AtomicU64::new(0),
+            connection_requests: AtomicU64::new(0),
+            payload_packets_in: AtomicU64::new(0),
+            payloads_received: AtomicU64::new(0),
+            payloads_dropped: AtomicU64::new(0),
+            update_seconds: Histogram::new(&UPDATE_BUCKETS),
+            profiler: Profiler::default(),
+            clock,
+            peers: RwLock::new(HashMap::new()),
+        }
+    }
+
+    /// Payload packets `netcode` did not accept: failed decryption, replays
+    /// and packets from addresses that are not connected.
+    pub fn payloads_rejected(&self) -> u64 {
+        self.payload_packets_in
+            .load(Ordering::Relaxed)
+            .saturating_sub(self.payloads_received.load(Ordering::Relaxed))
+    }
+
+    pub fn now(&self) -> f64 {
+        self.clock.now()
+    }
+
+    pub fn num_peers(&self) -> usize {
+        read(&self.peers).len()
+    }
+
+    /// Track exactly `addrs`, keeping the counts of peers already tracked.
+    pub fn set_peers(&self, addrs: impl IntoIterator<Item = SocketAddr>) {
+        let mut peers = self.peers.write().unwrap_or_else(PoisonError::into_inner);
+        let mut old = std::mem::take(&mut *peers);
+        for addr in addrs {
+            let counters = old.remove(&addr).unwrap_or_default();
+            peers.insert(addr, counters);
+        }
+    }
+
+    pub fn peer(&self, addr: &SocketAddr) -> Option<Peer> {
+        read(&self.peers).get(addr).map(PeerCounters::get)
+    }
+
+    fn count_in(&self, packet: &[u8], addr: SocketAddr) {
+        self.packets_in.fetch_add(1, Ordering::Relaxed);
+        self.bytes_in
+            .fetch_add(packet.len() as u64, Ordering::Relaxed);
+        match packet_type(packet) {
+            Some(CONNECTION_REQUEST) => {
+                self.connection_requests.fetch_add(1, Ordering::Relaxed);
+            }
+            Some(PAYLOAD) => {
+                self.payload_packets_in.fetch_add(1, Ordering::Relaxed);
+            }
+            _ => {}
+        }
+        if let Some(peer) = read(&self.peers).get(&addr) {
+            peer.packets_in.fetch_add(1, Ordering::Relaxed);
+            peer.bytes_in
+                .fetch_add(packet.len() as u64, Ordering::Relaxed);
+            peer.last_recv
+                .store(self.clock.now().to_bits(), Ordering::Relaxed);
+        }
+    }
+
+    fn count_out(&self, len: usize, addr: SocketAddr) {
+        self.packets_out.fetch_add(1, Ordering::Relaxed);
+        self.bytes_out.fetch_add(len as u64, Ordering::Relaxed);
+        if let Some(peer) = read(&self.peers).get(&addr) {
+            peer.packets_out.fetch_add(1, Ordering::Relaxed);
+            peer.bytes_out.fetch_add(len as u64, Ordering::Relaxed);
+        }
+    }
+}
+
+/// Wraps a transceiver and counts what goes through it into `metrics`.
+pub struct Metered<T> {
+    inner: T,
+    metrics: Arc<Metrics>,
+}
+
+impl<T: Transceiver<IntoError = io::Error>> Metered<T> {
+    pub fn new(inner: T, metrics: Arc<Metrics>) -> Self {
+        Self { inner, metrics }
+    }
+
+    pub fn inner(&self) -> &T {
+        &self.inner
+    }
+}
+
+impl<T: Transceiver<IntoError = io::Error>> Transceiver for Metered<T> {
+    type IntoError = io::Error;
+
+    fn addr(&self) -> SocketAddr {
+        self.inner.addr()
+    }
+
+    fn recv(&self, buf: &mut [u8]) -> io::Result<Option<(usize, SocketAddr)>> {
+        let profiler = &self.metrics.profiler;
+        profiler.switch(Phase::SocketRecv);
+        let received = self.inner.recv(buf)?;
+        match received {
+            Some((len, addr)) => {
+                self.metrics.count_in(&buf[..len], addr);
+                // what happens until the next call is handling this packet
+                profiler.switch(Phase::after_packet(&buf[..len]));
+            }
+            None => {
+                profiler.switch(Phase::Housekeeping);
+            }
+        }
+        Ok(received)
+    }
+
+    fn send(&self, buf: &[u8], addr: SocketAddr) -> io::Result<usize> {
+        let profiler = &self.metrics.profiler;
+        let previous = profiler.switch(Phase::SocketSend);
+        let sent = self.inner.send(buf, addr);
+        if let Some(previous) = previous {
+            profiler.switch(previous);
+        }
+        let sent = sent?;
+        self.metrics.count_out(sent, addr);
+        Ok(sent)
+    }
+}
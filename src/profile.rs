@@ -0,0 +1,222 @@
+//! Opt-in timing of where `update` spends its time.
+//!
+//! `netcode` updates in one call, so phases are told apart from the outside:
+//! the transceiver marks time spent reading and writing the socket, the type of
+//! the packet just read names the time until the next socket call (decrypting
+//! and handling it), and what follows the last read of the tick is housekeeping
+//! (keep-alives and timeouts). Disabled, every mark is one relaxed load.
+
+use crate::metrics::{
+    packet_type, CONNECTION_REQUEST, CONNECTION_RESPONSE, DISCONNECT, KEEP_ALIVE, PAYLOAD,
+};
+use std::collections::VecDeque;
+use std::sync::atomic::{AtomicBool, Ordering};
+use std::sync::{Mutex, MutexGuard, PoisonError};
+use std::time::{Duration, Instant};
+
+/// Spans beyond this many per update only count towards the phase totals.
+const MAX_SPANS_PER_FRAME: usize = 4096;
+
+#[derive(Clone, Copy, PartialEq, Eq, Debug)]
+pub enum Phase {
+    SocketRecv,
+    SocketSend,
+    ConnectionRequest,
+    ConnectionResponse,
+    KeepAlive,
+    Payload,
+    Disconnect,
+    OtherPacket,
+    Housekeeping,
+    Bookkeeping,
+}
+
+impl Phase {
+    pub const ALL: [Phase; 10] = [
+        Self::SocketRecv,
+        Self::SocketSend,
+        Self::ConnectionRequest,
+        Self::ConnectionResponse,
+        Self::KeepAlive,
+        Self::Payload,
+        Self::Disconnect,
+        Self::OtherPacket,
+        Self::Housekeeping,
+        Self::Bookkeeping,
+    ];
+
+    pub fn as_str(self) -> &'static str {
+        match self {
+            Self::SocketRecv => "socket_recv",
+            Self::SocketSend => "socket_send",
+            Self::ConnectionRequest => "connection_request",
+            Self::ConnectionResponse => "connection_response",
+            Self::KeepAlive => "keep_alive",
+            Self::Payload => "payload",
+            Self::Disconnect => "disconnect",
+            Self::OtherPacket => "other_packet",
+            Self::Housekeeping => "housekeeping",
+            Self::Bookkeeping => "bookkeeping",
+        }
+    }
+
+    /// The phase of handling a packet that was just received.
+    pub fn after_packet(packet: &[u8]) -> Self {
+        match packet_type(packet) {
+            Some(CONNECTION_REQUEST) => Self::ConnectionRequest,
+            Some(CONNECTION_RESPONSE) => Self::ConnectionResponse,
+            Some(KEEP_ALIVE) => Self::KeepAlive,
+            Some(PAYLOAD) => Self::Payload,
+            Some(DISCONNECT) => Self::Disconnect,
+            _ => Self::OtherPacket,
+        }
+    }
+}
+
+#[derive(Clone, Copy)]
+pub struct Span {
+    pub phase: Phase,
+    /// Since profiling started.
+    pub start: Duration,
+    pub duration: Duration,
+}
+
+/// One `update`.
+#[derive(Clone)]
+pub struct Frame {
+    /// The time passed to `update`.
+    pub time: f64,
+    /// Since profiling started.
+    pub start: Duration,
+    pub duration: Duration,
+    pub totals: [Duration; Phase::ALL.len()],
+    pub spans: Vec<Span>,
+}
+
+struct Open {
+    frame: Frame,
+    phase: Phase,
+    since: Instant,
+}
+
+struct Recording {
+    origin: Instant,
+    capacity: usize,
+    frames: VecDeque<Frame>,
+    open: Option<Open>,
+}
+
+impl Recording {
+    fn close_span(&mut self, now: Instant) -> Option<&mut Open> {
+        let origin = self.origin;
+        let open = self.open.as_mut()?;
+        let duration = now - open.since;
+        open.frame.totals[open.phase as usize] += duration;
+        if open.frame.spans.len() < MAX_SPANS_PER_FRAME {
+            open.frame.spans.push(Span {
+                phase: open.phase,
+                start: open.since - origin,
+                duration,
+            });
+        }
+        open.since = now;
+        Some(open)
+    }
+}
+
+/// Per-phase timings of the last `capacity` updates, in a ring buffer.
+pub struct Profiler {
+    enabled: AtomicBool,
+    recording: Mutex<Recording>,
+}
+
+impl Default for Profiler {
+    fn default() -> Self {
+        Self {
+            enabled: AtomicBool::new(false),
+            recording: Mutex::new(Recording {
+                origin: Instant::now(),
+                capacity: 0,
+                frames: VecDeque::new(),
+                open: None,
+            }),
+        }
+    }
+}
+
+impl Profiler {
+    fn recording(&self) -> MutexGuard<'_, Recording> {
+        self.recording
+            .lock()
+            .unwrap_or_else(PoisonError::into_inner)
+    }
+
+    /// Start recording, forgetting earlier frames.
+    pub fn start(&self, capacity: usize) {
+        let mut recording = self.recording();
+        recording.origin = Instant::now();
+        recording.capacity = capacity;
+        recording.frames = VecDeque::with_capacity(capacity);
+        recording.open = None;
+        self.enabled.store(true, Ordering::Relaxed);
+    }
+
+    /// Stop recording, keeping the frames recorded so far.
+    pub fn stop(&self) {
+        self.enabled.store(false, Ordering::Relaxed);
+        self.recording().open = None;
+    }
+
+    pub fn begin(&self, time: f64) {
+        if !self.enabled.load(Ordering::Relaxed) {
+            return;
+        }
+        let now = Instant::now();
+        let mut recording = self.recording();
+        let start = now - recording.origin;
+        recording.open = Some(Open {
+            frame: Frame {
+                time,
+                start,
+                duration: Duration::ZERO,
+                totals: [Duration::ZERO; Phase::ALL.len()],
+                spans: Vec::new(),
+            },
+            phase: Phase::Housekeeping,
+            since: now,
+        });
+    }
+
+    /// Enter `phase`, returning the phase the update was in, if one is open.
+    pub fn switch(&self, phase: Phase) -> Option<Phase> {
+        if !self.enabled.load(Ordering::Relaxed) {
+            return None;
+        }
+        let mut recording = self.recording();
+        let open = recording.close_span(Instant::now())?;
+        Some(std::mem::replace(&mut open.phase, phase))
+    }
+
+    pub fn end(&self) {
+        if !self.enabled.load(Ordering::Relaxed) {
+            return;
+        }
+        let now = Instant::now();
+        let mut recording = self.recording();
+        recording.close_span(now);
+        let Some(open) = recording.open.take() else {
+            return;
+        };
+        let mut frame = open.frame;
+        frame.duration = now - recording.origin - frame.start;
+        if recording.frames.len() == recording.capacity {
+            recording.frames.pop_front();
+        }
+        recording.frames.push_back(frame);
+    }
+
+    /// The recorded frames, oldest first.
+    pub fn frames(&self) -> Vec<Frame> {
+        self.recording().frames.iter().cloned().collect()
+    }
+}
@@ -0,0 +1,363 @@
+//! A reliable, ordered channel multiplexed with unreliable payloads over the
+//! same `netcode` packets.
+//!
+//! Every payload starts with a tag byte. Reliable messages carry a 16-bit
+//! sequence number and are resent until acked, on a timer derived from the
+//! measured round-trip time. Acks (the next sequence number expected, the newest
+//! one received and a bitfield of the 32 before it) ride on whatever goes to the
+//! peer next, or go out on their own at the next poll.
+
+use crate::metrics::Histogram;
+use std::collections::VecDeque;
+use std::sync::atomic::{AtomicU64, Ordering};
+use std::time::Duration;
+
+const UNRELIABLE: u8 = 0;
+// an unreliable payload behind an ack
+const UNRELIABLE_ACKED: u8 = 1;
+const RELIABLE: u8 = 2;
+const ACK: u8 = 3;
+
+const ACK_BYTES: usize = 8;
+/// Tag, sequence number and ack in front of a reliable message.
+pub const RELIABLE_HEADER_BYTES: usize = 1 + 2 + ACK_BYTES;
+/// The tag in front of an unreliable payload.
+pub const UNRELIABLE_HEADER_BYTES: usize = 1;
+
+/// Reliable messages queued for a peer and not acked yet.
+pub const MAX_PENDING: usize = 256;
+// messages sent but not acked, past the oldest one; all of them can be acked
+// by the bitfield, however many holes there are
+const IN_FLIGHT: u16 = 33;
+// out-of-order messages buffered by the receiver, a power of two so slots
+// survive the sequence numbers wrapping
+const SLOTS: usize = 64;
+
+const INITIAL_RTO: f64 = 0.2;
+const MIN_RTO: f64 = 0.02;
+const MAX_RTO: f64 = 2.0;
+
+/// Upper bounds of the ack latency buckets, in seconds.
+pub const LATENCY_BUCKETS: [f64; 12] = [
+    0.005, 0.01, 0.02, 0.035, 0.05, 0.075, 0.1, 0.15, 0.25, 0.5, 1.0, 2.0,
+];
+
+/// Counters for every channel of an endpoint.
+pub struct ReliableStats {
+    pub sent: AtomicU64,
+    pub resent: AtomicU64,
+    pub acked: AtomicU64,
+    pub delivered: AtomicU64,
+    pub duplicates: AtomicU64,
+    /// Messages refused because `MAX_PENDING` were not acked yet.
+    pub dropped: AtomicU64,
+    /// From queueing a message to its ack.
+    pub ack_seconds: Histogram,
+}
+
+impl Default for ReliableStats {
+    fn default() -> Self {
+        Self {
+            sent: AtomicU64::new(0),
+            resent: AtomicU64::new(0),
+            acked: AtomicU64::new(0),
+            delivered: AtomicU64::new(0),
+            duplicates: AtomicU64::new(0),
+            dropped: AtomicU64::new(0),
+            ack_seconds: Histogram::new(&LATENCY_BUCKETS),
+        }
+    }
+}
+
+fn count(counter: &AtomicU64, n: u64) {
+    counter.fetch_add(n, Ordering::Relaxed);
+}
+
+/// Whether sequence number `a` comes after `b`, allowing for wrapping.
+fn newer(a: u16, b: u16) -> bool {
+    a != b && a.wrapping_sub(b) < 0x8000
+}
+
+/// `MAX_PENDING` messages to the peer are not acked yet.
+#[derive(Debug)]
+pub struct QueueFull;
+
+struct Pending {
+    sequence: u16,
+    data: Vec<u8>,
+    queued: f64,
+    last_sent: f64,
+    sends: u32,
+}
+
+/// One peer's end of the channel.
+pub struct Channel {
+    // sending
+    next_sequence: u16,
+    pending: VecDeque<Pending>,
+    srtt: Option<f64>,
+    rttvar: f64,
+    sent: u64,
+    resent: u64,
+    // receiving
+    next_expected: u16,
+    newest: u16,
+    // bit `i` set when `newest - 1 - i` arrived
+    received_bits: u32,
+    buffered: Vec<Option<Vec<u8>>>,
+    ack_due: bool,
+    delivered: u64,
+}
+
+impl Default for Channel {
+    fn default() -> Self {
+        Self {
+            next_sequence: 0,
+            pending: VecDeque::new(),
+            srtt: None,
+            rttvar: 0.0,
+            sent: 0,
+            resent: 0,
+            next_expected: 0,
+            // everything before `next_expected` counts as received
+            newest: u16::MAX,
+            received_bits: 0,
+            buffered: (0..SLOTS).map(|_| None).collect(),
+            ack_due: false,
+            delivered: 0,
+        }
+    }
+}
+
+impl Channel {
+    /// The smoothed round-trip time, once a message was acked.
+    pub fn rtt(&self) -> Option<f64> {
+        self.srtt
+    }
+
+    /// How long a message waits for its ack before it is resent.
+    pub fn rto(&self) -> f64 {
+        match self.srtt {
+            Some(srtt) => (srtt + 4.0 * self.rttvar).clamp(MIN_RTO, MAX_RTO),
+            None => INITIAL_RTO,
+        }
+    }
+
+    /// Reliable messages queued or waiting for their ack.
+    pub fn pending(&self) -> usize {
+        self.pending.len()
+    }
+
+    /// Messages sent and resent on this channel, and received in order.
+    pub fn counts(&self) -> (u64, u64, u64) {
+        (self.sent, self.resent, self.delivered)
+    }
+
+    /// Frame an unreliable payload, with an ack in front if one is due and fits.
+    pub fn unreliable(&mut self, data: &[u8], max_packet: usize) -> Vec<u8> {
+        let mut packet = Vec::with_capacity(1 + ACK_BYTES + data.len());
+        if self.ack_due && 1 + ACK_BYTES + data.len() <= max_packet {
+            packet.push(UNRELIABLE_ACKED);
+            self.write_ack(&mut packet);
+        } else {
+            packet.push(UNRELIABLE);
+        }
+        packet.extend_from_slice(data);
+        packet
+    }
+
+    /// Queue a reliable message, and frame its first send unless too many
+    /// messages are in flight already; it then goes out from `poll`.
+    pub fn send(
+        &mut self,
+        data: &[u8],
+        now: f64,
+        stats: &ReliableStats,
+    ) -> Result<Option<Vec<u8>>, QueueFull> {
+        if self.pending.len() >= MAX_PENDING {
+            count(&stats.dropped, 1);
+            return Err(QueueFull);
+        }
+        let sequence = self.next_sequence;
+        self.next_sequence = sequence.wrapping_add(1);
+        self.pending.push_back(Pending {
+            sequence,
+            data: data.to_vec(),
+            queued: now,
+            last_sent: now,
+            sends: 0,
+        });
+        self.sent += 1;
+        count(&stats.sent, 1);
+        let i = self.pending.len() - 1;
+        Ok(self.in_flight(i).then(|| self.send_pending(i, now)))
+    }
+
+    /// Frame the sends and resends that are due, and an ack if nothing else
+    /// carried it.
+    pub fn poll(&mut self, now: f64, stats: &ReliableStats, mut transmit: impl FnMut(Vec<u8>)) {
+        let rto = self.rto();
+        for i in 0..self.pending.len() {
+            if !self.in_flight(i) {
+                break;
+            }
+            let pending = &self.pending[i];
+            if pending.sends > 0 {
+                // back off exponentially while the acks do not come
+                let backoff = f64::from(1u32 << (pending.sends - 1).min(6));
+                if now - pending.last_sent < (rto * backoff).min(MAX_RTO) {
+                    continue;
+                }
+                self.resent += 1;
+                count(&stats.resent, 1);
+            }
+            transmit(self.send_pending(i, now));
+        }
+        if self.ack_due {
+            let mut packet = Vec::with_capacity(1 + ACK_BYTES);
+            packet.push(ACK);
+            self.write_ack(&mut packet);
+            transmit(packet);
+        }
+    }
+
+    /// Handle a packet from the peer and pass on the payloads it makes
+    /// available, in order for reliable ones. Returns false if it is not framed
+    /// for this channel.
+    pub fn receive(
+        &mut self,
+        packet: &[u8],
+        now: f64,
+        stats: &ReliableStats,
+        mut deliver: impl FnMut(Vec<u8>),
+    ) -> bool {
+        let Some((&tag, rest)) = packet.split_first() else {
+            return false;
+        };
+        match tag {
+            UNRELIABLE => deliver(rest.to_vec()),
+            UNRELIABLE_ACKED | ACK if rest.len() >= ACK_BYTES => {
+                self.read_ack(&rest[..ACK_BYTES], now, stats);
+                if tag == UNRELIABLE_ACKED {
+                    deliver(rest[ACK_BYTES..].to_vec());
+                }
+            }
+            RELIABLE if rest.len() >= 2 + ACK_BYTES => {
+                let sequence = u16::from_le_bytes([rest[0], rest[1]]);
+                self.read_ack(&rest[2..2 + ACK_BYTES], now, stats);
+                self.receive_reliable(sequence, &rest[2 + ACK_BYTES..], stats, &mut deliver);
+            }
+            _ => return false,
+        }
+        true
+    }
+
+    fn receive_reliable(
+        &mut self,
+        sequence: u16,
+        data: &[u8],
+        stats: &ReliableStats,
+        deliver: &mut impl FnMut(Vec<u8>),
+    ) {
+        // acked or not, a message that arrives again means the ack was lost
+        self.ack_due = true;
+        let slot = sequence as usize % SLOTS;
+        if sequence.wrapping_sub(self.next_expected) >= IN_FLIGHT || self.buffered[slot].is_some() {
+            count(&stats.duplicates, 1);
+            return;
+        }
+        self.buffered[slot] = Some(data.to_vec());
+        if newer(sequence, self.newest) {
+            let shift = u32::from(sequence.wrapping_sub(self.newest));
+            self.received_bits = match shift {
+                1..=31 => (self.received_bits << shift) | (1 << (shift - 1)),
+                32 => 1 << 31,
+                _ => 0,
+            };
+            self.newest = sequence;
+        } else {
+            let behind = u32::from(self.newest.wrapping_sub(sequence));
+            if (1..=32).contains(&behind) {
+                self.received_bits |= 1 << (behind - 1);
+            }
+        }
+        while let Some(data) = self.buffered[self.next_expected as usize % SLOTS].take() {
+            self.next_expected = self.next_expected.wrapping_add(1);
+            self.delivered += 1;
+            count(&stats.delivered, 1);
+            deliver(data);
+        }
+    }
+
+    fn in_flight(&self, i: usize) -> bool {
+        let oldest = self.pending[0].sequence;
+        self.pending[i].sequence.wrapping_sub(oldest) < IN_FLIGHT
+    }
+
+    fn send_pending(&mut self, i: usize, now: f64) -> Vec<u8> {
+        let pending = &mut self.pending[i];
+        pending.sends += 1;
+        pending.last_sent = now;
+        let pending = &self.pending[i];
+        let mut packet = Vec::with_capacity(RELIABLE_HEADER_BYTES + pending.data.len());
+        packet.push(RELIABLE);
+        packet.extend_from_slice(&pending.sequence.to_le_bytes());
+        let data_start = packet.len() + ACK_BYTES;
+        packet.resize(data_start, 0);
+        packet.extend_from_slice(&pending.data);
+        let mut ack = Vec::with_capacity(ACK_BYTES);
+        self.write_ack(&mut ack);
+        packet[data_start - ACK_BYTES..data_start].copy_from_slice(&ack);
+        packet
+    }
+
+    fn write_ack(&mut self, packet: &mut Vec<u8>) {
+        packet.extend_from_slice(&self.next_expected.to_le_bytes());
+        packet.extend_from_slice(&self.newest.to_le_bytes());
+        packet.extend_from_slice(&self.received_bits.to_le_bytes());
+        self.ack_due = false;
+    }
+
+    fn read_ack(&mut self, ack: &[u8], now: f64, stats: &ReliableStats) {
+        let next_expected = u16::from_le_bytes([ack[0], ack[1]]);
+        let newest = u16::from_le_bytes([ack[2], ack[3]]);
+        let bits = u32::from_le_bytes([ack[4], ack[5], ack[6], ack[7]]);
+        let acked = |sequence: u16| {
+            if newer(next_expected, sequence) || sequence == newest {
+                return true;
+            }
+            let behind = u32::from(newest.wrapping_sub(sequence));
+            (1..=32).contains(&behind) && bits & (1 << (behind - 1)) != 0
+        };
+        let mut samples = Vec::new();
+        self.pending.retain(|pending| {
+            if !acked(pending.sequence) {
+                return true;
+            }
+            let waited = (now - pending.queued).max(0.0);
+            stats.ack_seconds.observe(Duration::from_secs_f64(waited));
+            count(&stats.acked, 1);
+            // a resent message's ack could be for any of its sends (Karn)
+            if pending.sends == 1 {
+                samples.push((now - pending.last_sent).max(0.0));
+            }
+            false
+        });
+        for sample in samples {
+            self.observe_rtt(sample);
+        }
+    }
+
+    fn observe_rtt(&mut self, sample: f64) {
+        match self.srtt {
+            None => {
+                self.srtt = Some(sample);
+                self.rttvar = sample / 2.0;
+            }
+            Some(srtt) => {
+                self.rttvar = 0.75 * self.rttvar + 0.25 * (srtt - sample).abs();
+                self.srtt = Some(0.875 * srtt + 0.125 * sample);
+            }
+        }
+    }
+}
@@ -0,0 +1,307 @@
+//! Transceivers handed to `netcode` in place of its own `NetcodeSocket`: a UDP
+//! socket, or an in-memory loopback network for simulations.
+
+use crate::admission::Admission;
+use crate::conditioner::Conditioner;
+use crate::metrics::Metered;
+use ::netcode::Transceiver;
+use socket2::{Domain, Protocol, Socket, Type};
+use std::collections::{HashMap, VecDeque};
+use std::io;
+use std::net::{IpAddr, Ipv4Addr, SocketAddr, ToSocketAddrs, UdpSocket};
+use std::sync::{Arc, Mutex, MutexGuard, PoisonError};
+
+/// Same socket buffer sizes `NetcodeSocket` uses.
+const SOCKET_BUFFER_SIZE: usize = 256 * 1024;
+
+/// A non-blocking UDP socket like `NetcodeSocket`, except that we own it, so its
+/// file descriptor can be handed to an event loop.
+pub struct UdpTransport {
+    socket: UdpSocket,
+}
+
+impl UdpTransport {
+    /// Bind a socket; with `reuse_port`, several processes can bind the same
+    /// address and the kernel spreads the incoming flows between them.
+    pub fn bind(addr: impl ToSocketAddrs, reuse_port: bool) -> io::Result<Self> {
+        let addr = addr
+            .to_socket_addrs()?
+            .next()
+            .ok_or_else(|| io::Error::new(io::ErrorKind::InvalidInput, "no address to bind to"))?;
+        let socket = Socket::new(Domain::for_address(addr), Type::DGRAM, Some(Protocol::UDP))?;
+        if addr.is_ipv6() {
+            socket.set_only_v6(true)?;
+        }
+        socket.set_send_buffer_size(SOCKET_BUFFER_SIZE)?;
+        socket.set_recv_buffer_size(SOCKET_BUFFER_SIZE)?;
+        if reuse_port {
+            set_reuse_port(&socket)?;
+        }
+        socket.bind(&addr.into())?;
+        socket.set_nonblocking(true)?;
+        Ok(Self {
+            socket: socket.into(),
+        })
+    }
+
+    /// The OS handle of the socket, for `select`-style readiness notification.
+    #[cfg(unix)]
+    pub fn fileno(&self) -> i64 {
+        use std::os::unix::io::AsRawFd;
+        self.socket.as_raw_fd() as i64
+    }
+
+    /// The OS handle of the socket, for `select`-style readiness notification.
+    #[cfg(windows)]
+    pub fn fileno(&self) -> i64 {
+        use std::os::windows::io::AsRawSocket;
+        self.socket.as_raw_socket() as i64
+    }
+}
+
+#[cfg(all(unix, not(any(target_os = "solaris", target_os = "illumos"))))]
+fn set_reuse_port(socket: &Socket) -> io::Result<()> {
+    socket.set_reuse_port(true)
+}
+
+#[cfg(not(all(unix, not(any(target_os = "solaris", target_os = "illumos")))))]
+fn set_reuse_port(_socket: &Socket) -> io::Result<()> {
+    Err(io::Error::new(
+        io::ErrorKind::Unsupported,
+        "SO_REUSEPORT is not available on this platform",
+    ))
+}
+
+impl Transceiver for UdpTransport {
+    type IntoError = io::Error;
+
+    fn addr(&self) -> SocketAddr {
+        self.socket
+            .local_addr()
+            .expect("a bound socket has a local address")
+    }
+
+    fn recv(&self, buf: &mut [u8]) -> io::Result<Option<(usize, SocketAddr)>> {
+        match self.socket.recv_from(buf) {
+            Ok((len, addr)) if len > 0 => Ok(Some((len, addr))),
+            Ok(_) => Ok(None),
+            // Windows reports an ICMP port unreachable on the next recv, ignore it
+            Err(e)
+                if matches!(
+                    e.kind(),
+                    io::ErrorKind::WouldBlock | io::ErrorKind::ConnectionReset
+                ) =>
+            {
+                Ok(None)
+            }
+            Err(e) => Err(e),
+        }
+    }
+
+    fn send(&self, buf: &[u8], addr: SocketAddr) -> io::Result<usize> {
+        self.socket.send_to(buf, addr)
+    }
+}
+
+type Datagram = (Vec<u8>, SocketAddr);
+
+#[derive(Default)]
+struct Mailboxes {
+    queues: HashMap<SocketAddr, VecDeque<Datagram>>,
+    next_port: u16,
+    dropped: u64,
+    sent_packets: u64,
+    sent_bytes: u64,
+}
+
+/// An in-process "network" of endpoints that exchange datagrams through
+/// in-memory queues: no sockets, no syscalls, and delivery order is exactly send
+/// order, so simulations are deterministic.
+pub struct LoopbackHub {
+    mailboxes: Mutex<Mailboxes>,
+    queue_capacity: usize,
+}
+
+impl LoopbackHub {
+    pub fn new(queue_capacity: usize) -> Self {
+        Self {
+            mailboxes: Mutex::new(Mailboxes::default()),
+            queue_capacity,
+        }
+    }
+
+    fn mailboxes(&self) -> MutexGuard<'_, Mailboxes> {
+        self.mailboxes
+            .lock()
+            .unwrap_or_else(PoisonError::into_inner)
+    }
+
+    /// Datagrams dropped because the receiver's queue was full or nobody was
+    /// bound to the destination.
+    pub fn dropped(&self) -> u64 {
+        self.mailboxes().dropped
+    }
+
+    /// Datagrams and bytes sent so far, including dropped ones.
+    pub fn sent(&self) -> (u64, u64) {
+        let mailboxes = self.mailboxes();
+        (mailboxes.sent_packets, mailboxes.sent_bytes)
+    }
+
+    /// Datagrams sent but not received yet.
+    pub fn in_flight(&self) -> usize {
+        self.mailboxes().queues.values().map(VecDeque::len).sum()
+    }
+
+    /// Number of bound endpoints.
+    pub fn endpoints(&self) -> usize {
+        self.mailboxes().queues.len()
+    }
+}
+
+/// An endpoint of a `LoopbackHub`, unbound when dropped.
+pub struct LoopbackTransport {
+    hub: Arc<LoopbackHub>,
+    addr: SocketAddr,
+}
+
+impl LoopbackTransport {
+    /// Bind `addr` on the hub. Unspecified IPs become 127.0.0.1 so that the
+    /// address is reachable, and port 0 picks a free port.
+    pub fn bind(hub: Arc<LoopbackHub>, addr: impl ToSocketAddrs) -> io::Result<Self> {
+        let mut addr = addr
+            .to_socket_addrs()?
+            .next()
+            .ok_or_else(|| io::Error::new(io::ErrorKind::InvalidInput, "no address to bind to"))?;
+        if addr.ip().is_unspecified() {
+            addr.set_ip(IpAddr::V4(Ipv4Addr::LOCALHOST));
+        }
+        {
+            let mut mailboxes = hub.mailboxes();
+            if addr.port() == 0 {
+                addr.set_port(free_port(&mut mailboxes, addr.ip())?);
+            } else if mailboxes.queues.contains_key(&addr) {
+                return Err(io::Error::new(
+                    io::ErrorKind::AddrInUse,
+                    format!("{addr} is already bound on this loopback network"),
+                ));
+            }
+            mailboxes.queues.insert(addr, VecDeque::new());
+        }
+        Ok(Self { hub, addr })
+    }
+}
+
+fn free_port(mailboxes: &mut Mailboxes, ip: IpAddr) -> io::Result<u16> {
+    for _ in 0..u16::MAX {
+        mailboxes.next_port = mailboxes.next_port.checked_add(1).unwrap_or(1);
+        let port = mailboxes.next_port;
+        if !mailboxes.queues.contains_key(&SocketAddr::new(ip, port)) {
+            return Ok(port);
+        }
+    }
+    Err(io::Error::new(
+        io::ErrorKind::AddrNotAvailable,
+        "no free port left on this loopback network",
+    ))
+}
+
+impl Drop for LoopbackTransport {
+    fn drop(&mut self) {
+        self.hub.mailboxes().queues.remove(&self.addr);
+    }
+}
+
+impl Transceiver for LoopbackTransport {
+    type IntoError = io::Error;
+
+    fn addr(&self) -> SocketAddr {
+        self.addr
+    }
+
+    fn recv(&self, buf: &mut [u8]) -> io::Result<Option<(usize, SocketAddr)>> {
+        let Some((data, from)) = self
+            .hub
+            .mailboxes()
+            .queues
+            .get_mut(&self.addr)
+            .and_then(VecDeque::pop_front)
+        else {
+            return Ok(None);
+        };
+        // like UDP, a datagram larger than the buffer is truncated
+        let len = data.len().min(buf.len());
+        buf[..len].copy_from_slice(&data[..len]);
+        Ok(Some((len, from)))
+    }
+
+    fn send(&self, buf: &[u8], addr: SocketAddr) -> io::Result<usize> {
+        let mut mailboxes = self.hub.mailboxes();
+        mailboxes.sent_packets += 1;
+        mailboxes.sent_bytes += buf.len() as u64;
+        match mailboxes.queues.get_mut(&addr) {
+            Some(queue) if queue.len() < self.hub.queue_capacity => {
+                queue.push_back((buf.to_vec(), self.addr));
+            }
+            // like UDP, sending into the void or into a full buffer is not an error
+            _ => mailboxes.dropped += 1,
+        }
+        Ok(buf.len())
+    }
+}
+
+/// The transceiver the Python `Server` and `Client` are built on.
+pub enum Transport {
+    Udp(UdpTransport),
+    Loopback(LoopbackTransport),
+    Conditioned(Box<Conditioner<Transport>>),
+    Admission(Box<Admission<Transport>>),
+    Metered(Box<Metered<Transport>>),
+}
+
+impl Transport {
+    /// The OS handle to wait on, if the transport has one.
+    pub fn fileno(&self) -> Option<i64> {
+        match self {
+            Self::Udp(udp) => Some(udp.fileno()),
+            Self::Loopback(_) => None,
+            Self::Conditioned(conditioned) => conditioned.inner().fileno(),
+            Self::Admission(admission) => admission.inner().fileno(),
+            Self::Metered(metered) => metered.inner().fileno(),
+        }
+    }
+}
+
+impl Transceiver for Transport {
+    type IntoError = io::Error;
+
+    fn addr(&self) -> SocketAddr {
+        match self {
+            Self::Udp(udp) => udp.addr(),
+            Self::Loopback(loopback) => loopback.addr(),
+            Self::Conditioned(conditioned) => conditioned.addr(),
+            Self::Admission(admission) => admission.addr(),
+            Self::Metered(metered) => metered.addr(),
+        }
+    }
+
+    fn recv(&self, buf: &mut [u8]) -> io::Result<Option<(usize, SocketAddr)>> {
+        match self {
+            Self::Udp(udp) => udp.recv(buf),
+            Self::Loopback(loopback) => loopback.recv(buf),
+            Self::Conditioned(conditioned) => conditioned.recv(buf),
+            Self::Admission(admission) => admission.recv(buf),
+            Self::Metered(metered) => metered.recv(buf),
+        }
+    }
+
+    fn send(&self, buf: &[u8], addr: SocketAddr) -> io::Result<usize> {
+        match self {
+            Self::Udp(udp) => udp.send(buf, addr),
+            Self::Loopback(loopback) => loopback.send(buf, addr),
+            Self::Conditioned(conditioned) => conditioned.send(buf, addr),
+            Self::Admission(admission) => admission.send(buf, addr),
+            Self::Metered(metered) => metered.send(buf, addr),
+        }
+    }
+}
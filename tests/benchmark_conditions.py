@@ -0,0 +1,60 @@
+"""Time-to-connect and throughput under simulated WAN conditions.
+
+Runs over a `LoopbackNetwork` on a virtual clock, so the reported connect times
+and rates are in simulated seconds and do not depend on the machine.
+"""
+
+import time
+
+import netcode
+from tests import helpers
+
+TICK = 1 / 60
+NUM_CLIENTS = 64
+THROUGHPUT_TICKS = 600
+PACKETS_PER_TICK = 4
+
+# clients apply the conditions in both directions: the RTT is twice the latency
+# and a round trip loses about twice the loss
+PROFILES = {
+    "clean": None,
+    "100ms RTT": netcode.NetworkConditions(latency=0.05, seed=1),
+    "100ms RTT, 2% loss": netcode.NetworkConditions(latency=0.05, loss=0.01, seed=1),
+    "200ms RTT, 40ms jitter, 5% loss": netcode.NetworkConditions(
+        latency=0.1, jitter=0.04, loss=0.025, seed=1
+    ),
+    "50ms RTT, 256 KiB/s": netcode.NetworkConditions(
+        latency=0.025, bandwidth=256 * 1024, seed=1
+    ),
+}
+
+
+def _run(conditions: netcode.NetworkConditions | None) -> tuple[float, float]:
+    network, server, clients = helpers.connected_loopback(
+        range(NUM_CLIENTS), conditions=conditions
+    )
+    connect_time = network.time
+
+    payload = bytes(256)
+    received = 0
+    for _ in range(THROUGHPUT_TICKS):
+        now = network.advance(TICK)
+        for client in clients:
+            for _ in range(PACKETS_PER_TICK):
+                client.send(payload)
+            client.update(now)
+        server.update(now)
+        payloads, _client_indices = server.recv_many()
+        received += len(payloads)
+    return connect_time, received / (THROUGHPUT_TICKS * TICK)
+
+
+def benchmark_network_conditions():
+    for name, conditions in PROFILES.items():
+        start = time.perf_counter()
+        connect_time, rate = _run(conditions)
+        wall = time.perf_counter() - start
+        print(
+            f"{name:32} connect {connect_time * 1000:7.0f} ms  "
+            f"{rate:9.0f} packets/s  ({wall:.2f}s wall)"
+        )
@@ -0,0 +1,33 @@
+"""Connection bookkeeping: diffing `Server.clients` versus `Server.poll_events`.
+
+With many connected clients and little churn, diffing costs O(clients) every
+tick while polling events only costs what actually changed.
+"""
+
+import time
+
+import netcode
+from tests import helpers
+
+NUM_CLIENTS = 200
+TICKS = 600
+
+
+def benchmark_connection_bookkeeping():
+    _network, server, _clients = helpers.connected_loopback(range(NUM_CLIENTS))
+
+    previous: set[netcode.ClientIndex] = set()
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        current = set(server.clients)
+        _connected, _disconnected = current - previous, previous - current
+        previous = current
+    diffing = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for _ in range(TICKS):
+        server.poll_events()
+    polling = time.perf_counter() - start
+
+    print(f"diffing clients: {diffing / TICKS * 1e6:8.1f} us/tick")
+    print(f"polling events:  {polling / TICKS * 1e6:8.1f} us/tick")
@@ -0,0 +1,48 @@
+"""Idle bandwidth against keep-alive interval.
+
+Connected clients that have nothing to say still exchange keep-alives, and the
+interval between them sets the floor of what every idle session costs.
+"""
+
+import netcode
+from tests import helpers
+
+NUM_CLIENTS = 1000
+TICK = 1 / 60
+IDLE_SECONDS = 10
+# netcode's packets ride in UDP over IPv4
+HEADER_BYTES = 28
+
+
+def _idle_bandwidth(keep_alive_interval: float) -> tuple[float, float]:
+    network = netcode.LoopbackNetwork()
+    server = netcode.Server(
+        helpers.LOOPBACK_ADDRESS,
+        0xDEADBEEF,
+        netcode.generate_key(),
+        network=network,
+        keep_alive_interval=keep_alive_interval,
+    )
+    clients = [
+        netcode.Client(
+            server.token(i), network=network, send_interval=keep_alive_interval
+        )
+        for i in range(NUM_CLIENTS)
+    ]
+    helpers.connect_loopback(network, server, clients)
+
+    packets, sent = network.sent_packets(), network.sent_bytes()
+    helpers.run_loopback(network, server, clients, int(IDLE_SECONDS / TICK), TICK)
+    packets = network.sent_packets() - packets
+    sent = network.sent_bytes() - sent + packets * HEADER_BYTES
+    return packets / IDLE_SECONDS, sent / IDLE_SECONDS
+
+
+def benchmark_keep_alive_interval():
+    print(f"{NUM_CLIENTS} idle clients, both directions:")
+    for keep_alive_interval in (0.1, 0.25, 0.5, 1.0):
+        packets, sent = _idle_bandwidth(keep_alive_interval)
+        print(
+            f"keep-alive every {keep_alive_interval:4.2f}s: "
+            f"{packets:8.0f} packets/s {sent * 8 / 1e6:8.2f} Mbit/s"
+        )
@@ -0,0 +1,59 @@
+"""Compare draining a tick of packets with `recv` against `recv_many`."""
+
+import time
+
+import netcode
+from tests import helpers
+
+NUM_CLIENTS = 32
+PACKETS_PER_CLIENT = 30
+ROUNDS = 20
+
+
+def _fill(server: netcode.Server, clients: list[netcode.Client], now: float) -> int:
+    """Have every client send a tick worth of packets and let the server read them."""
+    for client in clients:
+        for i in range(PACKETS_PER_CLIENT):
+            client.send(i.to_bytes(4, "little") * 8)
+    time.sleep(0.01)
+    server.update(now)
+    return len(clients) * PACKETS_PER_CLIENT
+
+
+def _drain_recv(server: netcode.Server) -> int:
+    """The one-packet-at-a-time loop from the README example."""
+    count = 0
+    while True:
+        result = server.recv()
+        if result is None:
+            break
+        _packet, _client_index = result
+        count += 1
+    return count
+
+
+def _drain_recv_many(server: netcode.Server) -> int:
+    payloads, _client_indices = server.recv_many()
+    return len(payloads)
+
+
+def benchmark_recv_vs_recv_many():
+    server = netcode.Server(("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key())
+    clients = [netcode.Client(server.token(i)) for i in range(NUM_CLIENTS)]
+    now = helpers.connect_clients(server, clients)
+
+    timings: dict[str, float] = {}
+    for name, drain in (("recv", _drain_recv), ("recv_many", _drain_recv_many)):
+        total = 0.0
+        for _ in range(ROUNDS):
+            sent = _fill(server, clients, now)
+            start = time.perf_counter()
+            received = drain(server)
+            total += time.perf_counter() - start
+            # the UDP socket may drop a few packets under load, but never invent any
+            assert 0 < received <= sent
+        timings[name] = total / ROUNDS
+
+    for name, seconds in timings.items():
+        print(f"{name:>10}: {seconds * 1e6:9.1f} us per tick")
+    print(f"speedup: {timings['recv'] / timings['recv_many']:.2f}x")
@@ -0,0 +1,386 @@
+"""Server throughput and cost, tracked against the stored baseline.
+
+Everything runs over a `LoopbackNetwork`, so the numbers measure the bindings and
+the protocol (crypto, bookkeeping) rather than the OS network stack, and stay
+comparable between runs. Only server-side calls are timed.
+"""
+
+import random
+import time
+
+import pytest
+
+import netcode
+from netcode.snapshot import SnapshotClient, SnapshotServer
+from tests import helpers
+from tests.benchmarking import BenchmarkResults
+
+TICK = 1 / 60
+PAYLOAD_SIZES = [16, 256, 1024]
+CLIENT_COUNTS = [1, 64]
+THROUGHPUT_PACKETS = 20_000
+HANDSHAKES = 1000
+FLOOD_CLIENTS = 500
+COALESCED_MESSAGES = 16
+# per datagram, on top of what `LoopbackNetwork.sent_bytes` counts
+UDP_IPV4_HEADER_BYTES = 28
+SNAPSHOT_FIELDS = 50
+SNAPSHOT_CHANGES = 5
+SNAPSHOT_TICKS = 300
+RELIABLE_CLIENTS = 16
+RELIABLE_MESSAGES = 2
+RELIABLE_TICKS = 300
+
+
+def benchmark_connect_rate(bench: BenchmarkResults):
+    network = netcode.LoopbackNetwork()
+    server = netcode.Server(
+        helpers.LOOPBACK_ADDRESS,
+        0xDEADBEEF,
+        netcode.generate_key(),
+        network=network,
+    )
+    clients = [
+        netcode.Client(server.token(i), network=network) for i in range(HANDSHAKES)
+    ]
+    for client in clients:
+        client.connect()
+
+    elapsed = 0.0
+    while not all(client.is_connected() for client in clients):
+        now = network.advance(TICK)
+        for client in clients:
+            client.update(now)
+        start = time.perf_counter()
+        server.update(now)
+        elapsed += time.perf_counter() - start
+    bench.record("connect handshakes", HANDSHAKES / elapsed, "handshakes/s")
+
+
+@pytest.mark.parametrize("num_clients", CLIENT_COUNTS)
+@pytest.mark.parametrize("payload_size", PAYLOAD_SIZES)
+def benchmark_recv_throughput(
+    bench: BenchmarkResults, payload_size: int, num_clients: int
+):
+    network, server, clients = helpers.connected_loopback(range(num_clients))
+    payload = bytes(payload_size)
+    per_client = 256 // num_clients or 1
+
+    received = 0
+    elapsed = 0.0
+    while received < THROUGHPUT_PACKETS:
+        now = network.advance(TICK)
+        for client in clients:
+            for _ in range(per_client):
+                client.send(payload)
+            client.update(now)
+        start = time.perf_counter()
+        server.update(now)
+        payloads, _client_indices = server.recv_many()
+        elapsed += time.perf_counter() - start
+        received += len(payloads)
+    bench.record(
+        f"recv {payload_size}B from {num_clients} clients",
+        received / elapsed,
+        "packets/s",
+    )
+
+
+@pytest.mark.parametrize("admission", [False, True], ids=["open", "admission"])
+def benchmark_recv_under_flood(
+    bench: BenchmarkResults,
+    admission: bool,  # noqa: FBT001
+):
+    """Connected clients' throughput while forged connection requests pour in.
+
+    The forged tokens are signed with another key, so every request that gets
+    through costs the server a failed decryption.
+    """
+    network, server, clients = helpers.connected_loopback(
+        range(64), admission=netcode.AdmissionControl() if admission else None
+    )
+    attacker_key = netcode.generate_key()
+    attackers = [
+        netcode.Client(
+            netcode.ConnectToken([server.address()], 0xDEADBEEF, i, attacker_key),
+            network=network,
+            send_interval=TICK,
+        )
+        for i in range(FLOOD_CLIENTS)
+    ]
+    for attacker in attackers:
+        attacker.connect()
+    payload = bytes(256)
+
+    received = 0
+    elapsed = 0.0
+    while received < THROUGHPUT_PACKETS:
+        now = network.advance(TICK)
+        for attacker in attackers:
+            attacker.update(now)
+        for client in clients:
+            for _ in range(4):
+                client.send(payload)
+            client.update(now)
+        start = time.perf_counter()
+        server.update(now)
+        payloads, _client_indices = server.recv_many()
+        elapsed += time.perf_counter() - start
+        received += len(payloads)
+    mode = "with admission control" if admission else "without admission control"
+    bench.record(
+        f"recv 256B from 64 clients, {FLOOD_CLIENTS} forging, {mode}",
+        received / elapsed,
+        "packets/s",
+    )
+
+
+@pytest.mark.parametrize("num_clients", CLIENT_COUNTS)
+@pytest.mark.parametrize("payload_size", PAYLOAD_SIZES)
+def benchmark_send_throughput(
+    bench: BenchmarkResults, payload_size: int, num_clients: int
+):
+    network, server, clients = helpers.connected_loopback(range(num_clients))
+    payload = bytes(payload_size)
+    pairs = [(payload, index) for index in server.clients] * (256 // num_clients or 1)
+
+    sent = 0
+    elapsed = 0.0
+    while sent < THROUGHPUT_PACKETS:
+        now = network.advance(TICK)
+        start = time.perf_counter()
+        sent += server.send_many(pairs)
+        elapsed += time.perf_counter() - start
+        server.update(now)
+        for client in clients:
+            client.update(now)
+            client.recv_many()
+    bench.record(
+        f"send {payload_size}B to {num_clients} clients", sent / elapsed, "packets/s"
+    )
+
+
+@pytest.mark.parametrize("num_clients", [16, 256])
+def benchmark_send_all_fanout(bench: BenchmarkResults, num_clients: int):
+    network, server, clients = helpers.connected_loopback(range(num_clients))
+    payload = bytes(256)
+    calls = THROUGHPUT_PACKETS // num_clients
+
+    elapsed = 0.0
+    for _ in range(calls):
+        now = network.advance(TICK)
+        start = time.perf_counter()
+        server.send_all(payload)
+        elapsed += time.perf_counter() - start
+        server.update(now)
+        for client in clients:
+            client.update(now)
+            client.recv_many()
+    bench.record(
+        f"send_all to {num_clients} clients",
+        calls * num_clients / elapsed,
+        "packets/s",
+    )
+
+
+@pytest.mark.parametrize("num_clients", [16, 256])
+def benchmark_send_group_fanout(bench: BenchmarkResults, num_clients: int):
+    """Half of the clients in a group, against a loop of `send` calls."""
+    network, server, clients = helpers.connected_loopback(range(num_clients))
+    members = server.clients[::2]
+    for index in members:
+        server.add_to_group("half", index)
+    payload = bytes(256)
+    calls = THROUGHPUT_PACKETS // len(members)
+
+    group_elapsed = loop_elapsed = 0.0
+    for _ in range(calls):
+        now = network.advance(TICK)
+        start = time.perf_counter()
+        server.send_group("half", payload)
+        group_elapsed += time.perf_counter() - start
+        start = time.perf_counter()
+        for index in members:
+            server.send(payload, index)
+        loop_elapsed += time.perf_counter() - start
+        server.update(now)
+        for client in clients:
+            client.update(now)
+            client.recv_many()
+    sent = calls * len(members)
+    bench.record(
+        f"send_group to {len(members)} of {num_clients} clients",
+        sent / group_elapsed,
+        "packets/s",
+    )
+    bench.record(
+        f"send loop to {len(members)} of {num_clients} clients",
+        sent / loop_elapsed,
+        "packets/s",
+    )
+
+
+def benchmark_send_coalesced(bench: BenchmarkResults):
+    """Small messages, many per client per tick, one per packet or coalesced.
+
+    Timing covers `send_many` and the `update` that flushes the batches; the
+    traffic counts what the server put on the network in those calls.
+    """
+    wire_bytes = {}
+    for coalesce in (False, True):
+        network, server, clients = helpers.connected_loopback(
+            range(64), coalesce=coalesce
+        )
+        payload = bytes(32)
+        pairs = [(payload, index) for index in server.clients] * COALESCED_MESSAGES
+        calls = THROUGHPUT_PACKETS // len(pairs)
+
+        elapsed = 0.0
+        packets = sent_bytes = 0
+        for _ in range(calls):
+            now = network.advance(TICK)
+            packets_before, bytes_before = network.sent_packets(), network.sent_bytes()
+            start = time.perf_counter()
+            server.send_many(pairs)
+            server.update(now)
+            elapsed += time.perf_counter() - start
+            packets += network.sent_packets() - packets_before
+            sent_bytes += network.sent_bytes() - bytes_before
+            for client in clients:
+                client.update(now)
+                client.recv_many()
+
+        mode = "coalesced" if coalesce else "one per packet"
+        messages = calls * len(pairs)
+        wire_bytes[coalesce] = sent_bytes + packets * UDP_IPV4_HEADER_BYTES
+        bench.record(
+            f"send 32B x{COALESCED_MESSAGES} per tick to 64 clients, {mode}",
+            messages / elapsed,
+            "messages/s",
+        )
+        bench.record(
+            f"packets per 32B message, {mode}",
+            packets / messages,
+            "packets/message",
+            higher_is_better=False,
+        )
+    bench.record(
+        "wire bytes saved by coalescing 32B messages",
+        100 * (1 - wire_bytes[True] / wire_bytes[False]),
+        "%",
+    )
+
+
+def benchmark_snapshot_deltas(bench: BenchmarkResults):
+    """A world of 16-byte fields, a few changing per tick, in full or as deltas.
+
+    Full snapshots go out with `send_all`, deltas through a `SnapshotServer`.
+    Timing covers the server's calls, the bytes are the server's traffic.
+    """
+    for delta in (False, True):
+        network, server, clients = helpers.connected_loopback(range(64))
+        snapshots = SnapshotServer(server)
+        # only wrapped clients ack snapshots
+        endpoints = [SnapshotClient(client) for client in clients] if delta else clients
+        rng = random.Random(1)
+        world = {field: rng.randbytes(16) for field in range(SNAPSHOT_FIELDS)}
+
+        elapsed = 0.0
+        sent_bytes = 0
+        for _ in range(SNAPSHOT_TICKS):
+            for field in rng.sample(range(SNAPSHOT_FIELDS), SNAPSHOT_CHANGES):
+                world[field] = rng.randbytes(16)
+            now = network.advance(TICK)
+            bytes_before = network.sent_bytes()
+            start = time.perf_counter()
+            if delta:
+                snapshots.send_snapshot(world)
+                snapshots.update(now)
+            else:
+                server.send_all(b"".join(world.values()))
+                server.update(now)
+            elapsed += time.perf_counter() - start
+            sent_bytes += network.sent_bytes() - bytes_before
+            for endpoint in endpoints:
+                endpoint.update(now)
+                endpoint.recv_many()
+
+        mode = "deltas" if delta else "full"
+        name = f"{SNAPSHOT_FIELDS}-field snapshots to 64 clients, {mode}"
+        bench.record(name, SNAPSHOT_TICKS / elapsed, "ticks/s")
+        bench.record(
+            f"{name}, bytes per client per tick",
+            sent_bytes / SNAPSHOT_TICKS / len(clients),
+            "bytes",
+            higher_is_better=False,
+        )
+
+
+@pytest.mark.parametrize("loss", [0.01, 0.05])
+def benchmark_reliable_under_loss(bench: BenchmarkResults, loss: float):
+    """Reliable 64-byte messages on a link that drops `loss` of packets each way.
+
+    Timing covers the server's calls. Ack latency runs from `send_reliable` to
+    the ack arriving, on the virtual clock, resends included.
+    """
+    conditions = netcode.NetworkConditions(latency=0.025, loss=loss, seed=1)
+    network, server, clients = helpers.connected_loopback(
+        range(RELIABLE_CLIENTS), reliable=True, conditions=conditions
+    )
+    payload = bytes(64)
+
+    elapsed = 0.0
+    for _ in range(RELIABLE_TICKS):
+        now = network.advance(TICK)
+        start = time.perf_counter()
+        for index in server.clients:
+            for _ in range(RELIABLE_MESSAGES):
+                server.send_reliable(payload, index)
+        server.update(now)
+        elapsed += time.perf_counter() - start
+        for client in clients:
+            client.update(now)
+            client.recv_many()
+
+    metrics = server.metrics()
+    sent = metrics["reliable_sent"]
+    acks = metrics["reliable_ack_seconds"]
+    name = (
+        f"reliable 64B x{RELIABLE_MESSAGES} per tick to {RELIABLE_CLIENTS} clients,"
+        f" {loss:.0%} loss"
+    )
+    bench.record(name, sent / elapsed, "messages/s")
+    bench.record(
+        f"{name}, resends per message",
+        metrics["reliable_resent"] / sent,
+        "resends/message",
+        higher_is_better=False,
+    )
+    bench.record(
+        f"{name}, mean ack latency",
+        acks["sum"] / sum(acks["counts"]) * 1e3,
+        "ms",
+        higher_is_better=False,
+    )
+
+
+@pytest.mark.parametrize("num_clients", [0, 100, 1000])
+def benchmark_update_cost(bench: BenchmarkResults, num_clients: int):
+    """`update` with idle clients: keep-alives and timeout checks only."""
+    network, server, clients = helpers.connected_loopback(range(num_clients))
+    ticks = 300
+
+    elapsed = 0.0
+    for _ in range(ticks):
+        now = network.advance(TICK)
+        for client in clients:
+            client.update(now)
+        start = time.perf_counter()
+        server.update(now)
+        elapsed += time.perf_counter() - start
+    bench.record(
+        f"update with {num_clients} idle clients",
+        elapsed / ticks * 1e6,
+        "us/update",
+        higher_is_better=False,
+    )
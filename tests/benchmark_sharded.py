@@ -0,0 +1,106 @@
+"""Measure connect and echo throughput of `ShardedServer` against worker count.
+
+Load comes from separate processes, so the clients are not what limits the
+server. Throughput should grow with the number of shards up to the core count.
+"""
+
+import os
+import time
+
+import netcode
+from netcode.parallel import SafeProcess
+
+DURATION = 2.0
+LOAD_PROCESSES = 4
+CLIENTS_PER_PROCESS = 32
+PACKETS_PER_TICK = 4
+CONNECT_TIMEOUT = 10.0
+
+
+def _echo(
+    server: netcode.Server, packet: bytes, client_index: netcode.ClientIndex
+) -> None:
+    server.send(packet, client_index)
+
+
+def _load(
+    address: netcode.Address, protocol_id: int, private_key: bytes, first_id: int
+) -> tuple[float, int]:
+    """Connect clients, then echo for `DURATION`; returns connect time and echoes."""
+    clients = [
+        netcode.Client(
+            netcode.ConnectToken([address], protocol_id, client_id, private_key)
+        )
+        for client_id in range(first_id, first_id + CLIENTS_PER_PROCESS)
+    ]
+    for client in clients:
+        client.connect()
+
+    start_time = time.monotonic()
+    while not all(client.is_connected() for client in clients):
+        if time.monotonic() - start_time > CONNECT_TIMEOUT:
+            connected = sum(client.is_connected() for client in clients)
+            msg = f"{connected}/{len(clients)} clients connected"
+            raise TimeoutError(msg)
+        for client in clients:
+            client.update(time.monotonic() - start_time)
+        time.sleep(1 / 1000)
+    connect_time = time.monotonic() - start_time
+
+    payload = bytes(256)
+    echoes = 0
+    deadline = time.monotonic() + DURATION
+    while time.monotonic() < deadline:
+        for client in clients:
+            for _ in range(PACKETS_PER_TICK):
+                client.send(payload)
+            client.update(time.monotonic() - start_time)
+            echoes += len(client.recv_many())
+    return connect_time, echoes
+
+
+def _run(workers: int) -> tuple[float, float]:
+    private_key = netcode.generate_key()
+    with netcode.ShardedServer(
+        ("127.0.0.1", 0),
+        0xDEADBEEF,
+        private_key,
+        workers=workers,
+        handler=_echo,
+        update_interval=1 / 1000,
+    ) as sharded:
+        # a module level target with `args`, so the `spawn` start method can
+        # pickle it
+        loads = [
+            SafeProcess(
+                target=_load,
+                args=(
+                    sharded.listen_address,
+                    sharded.protocol_id,
+                    private_key,
+                    i * CLIENTS_PER_PROCESS,
+                ),
+            )
+            for i in range(LOAD_PROCESSES)
+        ]
+        for load in loads:
+            load.start()
+        results = [load.result_queue.get() for load in loads]
+        for load in loads:
+            load.join()
+
+    num_clients = LOAD_PROCESSES * CLIENTS_PER_PROCESS
+    connect_time = max(connect_time for connect_time, _ in results)
+    echoes = sum(echoes for _, echoes in results)
+    return num_clients / connect_time, echoes / DURATION
+
+
+def benchmark_sharded_server():
+    cpu_count = os.cpu_count() or 1
+    for workers in sorted({1, 2, 4, cpu_count}):
+        if workers > cpu_count:
+            continue
+        connects, echoes = _run(workers)
+        print(
+            f"{workers:3} workers: {connects:10.0f} connects/s {echoes:10.0f} echoes/s"
+        )
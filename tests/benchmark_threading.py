@@ -0,0 +1,81 @@
+"""Measure how much a busy network thread slows down a simulation thread.
+
+`Server`/`Client` release the GIL while they touch the socket and crypto, so the
+simulation thread should keep most of its throughput while the network runs.
+"""
+
+import threading
+import time
+
+import netcode
+from tests import helpers
+
+DURATION = 2.0
+NUM_CLIENTS = 16
+PACKETS_PER_TICK = 20
+
+
+def _simulate(stop: threading.Event, steps: list[int]) -> None:
+    """Stand-in for the game simulation: pure Python work, counted in steps."""
+    count = 0
+    while not stop.is_set():
+        sum(i * i for i in range(500))
+        count += 1
+    steps.append(count)
+
+
+def _network(
+    server: netcode.Server,
+    clients: list[netcode.Client],
+    stop: threading.Event,
+    received: list[int],
+) -> None:
+    payload = bytes(512)
+    start_time = time.monotonic()
+    count = 0
+    while not stop.is_set():
+        elapsed_time = time.monotonic() - start_time
+        for client in clients:
+            for _ in range(PACKETS_PER_TICK):
+                client.send(payload)
+            client.update(elapsed_time)
+        server.update(elapsed_time)
+        payloads, _client_indices = server.recv_many()
+        count += len(payloads)
+    received.append(count)
+
+
+def _run(threads: list[threading.Thread], stop: threading.Event) -> None:
+    for thread in threads:
+        thread.start()
+    time.sleep(DURATION)
+    stop.set()
+    for thread in threads:
+        thread.join()
+
+
+def benchmark_simulation_with_busy_network():
+    server = netcode.Server(("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key())
+    clients = [netcode.Client(server.token(i)) for i in range(NUM_CLIENTS)]
+    helpers.connect_clients(server, clients)
+
+    alone: list[int] = []
+    stop = threading.Event()
+    _run([threading.Thread(target=_simulate, args=(stop, alone))], stop)
+
+    shared: list[int] = []
+    received: list[int] = []
+    stop = threading.Event()
+    _run(
+        [
+            threading.Thread(target=_simulate, args=(stop, shared)),
+            threading.Thread(target=_network, args=(server, clients, stop, received)),
+        ],
+        stop,
+    )
+
+    assert received[0] > 0
+    print(f"simulation alone:        {alone[0] / DURATION:10.0f} steps/s")
+    print(f"simulation with network: {shared[0] / DURATION:10.0f} steps/s")
+    print(f"network packets:         {received[0] / DURATION:10.0f} packets/s")
+    print(f"simulation throughput kept: {shared[0] / alone[0]:.0%}")
@@ -0,0 +1,48 @@
+"""Minting tokens one by one versus in one parallel batch."""
+
+import time
+
+import netcode
+from tests.benchmarking import BenchmarkResults
+
+NUM_TOKENS = 20_000
+ADDRESSES = [("127.0.0.1", 40000)]
+
+
+def benchmark_token_minting(bench: BenchmarkResults):
+    key = netcode.generate_key()
+
+    start = time.perf_counter()
+    for client_id in range(NUM_TOKENS):
+        netcode.ConnectToken(ADDRESSES, 0xDEADBEEF, client_id, key)
+    one_by_one = time.perf_counter() - start
+
+    start = time.perf_counter()
+    records = netcode.generate_tokens(ADDRESSES, 0xDEADBEEF, range(NUM_TOKENS), key)
+    batch = time.perf_counter() - start
+    assert len(records) == NUM_TOKENS * netcode.CONNECT_TOKEN_BYTES
+
+    print(f"one by one: {NUM_TOKENS / one_by_one:10.0f} tokens/s")
+    print(f"batch:      {NUM_TOKENS / batch:10.0f} tokens/s")
+    bench.record("mint tokens one by one", NUM_TOKENS / one_by_one, "tokens/s")
+    bench.record("mint tokens in a batch", NUM_TOKENS / batch, "tokens/s")
+
+
+def benchmark_resolved_addresses():
+    key = netcode.generate_key()
+    hostnames = [("localhost", 40000), ("localhost", 40001)]
+    num_tokens = 2_000
+
+    start = time.perf_counter()
+    for client_id in range(num_tokens):
+        netcode.ConnectToken(hostnames, 0xDEADBEEF, client_id, key)
+    resolving = time.perf_counter() - start
+
+    addresses = netcode.ServerAddressSet(hostnames)
+    start = time.perf_counter()
+    for client_id in range(num_tokens):
+        netcode.ConnectToken(addresses, 0xDEADBEEF, client_id, key)
+    cached = time.perf_counter() - start
+
+    print(f"resolving every token: {num_tokens / resolving:10.0f} tokens/s")
+    print(f"ServerAddressSet:      {num_tokens / cached:10.0f} tokens/s")
@@ -0,0 +1,108 @@
+"""Benchmark results: recorded by the `bench` fixture, compared with a baseline.
+
+Benchmarks call `bench.record(name, value, unit)` for the numbers worth tracking.
+At the end of the session every result is written to `bench_output.txt`, one JSON
+object per line, next to the stored baseline value and the relative change.
+Results that moved the wrong way by more than the tolerance are regressions.
+
+    pytest tests -k benchmark                        # compare with the baseline
+    pytest tests -k benchmark --bench-save-baseline  # accept the current numbers
+    pytest tests -k benchmark --bench-strict         # fail on regressions
+"""
+
+from __future__ import annotations
+
+import dataclasses
+import json
+import platform
+from pathlib import Path
+
+DEFAULT_OUTPUT = "bench_output.txt"
+DEFAULT_BASELINE = Path(__file__).parent / "benchmark_baseline.json"
+DEFAULT_TOLERANCE = 0.2
+
+
+@dataclasses.dataclass(frozen=True)
+class Result:
+    name: str
+    value: float
+    unit: str
+    higher_is_better: bool = True
+
+    def change(self, baseline: float) -> float:
+        """Relative change from `baseline`, positive when the value grew."""
+        return self.value / baseline - 1
+
+    def regressed(self, baseline: float, tolerance: float) -> bool:
+        change = self.change(baseline)
+        return change < -tolerance if self.higher_is_better else change > tolerance
+
+
+def load_baseline(path: Path) -> dict[str, float]:
+    """The baseline values by result name, empty if there is no baseline yet."""
+    if not path.exists():
+        return {}
+    return json.loads(path.read_text())["results"]
+
+
+class BenchmarkResults:
+    """Everything the benchmarks of one session recorded."""
+
+    def __init__(self, baseline: dict[str, float], tolerance: float) -> None:
+        self.baseline = baseline
+        self.tolerance = tolerance
+        self.results: list[Result] = []
+
+    def record(
+        self, name: str, value: float, unit: str, *, higher_is_better: bool = True
+    ) -> None:
+        """Record a result; names must be unique within a session."""
+        if any(result.name == name for result in self.results):
+            msg = f"benchmark result {name!r} recorded twice"
+            raise ValueError(msg)
+        self.results.append(Result(name, value, unit, higher_is_better))
+
+    def regressions(self) -> list[tuple[Result, float]]:
+        """The results that regressed, with their baseline values."""
+        return [
+            (result, self.baseline[result.name])
+            for result in self.results
+            if result.name in self.baseline
+            and result.regressed(self.baseline[result.name], self.tolerance)
+        ]
+
+    def write(self, path: Path) -> None:
+        with path.open("w", encoding="utf-8") as file:
+            for result in self.results:
+                baseline = self.baseline.get(result.name)
+                line = {
+                    **dataclasses.asdict(result),
+                    "baseline": baseline,
+                    "change": None if baseline is None else result.change(baseline),
+                    "regressed": baseline is not None
+                    and result.regressed(baseline, self.tolerance),
+                }
+                file.write(json.dumps(line) + "\n")
+
+    def save_baseline(self, path: Path) -> None:
+        """Store the recorded values as the baseline, keeping results not rerun."""
+        values = {**self.baseline, **{r.name: r.value for r in self.results}}
+        baseline = {
+            "machine": f"{platform.machine()} {platform.processor()}".strip(),
+            "python": platform.python_version(),
+            "results": dict(sorted(values.items())),
+        }
+        path.write_text(json.dumps(baseline, indent=2) + "\n")
+
+    def summary(self) -> list[str]:
+        """A line per result, flagging regressions."""
+        lines = []
+        for result in self.results:
+            line = f"{result.name:56} {result.value:14.1f} {result.unit}"
+            baseline = self.baseline.get(result.name)
+            if baseline is not None:
+                line += f"  ({result.change(baseline):+.1%} vs baseline)"
+                if result.regressed(baseline, self.tolerance):
+                    line += "  REGRESSION"
+            lines.append(line)
+        return lines
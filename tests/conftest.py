@@ -1,9 +1,10 @@
 import logging
 import logging.handlers
+from pathlib import Path
 
 import pytest
 
-from tests import log_queue, queue_handler
+from tests import benchmarking, log_queue, queue_handler
 
 logger = logging.getLogger(__name__)
 
@@ -41,3 +42,76 @@ def _setup_logging(pytestconfig):
     queue_handler.close()
 
     logging.root.handlers = original_handlers
+
+
+_BENCH_RESULTS = pytest.StashKey[benchmarking.BenchmarkResults]()
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup("benchmarks")
+    group.addoption(
+        "--bench-output",
+        default=benchmarking.DEFAULT_OUTPUT,
+        help="where to write benchmark results, relative to the rootdir",
+    )
+    group.addoption(
+        "--bench-baseline",
+        default=str(benchmarking.DEFAULT_BASELINE),
+        help="the stored baseline to compare benchmark results with",
+    )
+    group.addoption(
+        "--bench-tolerance",
+        type=float,
+        default=benchmarking.DEFAULT_TOLERANCE,
+        help="relative change beyond which a result is a regression",
+    )
+    group.addoption(
+        "--bench-save-baseline",
+        action="store_true",
+        help="store this session's benchmark results as the baseline",
+    )
+    group.addoption(
+        "--bench-strict",
+        action="store_true",
+        help="fail the session if a benchmark regressed",
+    )
+
+
+def pytest_configure(config):
+    baseline = benchmarking.load_baseline(Path(config.getoption("--bench-baseline")))
+    tolerance = config.getoption("--bench-tolerance")
+    config.stash[_BENCH_RESULTS] = benchmarking.BenchmarkResults(baseline, tolerance)
+
+
+@pytest.fixture()
+def bench(pytestconfig) -> benchmarking.BenchmarkResults:
+    """Record numbers to track across runs, see `tests.benchmarking`."""
+    return pytestconfig.stash[_BENCH_RESULTS]
+
+
+def pytest_sessionfinish(session, exitstatus):
+    config = session.config
+    results = config.stash[_BENCH_RESULTS]
+    if not results.results:
+        return
+    results.write(config.rootpath / config.getoption("--bench-output"))
+    if config.getoption("--bench-save-baseline"):
+        results.save_baseline(Path(config.getoption("--bench-baseline")))
+    elif config.getoption("--bench-strict") and results.regressions():
+        session.exitstatus = pytest.ExitCode.TESTS_FAILED
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    results = config.stash[_BENCH_RESULTS]
+    if not results.results:
+        return
+    terminalreporter.section("benchmarks")
+    for line in results.summary():
+        terminalreporter.write_line(line)
+    regressions = results.regressions()
+    if regressions:
+        terminalreporter.write_line(
+            f"{len(regressions)} benchmark(s) regressed by more than "
+            f"{results.tolerance:.0%}",
+            red=True,
+        )
@@ -2,13 +2,122 @@
 
 import logging
 import random
-import time
+from collections.abc import Iterable, Sequence
 
 import netcode
-from tests import parallel
+from netcode import parallel
+from netcode.tick import Updatable
 
 logger = logging.getLogger(__name__)
 
+LOOPBACK_ADDRESS = ("127.0.0.1", 40000)
+LOOPBACK_TICK = 1 / 60
+
+
+def connect_clients(
+    server: netcode.Server,
+    clients: list[netcode.Client],
+    update_interval: float = 1 / 60,
+    max_updates: int = 100,
+) -> float:
+    """Update the server and clients until every client is connected.
+
+    Returns the elapsed time of the last update so callers can keep the same clock.
+    """
+    for client in clients:
+        client.connect()
+
+    loop = netcode.TickLoop(server, *clients, tick_hz=1 / update_interval)
+    for updates, elapsed_time in enumerate(loop, start=1):
+        if all(client.is_connected() for client in clients):
+            return elapsed_time
+        if updates == max_updates:
+            break
+
+    msg = f"{server.num_connected_clients()}/{len(clients)} clients connected"
+    raise TimeoutError(msg)
+
+
+def run_loopback(
+    network: netcode.LoopbackNetwork,
+    server: Updatable,
+    clients: Sequence[Updatable],
+    ticks: int = 1,
+    interval: float = LOOPBACK_TICK,
+) -> float:
+    """Advance `network` by `ticks` ticks, updating the clients, then the server.
+
+    Returns the time of the last tick.
+    """
+    now = network.time
+    for _ in range(ticks):
+        now = network.advance(interval)
+        for client in clients:
+            client.update(now)
+        server.update(now)
+    return now
+
+
+def connect_loopback(
+    network: netcode.LoopbackNetwork,
+    server: netcode.Server,
+    clients: Sequence[netcode.Client],
+    max_ticks: int = 600,
+) -> int:
+    """Connect `clients` to `server` over `network`.
+
+    Returns how many ticks it took.
+    """
+    for client in clients:
+        client.connect()
+    for ticks in range(1, max_ticks + 1):
+        run_loopback(network, server, clients)
+        if all(client.is_connected() for client in clients):
+            return ticks
+
+    msg = f"{server.num_connected_clients()}/{len(clients)} clients connected"
+    raise TimeoutError(msg)
+
+
+def connected_loopback(
+    client_ids: Iterable[int] = (1,),
+    *,
+    conditions: netcode.NetworkConditions | None = None,
+    admission: netcode.AdmissionControl | None = None,
+    coalesce: bool = False,
+    reliable: bool = False,
+    connect: bool = True,
+) -> tuple[netcode.LoopbackNetwork, netcode.Server, list[netcode.Client]]:
+    """A server and a client per id on a new `LoopbackNetwork`, connected.
+
+    `conditions` apply to what the clients send and receive. With `connect=False`
+    the clients have not started connecting yet.
+    """
+    network = netcode.LoopbackNetwork()
+    server = netcode.Server(
+        LOOPBACK_ADDRESS,
+        0xDEADBEEF,
+        netcode.generate_key(),
+        network=network,
+        admission=admission,
+        coalesce=coalesce,
+        reliable=reliable,
+    )
+    clients = [
+        netcode.Client(
+            server.token(client_id),
+            network=network,
+            send_conditions=conditions,
+            recv_conditions=conditions,
+            coalesce=coalesce,
+            reliable=reliable,
+        )
+        for client_id in client_ids
+    ]
+    if connect:
+        connect_loopback(network, server, clients)
+    return network, server, clients
+
 
 class ServerProcess(parallel.SafeProcess):
     """Process that runs a server."""
@@ -46,13 +155,11 @@ class ServerProcess(parallel.SafeProcess):
 
         assert self._stop_event is not None
 
-        start_time = time.monotonic()
-        while not self._stop_event.is_set():
-            elapsed_time = time.monotonic() - start_time
-            # self.server.update(elapsed_time)
-
-            # FIXME: deduct the time spent updating and receiving
-            time.sleep(self.update_interval)
+        loop = netcode.TickLoop(tick_hz=1 / self.update_interval)
+        for _elapsed_time in loop:
+            # self.server.update(_elapsed_time)
+            if self._stop_event.is_set():
+                break
 
         logger.info(f"'{self.name}' stopped")
 
@@ -83,16 +190,15 @@ class ClientProcess(parallel.SafeProcess):
 
         assert self._stop_event is not None
 
-        start_time = time.monotonic()
-        while not self._stop_event.is_set():
-            elapsed_time = time.monotonic() - start_time
-            self.client.update(elapsed_time)
+        loop = netcode.TickLoop(self.client, tick_hz=1 / self.update_interval)
+        for _elapsed_time in loop:
             # while True:
             #     data = self.client.recv()
             #     if data is None:
             #         break
-            #     self.result_queue.put((data, elapsed_time))
-            time.sleep(self.update_interval)
+            #     self.result_queue.put((data, _elapsed_time))
+            if self._stop_event.is_set():
+                break
 
         logger.info(f"'{self.name}' stopped")
 
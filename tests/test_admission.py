@@ -0,0 +1,109 @@
+import os
+import socket
+import struct
+import time
+
+import pytest
+
+import netcode
+from tests import helpers
+
+PROTOCOL_ID = 0xDEADBEEF
+
+
+def _request(protocol_id: int = PROTOCOL_ID, expire_in: int = 60) -> bytes:
+    """A connection request that passes the header checks but not decryption."""
+    header = struct.pack("<QQ", protocol_id, int(time.time()) + expire_in)
+    # nonce and encrypted token, random so every request has its own MAC
+    token = os.urandom(24 + 1024)
+    return b"\x00" + netcode.NETCODE_VERSION + header + token
+
+
+def _deliver(server: netcode.Server, packets: list[tuple[socket.socket, bytes]]):
+    for sock, packet in packets:
+        sock.sendto(packet, server.address())
+    time.sleep(0.05)
+    server.update(0.0)
+
+
+def _rejected(server: netcode.Server) -> dict[str, int]:
+    prefix = "connection_requests_rejected_"
+    return {
+        key.removeprefix(prefix): value
+        for key, value in server.metrics().items()
+        if key.startswith(prefix) and value
+    }
+
+
+@pytest.fixture
+def sockets():
+    socks = [socket.socket(socket.AF_INET, socket.SOCK_DGRAM) for _ in range(2)]
+    yield socks
+    for sock in socks:
+        sock.close()
+
+
+def test_header_checks(sockets):
+    server = netcode.Server(("127.0.0.1", 0), PROTOCOL_ID, netcode.generate_key())
+    sock = sockets[0]
+    valid = _request()
+    version = len(netcode.NETCODE_VERSION)
+    _deliver(
+        server,
+        [
+            (sock, valid[:100]),
+            (sock, valid[:1] + b"X" * version + valid[1 + version :]),
+            (sock, _request(protocol_id=PROTOCOL_ID + 1)),
+            (sock, _request(expire_in=-10)),
+            (sock, valid),
+        ],
+    )
+    assert _rejected(server) == {"malformed": 2, "protocol_id": 1, "expired": 1}
+    assert server.metrics()["connection_requests_rejected"] == 4  # noqa: PLR2004
+
+    client = netcode.Client(server.token(1))
+    helpers.connect_clients(server, [client])
+
+
+def test_source_rate_limit(sockets):
+    admission = netcode.AdmissionControl(
+        source_rate=1.0, source_burst=5, handshakes_per_tick=None
+    )
+    server = netcode.Server(
+        ("127.0.0.1", 0), PROTOCOL_ID, netcode.generate_key(), admission=admission
+    )
+    _deliver(server, [(sockets[0], _request()) for _ in range(20)])
+    # both sockets share an IP, and so a bucket
+    _deliver(server, [(sockets[1], _request())])
+    assert _rejected(server) == {"rate_limited": 16}
+
+
+def test_handshake_budget(sockets):
+    admission = netcode.AdmissionControl(source_rate=None, handshakes_per_tick=8)
+    server = netcode.Server(
+        ("127.0.0.1", 0), PROTOCOL_ID, netcode.generate_key(), admission=admission
+    )
+    _deliver(server, [(sockets[0], _request()) for _ in range(20)])
+    assert _rejected(server) == {"over_budget": 12}
+
+
+def test_replayed_token(sockets):
+    admission = netcode.AdmissionControl(source_rate=None, handshakes_per_tick=None)
+    server = netcode.Server(
+        ("127.0.0.1", 0), PROTOCOL_ID, netcode.generate_key(), admission=admission
+    )
+    request = _request()
+    # resending from the same address is what clients do; another address is not
+    _deliver(server, [(sockets[0], request), (sockets[0], request)])
+    _deliver(server, [(sockets[1], request)])
+    assert _rejected(server) == {"replayed": 1}
+
+
+def test_admission_control_arguments():
+    admission = netcode.AdmissionControl(handshakes_per_tick=0)
+    assert admission.handshakes_per_tick is None
+    assert repr(admission).startswith("AdmissionControl(source_rate=20.0,")
+    with pytest.raises(ValueError, match="source_rate"):
+        netcode.AdmissionControl(source_rate=0)
+    with pytest.raises(ValueError, match="source_burst"):
+        netcode.AdmissionControl(source_burst=0.5)
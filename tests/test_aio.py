@@ -0,0 +1,54 @@
+import asyncio
+
+import pytest
+
+import netcode
+from netcode.aio import AsyncClient, AsyncServer
+
+
+def test_async_echo():
+    async def main() -> None:
+        server = netcode.Server(("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key())
+        token = server.token(1)
+        async with AsyncServer(server) as async_server:
+
+            async def echo() -> None:
+                async for packet, client_index in async_server:
+                    async_server.send(packet.upper(), client_index)
+
+            echo_task = asyncio.create_task(echo())
+
+            client = AsyncClient(token)
+            async with asyncio.timeout(5):
+                await client.connect()
+            assert client.endpoint.is_connected()
+
+            for message in (b"hello", b"world"):
+                client.send(message)
+                async with asyncio.timeout(5):
+                    assert await client.recv() == message.upper()
+
+            await client.disconnect()
+
+        # closing the server ends the `async for`
+        async with asyncio.timeout(5):
+            await echo_task
+
+    asyncio.run(main())
+
+
+def test_async_client_connect_timeout():
+    async def main() -> None:
+        # nothing is listening at that address
+        token = netcode.ConnectToken(
+            [("127.0.0.1", 9)], 0xDEADBEEF, 1, netcode.generate_key()
+        )
+        client = AsyncClient(token, update_interval=1 / 100)
+        try:
+            with pytest.raises(TimeoutError):
+                async with asyncio.timeout(0.2):
+                    await client.connect()
+        finally:
+            client.close()
+
+    asyncio.run(main())
@@ -0,0 +1,56 @@
+import struct
+import time
+
+import pytest
+
+import netcode
+from tests import helpers
+
+
+def test_recv_into_rejects_small_buffer():
+    server = netcode.Server(("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key())
+    with pytest.raises(ValueError, match="MAX_PACKET_SIZE"):
+        server.recv_into(bytearray(16))
+    with pytest.raises(ValueError, match="writable"):
+        server.recv_into(bytes(netcode.MAX_PACKET_SIZE))
+    assert server.recv_into(bytearray(netcode.MAX_PACKET_SIZE)) is None
+
+
+def test_packet_arena():
+    server = netcode.Server(("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key())
+    client = netcode.Client(server.token(1))
+    elapsed_time = helpers.connect_clients(server, [client])
+
+    server_arena = netcode.ServerPacketArena(server, 2 * netcode.MAX_PACKET_SIZE)
+    client_arena = netcode.ClientPacketArena(client)
+
+    for i in range(3):
+        client.send(struct.pack("<IH", i, 7))
+
+    received: list[tuple[int, int]] = []
+    for _ in range(100):
+        time.sleep(1 / 60)
+        server_arena.update(elapsed_time)
+        # only two packets fit, the third one stays queued for the next tick
+        assert len(server_arena) <= 2  # noqa: PLR2004
+        for i, end in enumerate(server_arena.ends):
+            start = server_arena.ends[i - 1] if i else 0
+            assert end - start == struct.calcsize("<IH")
+            received.append(struct.unpack_from("<IH", server_arena.buffer, start))
+        if len(received) == 3:  # noqa: PLR2004
+            break
+    assert received == [(0, 7), (1, 7), (2, 7)]
+
+    client_index = server_arena.client_indices[0]
+    idx = server.client_index(client_index)
+    assert idx is not None
+    server.send(b"pong", idx)
+
+    for _ in range(100):
+        time.sleep(1 / 60)
+        if client_arena.update(elapsed_time):
+            break
+    packet = client_arena.recv()
+    assert packet is not None
+    assert bytes(packet) == b"pong"
+    assert client_arena.recv() is None
@@ -0,0 +1,94 @@
+import json
+import random
+
+import pytest
+
+import netcode
+from netcode.compression import (
+    CompressedClient,
+    CompressedServer,
+    Compression,
+    train_dictionary,
+)
+from tests import helpers
+
+
+def _snapshot(rng: random.Random, tick: int) -> bytes:
+    entities = [
+        {"id": i, "x": round(rng.uniform(0, 100), 1), "hp": 100, "state": "idle"}
+        for i in range(8)
+    ]
+    return json.dumps({"tick": tick, "entities": entities}).encode()
+
+
+def test_round_trip_and_stats():
+    rng = random.Random(1)
+    compression = Compression(min_size=16)
+    snapshot = _snapshot(rng, 0)
+    tiny = b"tiny"
+    incompressible = rng.randbytes(200)
+
+    for data in (snapshot, tiny, incompressible):
+        assert compression.decompress(compression.compress(data)) == data
+    stats = compression.stats()
+    assert (stats.sent, stats.compressed, stats.skipped) == (3, 1, 1)
+    assert stats.received == 3  # noqa: PLR2004
+    assert stats.ratio < 1
+    assert stats.compress_seconds > 0
+
+    assert compression.decompress(b"\x01not deflate") is None
+    assert compression.decompress(b"") is None
+    assert compression.stats().errors == 2  # noqa: PLR2004
+
+
+def test_trained_dictionary():
+    rng = random.Random(2)
+    dictionary = train_dictionary(_snapshot(rng, tick) for tick in range(200))
+    assert 0 < len(dictionary) <= 32 * 1024
+
+    ratios = []
+    for compression in (Compression(), Compression(dictionary)):
+        for tick in range(200, 250):
+            snapshot = _snapshot(rng, tick)
+            assert compression.decompress(compression.compress(snapshot)) == snapshot
+        ratios.append(compression.stats().ratio)
+    assert ratios[1] < ratios[0]
+
+    other = Compression(b"another dictionary")
+    assert other.protocol_id(0xDEADBEEF) != Compression(dictionary).protocol_id(
+        0xDEADBEEF
+    )
+    with pytest.raises(ValueError, match="dictionary"):
+        Compression(bytes(64 * 1024))
+
+
+def test_compressed_endpoints():
+    compression = Compression(min_size=0)
+    protocol_id = compression.protocol_id(0xDEADBEEF)
+    network = netcode.LoopbackNetwork()
+    server = CompressedServer(
+        netcode.Server(
+            helpers.LOOPBACK_ADDRESS,
+            protocol_id,
+            netcode.generate_key(),
+            network=network,
+        ),
+        compression,
+    )
+    client = CompressedClient(
+        netcode.Client(server.server.token(1), network=network),
+        Compression(min_size=0),
+    )
+    helpers.connect_loopback(network, server.server, [client.client])
+
+    message = b"hello " * 20
+    client.send(message)
+    server.update(network.advance(1 / 60))
+    payloads, client_indices = server.recv_many()
+    assert payloads == [message]
+    assert list(client_indices) == [int(server.server.clients[0])]
+
+    server.send_all(message)
+    client.update(network.advance(1 / 60))
+    assert client.recv() == message
+    assert compression.stats().compressed == 1
@@ -0,0 +1,56 @@
+import pytest
+
+import netcode
+from tests import helpers
+
+
+def _ticks_to_connect(conditions: netcode.NetworkConditions) -> int:
+    network, server, clients = helpers.connected_loopback(
+        conditions=conditions, connect=False
+    )
+    return helpers.connect_loopback(network, server, clients)
+
+
+def test_conditions_validation():
+    conditions = netcode.NetworkConditions(latency=0.05, loss=0.02, seed=7)
+    assert conditions.latency == 0.05  # noqa: PLR2004
+    assert conditions.bandwidth is None
+    assert "loss=0.02" in repr(conditions)
+    with pytest.raises(ValueError, match="probability"):
+        netcode.NetworkConditions(loss=1.5)
+    with pytest.raises(ValueError, match="seconds"):
+        netcode.NetworkConditions(latency=-1)
+    with pytest.raises(ValueError, match="bandwidth"):
+        netcode.NetworkConditions(bandwidth=0)
+
+
+def test_latency_delays_delivery():
+    network, server, [client] = helpers.connected_loopback(
+        conditions=netcode.NetworkConditions(latency=0.1)
+    )
+
+    client.send(b"ping")
+    sent_at = network.time
+    while (result := server.recv()) is None:
+        helpers.run_loopback(network, server, [client])
+        assert network.time - sent_at < 1
+    assert result[0] == b"ping"
+    assert network.time - sent_at >= 0.1  # noqa: PLR2004
+
+
+def test_latency_slows_down_connecting():
+    clean = _ticks_to_connect(netcode.NetworkConditions())
+    slow = _ticks_to_connect(netcode.NetworkConditions(latency=0.05))
+    assert slow > clean
+
+
+def test_total_loss_never_connects():
+    with pytest.raises(TimeoutError):
+        _ticks_to_connect(netcode.NetworkConditions(loss=1.0))
+
+
+def test_seeded_conditions_are_reproducible():
+    conditions = netcode.NetworkConditions(
+        latency=0.02, jitter=0.03, loss=0.3, duplicate=0.1, reorder=0.1, seed=42
+    )
+    assert _ticks_to_connect(conditions) == _ticks_to_connect(conditions)
@@ -0,0 +1,65 @@
+import math
+import threading
+
+import pytest
+
+import netcode
+from netcode import loadgen
+
+
+def test_percentiles():
+    samples = [i / 100 for i in range(1, 101)]
+    percentiles = loadgen.Percentiles.from_samples(reversed(samples))
+    assert percentiles == (100, 0.5, 0.9, 0.99, 1.0)
+
+    empty = loadgen.Percentiles.from_samples([])
+    assert empty.samples == 0
+    assert math.isnan(empty.p50)
+    assert str(empty) == "no samples"
+
+
+def test_payload_size_bounds():
+    key = netcode.generate_key()
+    with pytest.raises(ValueError, match="payload_size"):
+        loadgen.LoadGenerator(("127.0.0.1", 40000), 0xDEADBEEF, key, payload_size=4)
+
+
+def test_load_against_echo_server():
+    private_key = netcode.generate_key()
+    server = netcode.Server(("127.0.0.1", 0), 0xDEADBEEF, private_key)
+    stop = threading.Event()
+    echo = threading.Thread(target=loadgen.serve_echo, args=(server, 60.0, stop))
+    echo.start()
+    try:
+        generator = loadgen.LoadGenerator(
+            server.address(),
+            0xDEADBEEF,
+            private_key,
+            clients=20,
+            workers=2,
+            send_rate=20.0,
+            ramp_up=0.2,
+        )
+        report = generator.run(1.5)
+    finally:
+        stop.set()
+        echo.join()
+
+    assert report.connected == 20  # noqa: PLR2004
+    assert report.failed == 0
+    assert report.connect_latency.samples == 20  # noqa: PLR2004
+    assert report.sent > 0
+    assert 0 < report.rtt.samples <= report.sent
+    assert "message RTT" in str(report)
+
+
+def test_cli_arguments():
+    args = loadgen._parser().parse_args(
+        ["run", "[::1]:40000", "--protocol-id", "0x1234", "--clients", "5000"]
+    )
+    assert args.address == ("::1", 40000)
+    assert args.protocol_id == 0x1234  # noqa: PLR2004
+    assert args.clients == 5000  # noqa: PLR2004
+
+    with pytest.raises(SystemExit):
+        loadgen._parser().parse_args(["run", "40000"])
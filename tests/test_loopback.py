@@ -0,0 +1,73 @@
+import pytest
+
+import netcode
+from netcode import client_state
+from tests import helpers
+
+
+def test_loopback_client_server():
+    network = netcode.LoopbackNetwork()
+    server = netcode.Server(
+        ("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key(), network=network
+    )
+    client = netcode.Client(server.token(123), network=network)
+    assert network.endpoints() == 2  # noqa: PLR2004
+    with pytest.raises(OSError, match="file descriptor"):
+        server.fileno()
+
+    helpers.connect_loopback(network, server, [client])
+    assert client.state() == client_state.CONNECTED
+    assert server.num_connected_clients() == 1
+
+    client.send(b"Hello, server!")
+    helpers.run_loopback(network, server, [client])
+    result = server.recv()
+    assert result is not None
+    packet, client_index = result
+    assert packet == b"Hello, server!"
+    assert server.client_id(client_index) == 123  # noqa: PLR2004
+
+    server.send(b"Hello, client!", client_index)
+    helpers.run_loopback(network, server, [client])
+    assert client.recv() == b"Hello, client!"
+
+    del client
+    assert network.endpoints() == 1
+
+
+def test_loopback_many_clients_deterministic():
+    def run() -> tuple[int, list[int]]:
+        network, server, clients = helpers.connected_loopback(range(64), connect=False)
+        ticks = helpers.connect_loopback(network, server, clients)
+        for i, client in enumerate(clients):
+            client.send(i.to_bytes(2, "little"))
+        helpers.run_loopback(network, server, clients)
+        payloads, _client_indices = server.recv_many()
+        return ticks, [int.from_bytes(payload, "little") for payload in payloads]
+
+    # same inputs, same virtual clock: same outcome, every time
+    assert run() == run()
+    assert run()[1] == list(range(64))
+
+
+def test_loopback_address_in_use_and_drops():
+    network = netcode.LoopbackNetwork(queue_capacity=1)
+    key = netcode.generate_key()
+    server = netcode.Server(helpers.LOOPBACK_ADDRESS, 0xDEADBEEF, key, network=network)
+    with pytest.raises(OSError, match="already bound"):
+        netcode.Server(helpers.LOOPBACK_ADDRESS, 0xDEADBEEF, key, network=network)
+    with pytest.raises(ValueError, match="reuse_port"):
+        netcode.Server(
+            ("127.0.0.1", 0), 0xDEADBEEF, key, reuse_port=True, network=network
+        )
+
+    clients = [netcode.Client(server.token(i), network=network) for i in range(2)]
+    for client in clients:
+        client.connect()
+    # without server updates, its queue fills up after one packet
+    for _ in range(10):
+        time = network.advance(helpers.LOOPBACK_TICK)
+        for client in clients:
+            client.update(time)
+    assert network.in_flight() == 1
+    assert network.dropped() > 0
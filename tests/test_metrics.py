@@ -0,0 +1,114 @@
+import math
+import socket
+import urllib.request
+
+import netcode
+from tests import helpers
+
+
+def test_server_and_client_metrics():
+    network, server, [client] = helpers.connected_loopback()
+    for _ in range(10):
+        client.send(b"hello")
+    helpers.run_loopback(network, server, [client])
+    payloads, _client_indices = server.recv_many()
+    assert len(payloads) == 10  # noqa: PLR2004
+
+    metrics = server.metrics()
+    assert metrics["connected_clients"] == 1
+    assert metrics["connection_requests"] >= 1
+    assert metrics["connection_requests_rejected"] == 0
+    assert metrics["payloads_received"] == 10  # noqa: PLR2004
+    assert metrics["payload_packets_in"] == 10  # noqa: PLR2004
+    assert metrics["payloads_rejected"] == 0
+    assert metrics["packets_in"] > metrics["payload_packets_in"]
+    assert metrics["bytes_out"] > 0
+    histogram = metrics["update_seconds"]
+    assert len(histogram["counts"]) == len(histogram["buckets"]) + 1
+    assert sum(histogram["counts"]) > 0
+
+    # everything the client sent arrived, the server's last packets are in flight
+    client_metrics = client.metrics()
+    assert client_metrics["packets_out"] == metrics["packets_in"]
+    assert 0 < client_metrics["packets_in"] <= metrics["packets_out"]
+
+    table = server.client_metrics()
+    assert list(table["indices"]) == [int(index) for index in server.clients]
+    assert table["packets_in"][0] >= 10  # noqa: PLR2004
+    assert table["last_receive_age"][0] == 0
+
+    network.advance(1)
+    server.update(network.time)
+    assert math.isclose(server.client_metrics()["last_receive_age"][0], 1)
+
+
+def test_rejected_connection_requests_and_payloads():
+    network = netcode.LoopbackNetwork()
+    server = netcode.Server(
+        helpers.LOOPBACK_ADDRESS,
+        0xDEADBEEF,
+        netcode.generate_key(),
+        network=network,
+        max_clients=1,
+    )
+    clients = [netcode.Client(server.token(i), network=network) for i in range(2)]
+    for client in clients:
+        client.connect()
+    helpers.run_loopback(network, server, clients, 60)
+    assert server.metrics()["connection_requests_rejected"] > 0
+
+    udp_server = netcode.Server(("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key())
+    with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+        # a payload packet prefix followed by garbage that cannot decrypt
+        sock.sendto(b"\x15" + bytes(32), udp_server.address())
+    udp_server.update(0.1)
+    metrics = udp_server.metrics()
+    assert metrics["payload_packets_in"] == 1
+    assert metrics["payloads_rejected"] == 1
+
+
+def test_prometheus_export():
+    _network, server, _clients = helpers.connected_loopback()
+    text = netcode.metrics.prometheus_text(
+        server, labels={"shard": "0"}, per_client=True
+    )
+    assert "# TYPE netcode_server_packets_in_total counter" in text
+    assert 'netcode_server_connected_clients{shard="0"} 1\n' in text
+    assert 'netcode_server_update_seconds_bucket{shard="0",le="+Inf"}' in text
+    assert 'netcode_server_client_packets_in_total{shard="0",client_index=' in text
+
+    with netcode.metrics.serve(server, ("127.0.0.1", 0)) as exporter:
+        host, port = exporter.address
+        url = f"http://{host}:{port}/metrics"
+        with urllib.request.urlopen(url) as response:  # noqa: S310
+            assert response.headers["Content-Type"].startswith("text/plain")
+            body = response.read().decode()
+    assert "netcode_server_connected_clients 1\n" in body
+
+
+def test_prometheus_reliable_series():
+    network, server, [client] = helpers.connected_loopback(reliable=True)
+    (index,) = server.clients
+    for message in (b"hello", b"world"):
+        server.send_reliable(message, index)
+    client.send_reliable(b"not acked yet")
+    text = netcode.metrics.prometheus_text(client)
+    assert "# TYPE netcode_client_reliable_pending gauge\n" in text
+    assert "netcode_client_reliable_pending 1\n" in text
+    assert "reliable_rtt" not in text
+
+    helpers.run_loopback(network, server, [client], 10)
+    text = netcode.metrics.prometheus_text(server)
+    assert "# TYPE netcode_server_reliable_sent_total counter\n" in text
+    assert "netcode_server_reliable_sent_total 2\n" in text
+    assert "netcode_server_reliable_acked_total 2\n" in text
+    assert "netcode_server_reliable_resent_total 0\n" in text
+    assert "# TYPE netcode_server_reliable_ack_seconds histogram\n" in text
+    assert 'netcode_server_reliable_ack_seconds_bucket{le="+Inf"} 2\n' in text
+    assert "netcode_server_reliable_ack_seconds_count 2\n" in text
+    text = netcode.metrics.prometheus_text(client)
+    assert "netcode_client_reliable_delivered_total 2\n" in text
+    assert "netcode_client_reliable_pending 0\n" in text
+
+    plain = netcode.Server(("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key())
+    assert "reliable" not in netcode.metrics.prometheus_text(plain)
@@ -3,7 +3,7 @@ from typing import Any
 
 import pytest
 
-from tests.parallel import SafeProcess, SafeThread
+from netcode.parallel import SafeProcess, SafeThread
 
 
 @pytest.mark.parametrize(
@@ -141,6 +141,11 @@ def test_result(worker_class: type[SafeProcess] | type[SafeThread]) -> None:
 
     process.join()
 
+    process = worker_class(target=pow, args=(6, 2), kwargs={"mod": 5})
+    process.start()
+    process.join()
+    assert process.result_queue.get() == 1
+
 
 @pytest.mark.parametrize(
     "worker_class",
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+
+import netcode
+from tests import helpers
+
+
+def _run(
+    network: netcode.LoopbackNetwork,
+    server: netcode.Server,
+    client: netcode.Client,
+    ticks: int,
+) -> None:
+    for _ in range(ticks):
+        if client.is_connected():
+            client.send(b"hello")
+        helpers.run_loopback(network, server, [client])
+        server.recv_many()
+
+
+def test_profile_phases(tmp_path):
+    network, server, [client] = helpers.connected_loopback(connect=False)
+    client.connect()
+
+    _run(network, server, client, 5)
+    assert len(server.profile()["time"]) == 0
+
+    server.start_profiling(capacity=100)
+    _run(network, server, client, 120)
+    server.stop_profiling()
+    _run(network, server, client, 5)
+    assert client.is_connected()
+
+    # the ring buffer kept the last 100 updates
+    profile = server.profile()
+    assert len(profile["time"]) == 100  # noqa: PLR2004
+    assert list(profile["time"]) == sorted(profile["time"])
+    for row, duration in enumerate(profile["duration"]):
+        phases = sum(profile[phase][row] for phase in netcode.PROFILE_PHASES)
+        assert phases == pytest.approx(duration, abs=1e-6)
+    assert sum(profile["payload"]) > 0
+    assert sum(profile["socket_recv"]) > 0
+
+    spans = server.profile_spans()
+    assert set(spans["frame"]) == set(range(100))
+    assert {netcode.PROFILE_PHASES[phase] for phase in spans["phase"]} >= {
+        "socket_recv",
+        "payload",
+        "bookkeeping",
+    }
+
+    path = tmp_path / "trace.json"
+    netcode.profiling.save_chrome_trace(server, path)
+    events = json.loads(path.read_text())["traceEvents"]
+    updates = [event for event in events if event["name"] == "update"]
+    assert len(updates) == 100  # noqa: PLR2004
+    assert all(event["ph"] == "X" for event in updates)
+
+    with pytest.raises(ValueError, match="capacity"):
+        server.start_profiling(capacity=0)
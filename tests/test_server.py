@@ -1,4 +1,6 @@
+import threading
 import time
+from array import array
 
 import pytest
 
@@ -73,6 +75,158 @@ def test_client_server():
     pytest.fail("Did not receive expected messages")
 
 
+def test_recv_many():
+    server = netcode.Server(("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key())
+    clients = [netcode.Client(server.token(client_id)) for client_id in range(3)]
+    elapsed_time = helpers.connect_clients(server, clients)
+
+    for i, client in enumerate(clients):
+        client.send(f"Hello from {i}".encode())
+        client.send(b"again")
+
+    received: list[bytes] = []
+    indices: list[int] = []
+    for _ in range(100):
+        time.sleep(1 / 60)
+        server.update(elapsed_time)
+        payloads, client_indices = server.recv_many(max_packets=2)
+        assert len(payloads) <= 2  # noqa: PLR2004
+        assert len(payloads) == len(client_indices)
+        received.extend(payloads)
+        indices.extend(client_indices)
+        if len(received) == 2 * len(clients):
+            break
+
+    assert sorted(received) == sorted(
+        [f"Hello from {i}".encode() for i in range(3)] + [b"again"] * 3
+    )
+    assert {int(idx) for idx in server.clients} == set(indices)
+    for value in indices:
+        client_index = server.client_index(value)
+        assert client_index is not None
+        assert int(client_index) == value
+        server.send(b"ack", client_index)
+
+    acked: set[int] = set()
+    for _ in range(100):
+        time.sleep(1 / 60)
+        for i, client in enumerate(clients):
+            client.update(elapsed_time)
+            if client.recv_many():
+                acked.add(i)
+        if len(acked) == len(clients):
+            break
+    else:
+        pytest.fail("Clients did not receive their acks")
+
+    assert server.recv_many() == ([], array("Q"))
+
+
+def test_send_many():
+    server = netcode.Server(("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key())
+    clients = [netcode.Client(server.token(client_id)) for client_id in range(3)]
+    elapsed_time = helpers.connect_clients(server, clients)
+
+    by_id = {server.client_id(idx): idx for idx in server.clients}
+    sent = server.send_many(
+        [
+            (b"zero", by_id[0]),
+            (bytearray(b"one"), int(by_id[1])),
+            (memoryview(b"xtwo")[1:], by_id[2]),
+        ]
+    )
+    assert sent == 3  # noqa: PLR2004
+    sent = server.send_packed(
+        b"abcdef",
+        array("Q", [1, 3, 6]),
+        array("Q", [int(by_id[0]), int(by_id[1]), int(by_id[2])]),
+    )
+    assert sent == 3  # noqa: PLR2004
+
+    with pytest.raises(ValueError, match="out of order"):
+        server.send_packed(b"ab", array("Q", [2, 1]), array("Q", [0, 0]))
+    with pytest.raises(ValueError, match="same length"):
+        server.send_packed(b"ab", array("Q", [2]), array("Q", []))
+    # nothing is sent when any index is unknown, even a later one
+    with pytest.raises(ValueError, match="no connected client"):
+        server.send_many([(b"lost", by_id[0]), (b"lost", 1 << 40)])
+    with pytest.raises(ValueError, match="no connected client"):
+        server.send_packed(
+            b"ab", array("Q", [1, 2]), array("Q", [int(by_id[0]), 1 << 40])
+        )
+
+    expected = [[b"zero", b"a"], [b"one", b"bc"], [b"two", b"def"]]
+    received: list[list[bytes]] = [[], [], []]
+    for _ in range(100):
+        time.sleep(1 / 60)
+        for i, client in enumerate(clients):
+            client.update(elapsed_time)
+            received[i].extend(client.recv_many())
+        if received == expected:
+            break
+    assert received == expected
+
+
+def test_server_shared_between_threads():
+    server = netcode.Server(("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key())
+    client = netcode.Client(server.token(1))
+    elapsed_time = helpers.connect_clients(server, [client])
+
+    def network() -> None:
+        for _ in range(200):
+            server.update(elapsed_time)
+            client.update(elapsed_time)
+            client.send(b"ping")
+
+    thread = threading.Thread(target=network)
+    thread.start()
+    while thread.is_alive():
+        # used concurrently from this thread while the other one updates
+        assert server.num_connected_clients() == 1
+        server.recv_many()
+    thread.join()
+    assert client.is_connected()
+
+
+def test_background_thread():
+    server = netcode.Server(("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key())
+    client = netcode.Client(server.token(1))
+    elapsed_time = helpers.connect_clients(server, [client])
+
+    server.start_background(tick_hz=200)
+    assert server.is_background_running()
+    with pytest.raises(RuntimeError, match="already running"):
+        server.start_background()
+    with pytest.raises(RuntimeError, match="background"):
+        server.update(elapsed_time)
+
+    client.send(b"ping")
+    payloads: list[bytes] = []
+    for _ in range(100):
+        client.update(elapsed_time)
+        received, client_indices = server.recv_many(timeout=1 / 60)
+        payloads.extend(received)
+        if payloads:
+            break
+    assert payloads == [b"ping"]
+
+    # sent by the background thread, without touching the socket from here
+    server.send_many([(b"pong", client_indices[0])])
+    for _ in range(100):
+        time.sleep(1 / 60)
+        client.update(elapsed_time)
+        if client.recv() == b"pong":
+            break
+    else:
+        pytest.fail("Client did not receive the pong")
+
+    server.stop_background()
+    assert not server.is_background_running()
+    server.stop_background()
+    server.update(elapsed_time)
+    assert server.num_connected_clients() == 1
+
+
 def test_client_server_process():
 
     with (
@@ -103,3 +257,278 @@ def test_client_server_process():
 
         assert server.num_connected_clients() == 1
         assert client.state() == client_state.CONNECTED
+
+
+def test_client_index_hashable_and_client_table():
+    network, server, clients = helpers.connected_loopback(range(100, 103))
+
+    for client in clients:
+        client.send(b"hi")
+    helpers.run_loopback(network, server, clients)
+
+    state: dict[netcode.ClientIndex, int] = {}
+    while (result := server.recv()) is not None:
+        _packet, client_index = result
+        state[client_index] = state.get(client_index, 0) + 1
+    # a fresh ClientIndex object for the same slot finds the same entry
+    indices = sorted(server.clients)
+    assert sorted(state) == indices
+    assert all(state[idx] == 1 for idx in server.clients)
+    assert indices[0] < indices[1]
+    assert indices[0] != indices[1]
+    assert indices[0] != int(indices[0])
+
+    table = server.client_table()
+    assert len(table) == len(clients)
+    assert sorted(table.client_ids) == [100, 101, 102]
+    assert sorted(table.indices) == [int(idx) for idx in indices]
+    assert len(table.ips) == 16 * len(clients)
+    for i in range(len(table)):
+        assert table.address(i) == ("127.0.0.1", table.ports[i])
+    assert server.client_table() is table
+
+    server.disconnect(indices[0])
+    assert server.client_table() is not table
+    assert len(server.client_table()) == len(clients) - 1
+
+
+def test_poll_events():
+    network, server, clients = helpers.connected_loopback([10, 11], connect=False)
+    assert server.poll_events() == []
+
+    helpers.connect_loopback(network, server, clients)
+
+    events = server.poll_events()
+    assert [(kind, client_id) for kind, _idx, client_id, _data in events] == [
+        ("connect", 10),
+        ("connect", 11),
+    ]
+    assert all(len(data) == netcode.USER_DATA_BYTES for *_, data in events)
+    assert {idx for _kind, idx, _id, _data in events} == set(server.clients)
+    assert server.poll_events() == []
+
+    # the disconnect still names the client the server no longer knows
+    first_index = events[0][1]
+    server.disconnect(first_index)
+    assert server.poll_events() == [
+        ("disconnect", first_index, 10, bytes(netcode.USER_DATA_BYTES))
+    ]
+
+
+
+def test_poll_events_churn_within_one_update():
+    network, server, [first, second] = helpers.connected_loopback(
+        [10, 11], connect=False
+    )
+    first.connect()
+    second.connect()
+    now = network.time
+    while {first.state(), second.state()} != {"SENDING_CHALLENGE_RESPONSE"}:
+        now = network.advance(helpers.LOOPBACK_TICK)
+        server.update(now)
+        first.update(now)
+        second.update(now)
+
+    # the first client's response and disconnect, then the second's response,
+    # all arrive before the server's next update, which reuses the first slot
+    now = network.advance(1.0)
+    first.update(now)
+    first.disconnect()
+    second.update(now)
+    server.update(now)
+
+    events = server.poll_events()
+    assert [(kind, client_id) for kind, _idx, client_id, _data in events] == [
+        ("connect", 10),
+        ("disconnect", 10),
+        ("connect", 11),
+    ]
+    assert events[0][1] == events[2][1] == server.clients[0]
+
+
+def test_poll_events_churn_over_two_passes():
+    network, server, clients = helpers.connected_loopback(
+        [10, 11, 12], connect=False
+    )
+    for client in clients:
+        client.connect()
+    now = network.time
+    while {client.state() for client in clients} != {"SENDING_CHALLENGE_RESPONSE"}:
+        now = network.advance(helpers.LOOPBACK_TICK)
+        server.update(now)
+        for client in clients:
+            client.update(now)
+
+    # two clients answer the challenge and leave, then the third answers; the
+    # second one's disconnect and what follows it wait for the next update
+    now = network.advance(1.0)
+    first, second, third = clients
+    first.update(now)
+    first.disconnect()
+    second.update(now)
+    second.disconnect()
+    third.update(now)
+    server.update(now)
+    events = server.poll_events()
+    assert [(kind, client_id) for kind, _idx, client_id, _data in events] == [
+        ("connect", 10),
+        ("disconnect", 10),
+        ("connect", 11),
+    ]
+
+    server.update(network.advance(helpers.LOOPBACK_TICK))
+    events = server.poll_events()
+    assert [(kind, client_id) for kind, _idx, client_id, _data in events] == [
+        ("disconnect", 11),
+        ("connect", 12),
+    ]
+
+
+def test_groups():
+    network, server, clients = helpers.connected_loopback(range(3))
+    red, blue = server.clients[:2], server.clients[2:]
+
+    for index in red:
+        assert server.add_to_group("red", index)
+    assert not server.add_to_group("red", int(red[0]))
+    assert server.add_to_group("blue", blue[0])
+    assert server.groups() == ["blue", "red"]
+    assert server.group_members("red") == red
+
+    assert server.send_group("red", b"red team") == 2  # noqa: PLR2004
+    assert server.send_group("nobody", b"lost") == 0
+    helpers.run_loopback(network, server, clients)
+    received = sorted(client.recv_many() for client in clients)
+    assert received == [[], [b"red team"], [b"red team"]]
+
+    # leaving the last group removes it, disconnecting leaves them all
+    assert server.remove_from_group("blue", blue[0])
+    assert not server.remove_from_group("blue", blue[0])
+    server.disconnect(red[0])
+    assert server.groups() == ["red"]
+    assert server.group_members("red") == red[1:]
+
+    with pytest.raises(ValueError, match="no connected client"):
+        server.add_to_group("red", red[0])
+
+
+def test_coalesce():
+    network, server, clients = helpers.connected_loopback(range(2), coalesce=True)
+    messages = [i.to_bytes(2, "little") * 10 for i in range(100)]
+
+    sent = network.sent_packets()
+    for client in clients:
+        for message in messages:
+            client.send(message)
+    helpers.run_loopback(network, server, clients)
+    # 100 messages of 20 bytes fit in 2 packets per client
+    assert network.sent_packets() - sent < 10  # noqa: PLR2004
+    payloads, client_indices = server.recv_many(max_packets=150)
+    more_payloads, more_indices = server.recv_many()
+    payloads += more_payloads
+    client_indices += more_indices
+    for index in server.clients:
+        assert [
+            payload
+            for payload, value in zip(payloads, client_indices, strict=True)
+            if value == int(index)
+        ] == messages
+
+    first = server.clients[0]
+    for index in server.clients:
+        server.send(b"to one", index)
+    server.send_all(b"to all")
+    server.add_to_group("first", first)
+    server.send_group("first", b"to group")
+    server.flush()
+    helpers.run_loopback(network, server, clients)
+    received = sorted(client.recv_many() for client in clients)
+    assert received == [[b"to one", b"to all"], [b"to one", b"to all", b"to group"]]
+
+    with pytest.raises(ValueError, match="coalesced message"):
+        clients[0].send(bytes(netcode.MAX_PACKET_SIZE))
+    with pytest.raises(ValueError, match="coalesced message"):
+        server.send_all(bytes(netcode.MAX_PACKET_SIZE))
+
+
+def test_reliable():
+    lossy = netcode.NetworkConditions(latency=0.02, loss=0.3, reorder=0.1, seed=1)
+    network, server, [client] = helpers.connected_loopback(
+        conditions=lossy, reliable=True
+    )
+    (index,) = server.clients
+    messages = [b"reliable %d" % i for i in range(100)]
+
+    to_client: list[bytes] = []
+    to_server: list[bytes] = []
+    for message in messages:
+        server.send_reliable(message, index)
+        client.send_reliable(message)
+        server.send(b"unreliable", index)
+        client.send(b"unreliable")
+    for _ in range(600):
+        helpers.run_loopback(network, server, [client])
+        to_client += client.recv_many()
+        to_server += server.recv_many()[0]
+        acked = server.metrics()["reliable_acked"], client.metrics()["reliable_acked"]
+        if acked == (len(messages), len(messages)):
+            break
+    assert [payload for payload in to_client if payload != b"unreliable"] == messages
+    assert [payload for payload in to_server if payload != b"unreliable"] == messages
+    # most unreliable payloads made it, without a header byte
+    assert 30 < to_client.count(b"unreliable") < 100  # noqa: PLR2004
+
+    metrics = server.metrics()
+    assert metrics["reliable_sent"] == len(messages)
+    assert metrics["reliable_resent"] > 0
+    assert metrics["reliable_delivered"] == len(messages)
+    assert client.metrics()["reliable_delivered"] == len(messages)
+    assert client.metrics()["reliable_rtt"] >= 0.04  # noqa: PLR2004
+    table = server.client_metrics()
+    assert list(table["reliable_sent"]) == [len(messages)]
+    assert table["reliable_rtt"][0] >= 0.04  # noqa: PLR2004
+
+    with pytest.raises(RuntimeError, match="not acked yet"):
+        for _ in range(257):
+            client.send_reliable(b"queued")
+    with pytest.raises(ValueError, match="reliable message"):
+        server.send_reliable(bytes(netcode.MAX_PACKET_SIZE), index)
+    with pytest.raises(RuntimeError, match="reliable=True"):
+        netcode.Client(server.token(2)).send_reliable(b"")
+
+
+def test_server_config():
+    network = netcode.LoopbackNetwork()
+    server = netcode.Server(
+        helpers.LOOPBACK_ADDRESS,
+        0xDEADBEEF,
+        netcode.generate_key(),
+        network=network,
+        max_clients=2,
+        keep_alive_interval=0.5,
+        num_disconnect_packets=2,
+        token_timeout_seconds=1,
+    )
+    clients = [
+        netcode.Client(server.token(i), network=network, send_interval=0.05)
+        for i in range(3)
+    ]
+    for client in clients:
+        client.connect()
+    helpers.run_loopback(network, server, clients, 120)
+    assert server.num_connected_clients() == 2  # noqa: PLR2004
+    assert sum(client.is_connected() for client in clients) == 2  # noqa: PLR2004
+
+    # a client that goes silent is reclaimed after the token's timeout
+    silent = next(client for client in clients if client.is_connected())
+    helpers.run_loopback(
+        network, server, [client for client in clients if client is not silent], 90
+    )
+    assert server.num_connected_clients() == 1
+
+    with pytest.raises(ValueError, match="max_clients"):
+        netcode.Server(("127.0.0.1", 0), 0, netcode.generate_key(), max_clients=0)
+    with pytest.raises(ValueError, match="keep_alive_interval"):
+        netcode.Server(
+            ("127.0.0.1", 0), 0, netcode.generate_key(), keep_alive_interval=0
+        )
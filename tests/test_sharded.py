@@ -0,0 +1,83 @@
+import socket
+import time
+
+import pytest
+
+import netcode
+
+pytestmark = pytest.mark.skipif(
+    not hasattr(socket, "SO_REUSEPORT"), reason="needs SO_REUSEPORT"
+)
+
+
+def _echo(
+    server: netcode.Server, packet: bytes, client_index: netcode.ClientIndex
+) -> None:
+    server.send(packet, client_index)
+
+
+def _connect(clients: list[netcode.Client]) -> float:
+    for client in clients:
+        client.connect()
+    start_time = time.monotonic()
+    for _ in range(200):
+        elapsed_time = time.monotonic() - start_time
+        for client in clients:
+            client.update(elapsed_time)
+        if all(client.is_connected() for client in clients):
+            return elapsed_time
+        time.sleep(1 / 60)
+    msg = "clients did not connect"
+    raise TimeoutError(msg)
+
+
+def test_sharded_server():
+    with netcode.ShardedServer(
+        ("127.0.0.1", 0), 0xDEADBEEF, netcode.generate_key(), workers=2, handler=_echo
+    ) as sharded:
+        assert sharded.listen_address[1] != 0
+        clients = [netcode.Client(sharded.token(i)) for i in range(8)]
+        elapsed_time = _connect(clients)
+
+        for i, client in enumerate(clients):
+            client.send(i.to_bytes(4, "little"))
+        echoed: dict[int, bytes] = {}
+        for _ in range(200):
+            time.sleep(1 / 60)
+            elapsed_time += 1 / 60
+            for i, client in enumerate(clients):
+                client.update(elapsed_time)
+                if (packet := client.recv()) is not None:
+                    echoed[i] = packet
+            if len(echoed) == len(clients):
+                break
+        assert echoed == {i: i.to_bytes(4, "little") for i in range(len(clients))}
+
+        assert sharded.num_connected_clients() == len(clients)
+        listed = sharded.clients()
+        assert sorted(client.client_id for client in listed) == list(range(8))
+        assert {client.address[1] for client in listed} == {
+            client.address()[1] for client in clients
+        }
+
+
+def test_sharded_server_restarts_dead_shard():
+    with netcode.ShardedServer(
+        ("127.0.0.1", 0),
+        0xDEADBEEF,
+        netcode.generate_key(),
+        workers=2,
+        supervise_interval=0.05,
+    ) as sharded:
+        victim = sharded._shards[0]  # noqa: SLF001
+        victim.kill()
+        for _ in range(100):
+            time.sleep(0.05)
+            if sharded.restarts:
+                break
+        assert sharded.restarts == 1
+        assert sharded._shards[0] is not victim  # noqa: SLF001
+
+        client = netcode.Client(sharded.token(1))
+        _connect([client])
+        assert client.is_connected()
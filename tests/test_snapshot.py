@@ -0,0 +1,77 @@
+import random
+
+import pytest
+
+import netcode
+from netcode.snapshot import SnapshotClient, SnapshotServer
+from tests import helpers
+
+
+def _connected(
+    num_clients: int, conditions: netcode.NetworkConditions | None = None
+) -> tuple[netcode.LoopbackNetwork, SnapshotServer, list[SnapshotClient]]:
+    network, server, clients = helpers.connected_loopback(
+        range(num_clients), conditions=conditions
+    )
+    return network, SnapshotServer(server), [SnapshotClient(c) for c in clients]
+
+
+def test_deltas_under_loss():
+    lossy = netcode.NetworkConditions(loss=0.3, seed=1)
+    network, server, clients = _connected(4, lossy)
+    rng = random.Random(1)
+    world = {field: bytes(8) for field in range(40)}
+    sent = {}
+
+    for tick in range(100):
+        for field in rng.sample(range(40), 4):
+            world[field] = rng.randbytes(8)
+        if tick % 25 == 0:
+            del world[min(world)]
+            world[1000 + tick] = b"spawned"
+        sequence = server.send_snapshot(world)
+        sent[sequence] = dict(world)
+        helpers.run_loopback(network, server, clients)
+
+    for client in clients:
+        assert client.sequence is not None
+        assert client.sequence > sequence - 10  # noqa: PLR2004
+        assert client.snapshot == sent[client.sequence]
+    stats = server.stats()
+    assert stats.sent == 400  # noqa: PLR2004
+    assert stats.full < stats.sent / 4
+    assert stats.ratio < 0.5  # noqa: PLR2004
+
+
+def test_full_when_delta_is_larger():
+    network, server, [client] = _connected(1)
+    server.send_snapshot({field: b"x" for field in range(200)})
+    helpers.run_loopback(network, server, [client])
+
+    # 199 removed fields take more room than the one field left
+    sequence = server.send_snapshot({0: b"y"})
+    client.update(network.advance(1 / 60))
+    assert client.sequence == sequence
+    assert client.snapshot == {0: b"y"}
+    assert server.stats().full == 2  # noqa: PLR2004
+
+    with pytest.raises(ValueError, match="history"):
+        SnapshotClient(client.client, history=0)
+
+
+def test_other_payloads_pass_through():
+    network, server, [client] = _connected(1)
+    client.send(b"hello")
+    server.send_snapshot({1: b"state"})
+    helpers.run_loopback(network, server, [client])
+
+    payload, client_index = server.recv()
+    assert payload == b"hello"
+    server.send(b"world", client_index)
+    client.update(network.advance(1 / 60))
+    assert client.recv_many() == [b"world"]
+    assert client.snapshot == {1: b"state"}
+    assert server.recv() is None
+
+    with pytest.raises(ValueError, match="fit in a packet"):
+        server.send_snapshot({1: bytes(netcode.MAX_PACKET_SIZE)})
@@ -0,0 +1,82 @@
+import time
+
+import pytest
+
+import netcode
+
+TICK_HZ = 100
+INTERVAL = 1 / TICK_HZ
+
+
+class Recorder:
+    def __init__(self) -> None:
+        self.times: list[float] = []
+
+    def update(self, time: float) -> None:
+        self.times.append(time)
+
+
+def test_fixed_rate_without_drift():
+    recorder = Recorder()
+    loop = netcode.TickLoop(recorder, tick_hz=TICK_HZ, start_time=10.0)
+
+    start = time.perf_counter()
+    for tick, now in enumerate(loop):
+        assert now == pytest.approx(10.0 + tick * INTERVAL)
+        # work that would add up to 25 ticks of drift with a plain sleep
+        time.sleep(INTERVAL / 2)
+        if tick == 49:  # noqa: PLR2004
+            break
+    elapsed = time.perf_counter() - start
+
+    assert len(recorder.times) == 50  # noqa: PLR2004
+    assert elapsed == pytest.approx(50 * INTERVAL, rel=0.2)
+    stats = loop.stats()
+    assert stats.ticks == 50  # noqa: PLR2004
+    assert stats.skipped == 0
+    assert stats.mean_busy >= INTERVAL / 2
+
+
+@pytest.mark.parametrize(
+    ("policy", "max_catch_up", "skipped"),
+    [("catch_up", 5, 0), ("catch_up", 0, 3), ("skip", 5, 3)],
+)
+def test_overrun_policy(policy, max_catch_up, skipped):
+    recorder = Recorder()
+    loop = netcode.TickLoop(
+        recorder, tick_hz=TICK_HZ, policy=policy, max_catch_up=max_catch_up
+    )
+
+    for tick, _now in enumerate(loop):
+        if tick == 2:  # noqa: PLR2004
+            # stall past the deadlines of ticks 3 to 6
+            time.sleep(4.5 * INTERVAL)
+        if len(recorder.times) == 10:  # noqa: PLR2004
+            loop.stop()
+
+    stats = loop.stats()
+    assert stats.skipped == skipped
+    assert stats.overruns >= 1
+    assert stats.max_lateness >= (INTERVAL / 4 if skipped else 3 * INTERVAL)
+    ticks = [round(t / INTERVAL) for t in recorder.times]
+    assert ticks == list(range(3)) + list(range(3 + skipped, 10 + skipped))
+
+
+def test_run_until_stopped():
+    loop = netcode.TickLoop(tick_hz=1000)
+    times: list[float] = []
+
+    def callback(now: float) -> None:
+        times.append(now)
+        if len(times) == 5:  # noqa: PLR2004
+            loop.stop()
+
+    loop.run(callback)
+    assert len(times) == 5  # noqa: PLR2004
+
+    with pytest.raises(ValueError, match="policy"):
+        netcode.TickLoop(policy="fast")  # type: ignore[arg-type]
+    with pytest.raises(ValueError, match="max_catch_up"):
+        netcode.TickLoop(max_catch_up=-1)
+    with pytest.raises(ValueError, match="spin"):
+        netcode.TickLoop(spin=-0.001)
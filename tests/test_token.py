@@ -1,4 +1,7 @@
+import pytest
+
 import netcode
+from tests import helpers
 
 
 def test_generate_key():
@@ -29,3 +32,64 @@ def test_token():
     assert bytes(connect_token_2)
     assert len(bytes(connect_token_2)) == netcode.CONNECT_TOKEN_BYTES
     assert bytes(connect_token_1) != bytes(connect_token_2)
+
+
+def test_generate_tokens():
+    key = netcode.generate_key()
+    client_ids = list(range(1000))
+    records = netcode.generate_tokens([("localhost", 1234)], 0, client_ids, key)
+    assert len(records) == len(client_ids) * netcode.CONNECT_TOKEN_BYTES
+
+    tokens = [
+        records[i : i + netcode.CONNECT_TOKEN_BYTES]
+        for i in range(0, len(records), netcode.CONNECT_TOKEN_BYTES)
+    ]
+    # every record is a complete token with its own nonce
+    assert len(set(tokens)) == len(client_ids)
+    token = netcode.ConnectToken.from_bytes(tokens[-1])
+    assert bytes(token) == tokens[-1]
+
+    assert netcode.generate_tokens([("localhost", 1234)], 0, [], key) == b""
+    with pytest.raises(ValueError, match="bytes"):
+        netcode.ConnectToken.from_bytes(b"too short")
+
+
+def test_server_tokens_connect():
+    network = netcode.LoopbackNetwork()
+    server = netcode.Server(
+        helpers.LOOPBACK_ADDRESS, 0xDEADBEEF, netcode.generate_key(), network=network
+    )
+    records = server.tokens([7, 8])
+    clients = [
+        netcode.Client(
+            netcode.ConnectToken.from_bytes(
+                records[i : i + netcode.CONNECT_TOKEN_BYTES]
+            ),
+            network=network,
+        )
+        for i in range(0, len(records), netcode.CONNECT_TOKEN_BYTES)
+    ]
+    helpers.connect_loopback(network, server, clients, max_ticks=100)
+    assert sorted(server.client_id(idx) for idx in server.clients) == [7, 8]
+
+
+def test_server_address_set():
+    key = netcode.generate_key()
+    addresses = netcode.ServerAddressSet([("127.0.0.1", 1234), ("::1", 1235)])
+    assert len(addresses) == 2  # noqa: PLR2004
+    assert addresses.resolved == [("127.0.0.1", 1234), ("::1", 1235)]
+
+    token = netcode.ConnectToken(addresses, 0, 1, key)
+    assert len(bytes(token)) == netcode.CONNECT_TOKEN_BYTES
+    records = netcode.generate_tokens(addresses, 0, [1, 2, 3], key)
+    assert len(records) == 3 * netcode.CONNECT_TOKEN_BYTES
+
+    addresses.refresh()
+    assert addresses.resolved == [("127.0.0.1", 1234), ("::1", 1235)]
+
+    with pytest.raises(ValueError, match="cannot resolve"):
+        netcode.ServerAddressSet([("does-not-exist.invalid", 1234)])
+    with pytest.raises(ValueError, match="ttl"):
+        netcode.ServerAddressSet([("127.0.0.1", 1234)], ttl=-1)
+    with pytest.raises(ValueError, match="ttl"):
+        netcode.ServerAddressSet([("127.0.0.1", 1234)], ttl=0)